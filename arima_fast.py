@@ -0,0 +1,176 @@
+"""
+Vectorized ARIMA(1,1,0) estimation for many series at once.
+
+ARIMA(1,1,0) without a constant is an AR(1) on the first differences, so its
+parameters, innovation variance and forecasts have closed forms that can be
+evaluated for a whole (series x quarters) matrix in a handful of NumPy passes,
+instead of building and optimizing one statsmodels state-space model per series.
+
+The exact-likelihood estimates ('mle') reproduce
+`ARIMA(y, order=(1, 1, 0)).fit()` to optimizer tolerance; the conditional
+estimates ('css') are the least-squares AR(1) fit that conditions on the first
+difference.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# phi is kept strictly inside the stationary region, like statsmodels' enforce_stationarity
+_PHI_BOUND = 1.0 - 1e-8
+_BISECTION_STEPS = 60
+
+ARIMA110Batch = namedtuple('ARIMA110Batch', ['phi', 'sigma2', 'llf', 'forecasts'])
+
+
+def _as_panel(Y):
+    """Validates and returns the (series x quarters) matrix as float64."""
+    Y = np.asarray(Y, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[np.newaxis, :]
+    if Y.ndim != 2:
+        raise ValueError("Expected a 2-D array of shape (n_series, n_quarters).")
+    if Y.shape[1] < 3:
+        raise ValueError("ARIMA(1,1,0) needs at least 3 observations per series.")
+    if np.isnan(Y).any():
+        raise ValueError("Series must not contain missing values; fill or drop them first.")
+    return Y
+
+
+def _exact_loglike(X, phi, sigma2):
+    """Exact Gaussian log-likelihood of stationary AR(1) processes X (row-wise)."""
+    n = X.shape[1]
+    resid_ss = (1.0 - phi ** 2) * X[:, 0] ** 2 + np.sum((X[:, 1:] - phi[:, None] * X[:, :-1]) ** 2, axis=1)
+    return (
+        -0.5 * n * np.log(2.0 * np.pi * sigma2)
+        + 0.5 * np.log(1.0 - phi ** 2)
+        - resid_ss / (2.0 * sigma2)
+    )
+
+
+def _fit_css(X):
+    """Conditional (least-squares) AR(1) estimates for each row of X."""
+    lagged_ss = np.sum(X[:, :-1] ** 2, axis=1)
+    cross = np.sum(X[:, 1:] * X[:, :-1], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = np.where(lagged_ss > 0, cross / lagged_ss, 0.0)
+    phi = np.clip(phi, -_PHI_BOUND, _PHI_BOUND)
+    sigma2 = np.mean((X[:, 1:] - phi[:, None] * X[:, :-1]) ** 2, axis=1)
+    return phi, sigma2
+
+
+def _fit_exact(X):
+    """
+    Exact maximum-likelihood AR(1) estimates for each row of X.
+
+    With sigma2 concentrated out, the score for phi is the Beach-MacKinnon cubic
+        (n-1) C phi^3 + (2-n) B phi^2 - (n C + A) phi + n B = 0,
+    which is non-negative at phi=-1, non-positive at phi=1 and has a single root in
+    between, so a vectorized bisection converges for every series simultaneously.
+    """
+    n = X.shape[1]
+    total_ss = np.sum(X ** 2, axis=1)                      # A
+    cross = np.sum(X[:, 1:] * X[:, :-1], axis=1)           # B
+    interior_ss = np.sum(X[:, 1:-1] ** 2, axis=1)          # C
+
+    def score(phi):
+        return (
+            (n - 1) * interior_ss * phi ** 3
+            + (2 - n) * cross * phi ** 2
+            - (n * interior_ss + total_ss) * phi
+            + n * cross
+        )
+
+    lower = np.full(X.shape[0], -_PHI_BOUND)
+    upper = np.full(X.shape[0], _PHI_BOUND)
+    for _ in range(_BISECTION_STEPS):
+        mid = 0.5 * (lower + upper)
+        go_right = score(mid) > 0
+        lower = np.where(go_right, mid, lower)
+        upper = np.where(go_right, upper, mid)
+    phi = 0.5 * (lower + upper)
+
+    resid_ss = total_ss - 2.0 * cross * phi + interior_ss * phi ** 2
+    sigma2 = resid_ss / n
+    return phi, sigma2
+
+
+def forecast_arima110(Y, phi, steps):
+    """
+    Multi-step ARIMA(1,1,0) point forecasts for each row of Y.
+
+    Args:
+        Y (np.ndarray): Levels, shape (n_series, n_quarters).
+        phi (np.ndarray): AR coefficient per series, shape (n_series,).
+        steps (int): Number of quarters to forecast.
+
+    Returns:
+        np.ndarray: Forecasts, shape (n_series, steps).
+    """
+    Y = _as_panel(Y)
+    phi = np.asarray(phi, dtype=np.float64)
+    if steps <= 0:
+        return np.empty((Y.shape[0], 0))
+    last_level = Y[:, -1]
+    last_diff = Y[:, -1] - Y[:, -2]
+    # Future differences decay geometrically: x_{T+h} = phi^h * x_T
+    powers = phi[:, None] ** np.arange(1, steps + 1)
+    return last_level[:, None] + last_diff[:, None] * np.cumsum(powers, axis=1)
+
+
+def fit_arima110(Y, steps=0, method='mle'):
+    """
+    Fits ARIMA(1,1,0) to every row of Y in one vectorized pass.
+
+    Args:
+        Y (array-like): Levels, shape (n_series, n_quarters); a 1-D array is one series.
+        steps (int): Number of quarters to forecast after the last observation.
+        method (str): 'mle' for exact maximum likelihood (matches statsmodels ARIMA),
+            'css' for conditional least squares.
+
+    Returns:
+        ARIMA110Batch: (phi, sigma2, llf, forecasts) with one entry/row per series.
+    """
+    Y = _as_panel(Y)
+    X = np.diff(Y, axis=1)
+
+    if method == 'mle':
+        phi, sigma2 = _fit_exact(X)
+    elif method == 'css':
+        phi, sigma2 = _fit_css(X)
+    else:
+        raise ValueError(f"Unknown method '{method}'; expected 'mle' or 'css'.")
+
+    # Guard against constant series, whose innovation variance is exactly zero
+    sigma2 = np.maximum(sigma2, np.finfo(np.float64).tiny)
+    llf = _exact_loglike(X, phi, sigma2)
+    return ARIMA110Batch(phi, sigma2, llf, forecast_arima110(Y, phi, steps))
+
+
+def backtest_arima110(Y, horizon=4, initial=None, method='mle'):
+    """
+    Vectorized rolling-origin backtest of ARIMA(1,1,0) for each row of Y.
+
+    Mirrors `backtest.rolling_origin_backtest`: phi is estimated once on the first
+    `initial` quarters and kept fixed while the origin expands over the rest.
+
+    Returns:
+        np.ndarray: Absolute percentage errors, shape (n_series, n_origins, horizon),
+        NaN where the horizon runs past the data or the actual value is zero.
+    """
+    from backtest import _initial_window
+
+    Y = _as_panel(Y)
+    n_obs = Y.shape[1]
+    initial = initial or _initial_window(n_obs)
+    if initial < 5 or initial >= n_obs:
+        raise ValueError(f"Not enough data for a rolling backtest ({n_obs} observations).")
+
+    phi = fit_arima110(Y[:, :initial], method=method).phi
+    ape = np.full((Y.shape[0], n_obs - initial, horizon), np.nan)
+    for k, origin in enumerate(range(initial, n_obs)):
+        steps = min(horizon, n_obs - origin)
+        predicted = forecast_arima110(Y[:, :origin], phi, steps)
+        actual = Y[:, origin:origin + steps]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ape[:, k, :steps] = np.where(actual != 0, np.abs(actual - predicted) / np.abs(actual), np.nan)
+    return ape
@@ -0,0 +1,137 @@
+"""
+Rolling-origin (expanding window) backtesting for ARIMA models.
+
+The model is estimated once, on the first training window. Every later
+forecast origin reuses those parameters: the series is run through the Kalman
+filter a single time and the predicted state at each origin is propagated
+forward, which is exactly what `extend`-ing the fitted results origin by origin
+would compute. A backtest over K origins therefore costs one fit plus one
+filter pass, instead of K full re-estimations.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def _initial_window(n_obs):
+    """Default size of the first training window: half the data, at least 8 quarters."""
+    return min(max(8, n_obs // 2), n_obs - 1)
+
+
+def _at(matrix, t):
+    """
+    Selects time(s) t of a statsmodels system matrix.
+
+    Time-invariant matrices have a single trailing slice, which is kept as a
+    broadcastable column.
+    """
+    return matrix[..., t] if matrix.shape[-1] > 1 else matrix[..., 0:1]
+
+
+def first_window_fit(data_series, order=(1, 1, 0), initial=None):
+    """
+    Estimates the model on the first training window of a backtest.
+
+    Keep the result to backtest the same series again later (e.g. after quarters
+    were appended) without estimating anything: pass it back to
+    `rolling_origin_backtest` as `initial` and `params`.
+
+    Args:
+        data_series (pd.Series): The time series data with a quarterly DatetimeIndex.
+        order (tuple): The (p, d, q) order of the model.
+        initial (int): Observations in the first training window (default as for
+            `rolling_origin_backtest`).
+
+    Returns:
+        tuple: (int, pd.Series) -> (Size of the first window, Parameters estimated on it)
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    initial = _checked_initial(len(data_series), initial)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        params = ARIMA(data_series[:initial], order=order, freq='QS-JAN').fit().params
+    return initial, params
+
+
+def _checked_initial(n_obs, initial):
+    """The first window size (default if None), or ValueError if the series is too short for it."""
+    initial = initial or _initial_window(n_obs)
+    if initial < 5 or initial >= n_obs:
+        raise ValueError(f"Not enough data for a rolling backtest ({n_obs} observations).")
+    return initial
+
+
+def rolling_origin_backtest(data_series, order=(1, 1, 0), horizon=4, initial=None, params=None):
+    """
+    Evaluates forecast accuracy over every expanding-window cutoff.
+
+    Args:
+        data_series (pd.Series): The time series data with a quarterly DatetimeIndex.
+        order (tuple): The (p, d, q) order of the model.
+        horizon (int): Largest forecast horizon (in quarters) to evaluate.
+        initial (int): Observations in the first training window. Defaults to half the
+            series (at least 8 quarters).
+        params (array-like): Fixed model parameters, e.g. from `first_window_fit` on the
+            same first window. When given, no estimation is done at all and the series
+            is only filtered.
+
+    Returns:
+        pd.DataFrame: Per-horizon errors indexed by 'Horizon' with columns
+        'Forecasts', 'MAE', 'RMSE' and 'MAPE (%)'.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    n_obs = len(data_series)
+    if params is None:
+        initial, params = first_window_fit(data_series, order, initial)
+    else:
+        initial = _checked_initial(n_obs, initial)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        filtered = ARIMA(data_series, order=order, freq='QS-JAN').filter(params).filter_results
+
+    # predicted_state[:, t] is the state at t given data up to t-1, i.e. the state a
+    # model extended up to origin t would forecast from
+    origins = np.arange(initial, n_obs)
+    states = filtered.predicted_state[:, origins]
+    design = filtered.design[..., 0]
+    transition = filtered.transition[..., 0]
+
+    predicted = np.full((len(origins), horizon), np.nan)
+    for h in range(horizon):
+        target = np.minimum(origins + h, n_obs - 1)
+        predicted[:, h] = (_at(filtered.obs_intercept, target) + design @ states)[0]
+        states = _at(filtered.state_intercept, target) + transition @ states
+
+    # Align each forecast with the observation it targets; horizons past the data are dropped
+    actual = data_series.values.astype(float)
+    target_index = origins[:, None] + np.arange(horizon)[None, :]
+    in_sample = target_index < n_obs
+    targets = np.where(in_sample, actual[np.minimum(target_index, n_obs - 1)], np.nan)
+    errors = np.where(in_sample, targets - predicted, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_errors = np.where(in_sample & (targets != 0), np.abs(errors) / np.abs(targets), np.nan)
+
+    rows = []
+    for h in range(horizon):
+        e = errors[:, h][in_sample[:, h]]
+        pe = pct_errors[:, h][~np.isnan(pct_errors[:, h])]
+        rows.append({
+            'Horizon': h + 1,
+            'Forecasts': len(e),
+            'MAE': np.mean(np.abs(e)) if len(e) else np.nan,
+            'RMSE': np.sqrt(np.mean(e ** 2)) if len(e) else np.nan,
+            'MAPE (%)': np.mean(pe) * 100 if len(pe) else np.nan,
+        })
+    return pd.DataFrame(rows).set_index('Horizon')
+
+
+def overall_mape(backtest_table):
+    """Average MAPE (%) across all evaluated forecasts in a backtest table."""
+    table = backtest_table.dropna(subset=['MAPE (%)'])
+    if table.empty:
+        return np.nan
+    return float(np.average(table['MAPE (%)'], weights=table['Forecasts']))
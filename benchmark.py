@@ -0,0 +1,332 @@
+"""
+Benchmark suite for the data, forecasting and plotting paths of the dashboard.
+
+Times `load_data`, the pre-fit validation (`validation.py`),
+`_fit_and_forecast_single_series`, `arima_forecast`, the comparison cube and
+its views (`comparison.py`) and figure rendering on synthetic panels of
+increasing size (see `synthetic_data.py`), and writes the timings to
+a JSON file so that two runs can be compared:
+
+    $ python benchmark.py --sizes 10 100 1000 --output bench-before.json
+    $ python benchmark.py --sizes 10 100 1000 --output bench-after.json --compare bench-before.json
+
+Every benchmark reports the min/median/mean/max wall time over `--repeats`
+runs. Streamlit and figure caches are cleared before each timed call, except for
+'arima_forecast.warm' and the '.cached' renders, which measure cache hits. 'load_data.ingest' reads the
+source file; 'load_data.columnar' reads the Parquet copy made by the ingest.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+import comparison
+import figures
+import streamlit_app as app
+import validation
+from streamlit.logger import set_log_level
+from synthetic_data import generate_panel, write_panel
+
+# Calling st.cache_data functions outside `streamlit run` logs a warning per call
+set_log_level('error')
+warnings.filterwarnings("ignore")
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_SIZES = (10, 100, 1000)
+
+
+# --- 1. Timing Helpers ---
+
+def _time(func, repeats, setup=None):
+    """Runs `setup()` (untimed) then `func()` (timed) `repeats` times; returns seconds per run."""
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _record(results, name, n_barangays, n_rows, timings):
+    """Appends one benchmark result and prints a progress line."""
+    entry = {
+        'benchmark': name,
+        'n_barangays': n_barangays,
+        'n_rows': n_rows,
+        'repeats': len(timings),
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'mean_s': statistics.fmean(timings),
+        'max_s': max(timings),
+    }
+    results.append(entry)
+    print(f"{name:<32} {n_barangays:>8,} barangays  median {entry['median_s'] * 1000:10.2f} ms")
+
+
+def _environment():
+    """Versions and machine details stored with the results."""
+    import statsmodels
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'statsmodels': statsmodels.__version__,
+        'matplotlib': matplotlib.__version__,
+        'git_commit': commit,
+    }
+
+
+# --- 2. Benchmarked Operations ---
+
+def _comparison_views(cube):
+    """The per-rerun work of `comparison_page` on a cached cube: top-N lines and percentile bands."""
+    top = comparison.metric_frame(cube, comparison.RANKING_METRIC, comparison.top_n(cube, app.MAX_COMPARISON_LINES))
+    bands = [comparison.percentile_bands(cube, metric) for metric in comparison.METRIC_COLUMNS]
+    return top, bands
+
+
+def _first_barangay_series(df):
+    """The three metric series of the first barangay, indexed by Period."""
+    barangay = df['Barangay'].iloc[0]
+    df_barangay = df[df['Barangay'] == barangay].set_index('Period').sort_index()
+    return barangay, [df_barangay[metric] for metric in app.METRIC_COLUMNS]
+
+
+# --- 3. Suite ---
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeats=3, fit_repeats=None, max_plot_barangays=1000,
+                   file_format='parquet', seed=0):
+    """
+    Runs every benchmark for each panel size.
+
+    Args:
+        sizes (list): Numbers of barangays to generate panels for.
+        repeats (int): Timed runs per data/plotting benchmark.
+        fit_repeats (int): Timed runs per model-fitting benchmark (defaults to `repeats`).
+            Fitting cost depends on the series length rather than the panel size, so
+            fewer runs are usually enough.
+        max_plot_barangays (int): Skip the comparison chart above this many barangays.
+        file_format (str): 'csv', 'parquet' or 'xlsx' source file for the `load_data` benchmarks.
+        seed (int): Seed for the synthetic panels.
+
+    Returns:
+        list: One dict per (benchmark, size) with timing statistics.
+    """
+    fit_repeats = fit_repeats or repeats
+    results = []
+
+    _record(results, 'load_data.embedded', 9, len(app.load_data()), _time(
+        app.load_data, repeats, setup=app._load_embedded_data.clear
+    ))
+
+    work_dir = tempfile.mkdtemp(prefix='copra-bench-')
+    try:
+        for n_barangays in sizes:
+            df_raw = generate_panel(n_barangays, seed=seed)
+            n_rows = len(df_raw)
+            source = os.path.join(work_dir, f"synthetic-{n_barangays}.{file_format}")
+            write_panel(df_raw, source)
+            cache_dir = os.path.join(work_dir, '.columnar_cache')
+
+            def drop_columnar_cache():
+                app._load_source_data.clear()
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+            _record(results, 'load_data.ingest', n_barangays, n_rows, _time(
+                lambda: app.load_data(source), repeats, setup=drop_columnar_cache
+            ))
+            _record(results, 'load_data.columnar', n_barangays, n_rows, _time(
+                lambda: app.load_data(source), repeats, setup=app._load_source_data.clear
+            ))
+            df = app.load_data(source)
+
+            _record(results, 'validate_panel', n_barangays, n_rows, _time(
+                lambda: validation.validate_panel(df), repeats
+            ))
+            _record(results, 'comparison.cube', n_barangays, n_rows, _time(
+                lambda: comparison.build_cube(df), repeats
+            ))
+            cube = comparison.build_cube(df)
+            _record(results, 'comparison.views', n_barangays, n_rows, _time(
+                lambda: _comparison_views(cube), repeats
+            ))
+            if n_barangays <= max_plot_barangays:
+                df_pivot = _comparison_views(cube)[0]
+
+                def render_comparison():
+                    return figures.comparison(
+                        df_pivot, 'Copra Production (MT)', 'Copra Production (MT)', figsize=(12, 6)
+                    )
+
+                _record(results, 'render.comparison_figure', n_barangays, n_rows, _time(
+                    render_comparison, repeats, setup=figures.clear_cache
+                ))
+                _record(results, 'render.comparison_figure.cached', n_barangays, n_rows, _time(
+                    render_comparison, repeats
+                ))
+
+            barangay, (ts_production, ts_farmgate, ts_millgate) = _first_barangay_series(df)
+            _record(results, 'fit_and_forecast_single_series', n_barangays, n_rows, _time(
+                lambda: app._fit_and_forecast_single_series(ts_production, 2035, 'Copra_Production (MT)'),
+                fit_repeats
+            ))
+
+            data_key = '/'.join(app.series_hash(ts) for ts in (ts_production, ts_farmgate, ts_millgate))
+
+            def run_arima_forecast():
+                return app.arima_forecast(
+                    data_key, ts_production, ts_farmgate, ts_millgate, 2035,
+                    ts_production.index.max(), barangay=barangay
+                )
+
+            _record(results, 'arima_forecast.cold', n_barangays, n_rows, _time(
+                run_arima_forecast, fit_repeats, setup=app.arima_forecast.clear
+            ))
+            _record(results, 'arima_forecast.warm', n_barangays, n_rows, _time(
+                run_arima_forecast, repeats
+            ))
+
+            forecast_outputs = run_arima_forecast()
+            df_combined_plot, df_combined_forecast, model_summaries = (
+                forecast_outputs[0], forecast_outputs[1], forecast_outputs[3]
+            )
+
+            # Uncached, so every run simulates the paths again
+            _record(results, 'simulate_forecast.10000_paths', n_barangays, n_rows, _time(
+                lambda: app.simulate_forecast.__wrapped__(None, 10000, df_combined_forecast, model_summaries),
+                repeats
+            ))
+
+            def render_forecast():
+                return figures.forecast_production(
+                    df_combined_plot, barangay, ts_production.index.max(),
+                    intervals=forecast_outputs[6]['Copra_Production (MT)']
+                )
+
+            _record(results, 'render.forecast_figure', n_barangays, n_rows, _time(
+                render_forecast, repeats, setup=figures.clear_cache
+            ))
+            _record(results, 'render.forecast_figure.cached', n_barangays, n_rows, _time(
+                render_forecast, repeats
+            ))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+# --- 4. Results Files ---
+
+def write_results(results, path, settings):
+    """Writes benchmark results with the environment they were measured in."""
+    document = {
+        'format_version': RESULTS_FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': _environment(),
+        'settings': settings,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def compare_results(results, baseline_path, threshold=1.2):
+    """
+    Prints the median-time ratio of each benchmark against a baseline results file.
+
+    Args:
+        results (list): Current results.
+        baseline_path (str): JSON file written by an earlier run.
+        threshold (float): Ratio above which a benchmark counts as a regression.
+
+    Returns:
+        list: (benchmark, n_barangays, ratio) for every regression.
+    """
+    with open(baseline_path) as f:
+        baseline = {
+            (entry['benchmark'], entry['n_barangays']): entry
+            for entry in json.load(f)['results']
+        }
+
+    regressions = []
+    print(f"\nComparison with {baseline_path} (median, current / baseline):")
+    for entry in results:
+        key = (entry['benchmark'], entry['n_barangays'])
+        if key not in baseline or baseline[key]['median_s'] <= 0:
+            continue
+        ratio = entry['median_s'] / baseline[key]['median_s']
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{key[0]:<32} {key[1]:>8,} barangays  {ratio:6.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append((key[0], key[1], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Copra dashboard on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Numbers of barangays to benchmark (up to 100000).")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per benchmark.")
+    parser.add_argument('--fit-repeats', type=int, default=None,
+                        help="Timed runs per model-fitting benchmark (default: --repeats).")
+    parser.add_argument('--max-plot-barangays', type=int, default=1000,
+                        help="Skip the comparison chart for larger panels.")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'xlsx'], default='parquet',
+                        help="Source file format for the load_data benchmarks.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic panels.")
+    parser.add_argument('--output', default='benchmark-results.json', help="JSON results file.")
+    parser.add_argument('--compare', default=None, help="Earlier results file to compare against.")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="Slowdown ratio reported as a regression in --compare (default 1.2).")
+    args = parser.parse_args()
+
+    settings = {
+        'sizes': args.sizes,
+        'repeats': args.repeats,
+        'fit_repeats': args.fit_repeats or args.repeats,
+        'max_plot_barangays': args.max_plot_barangays,
+        'format': args.format,
+        'seed': args.seed,
+    }
+    results = run_benchmarks(
+        sizes=args.sizes,
+        repeats=args.repeats,
+        fit_repeats=args.fit_repeats,
+        max_plot_barangays=args.max_plot_barangays,
+        file_format=args.format,
+        seed=args.seed,
+    )
+    write_results(results, args.output, settings)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, threshold=args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
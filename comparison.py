@@ -0,0 +1,96 @@
+"""
+Cross-barangay views for the comparison page.
+
+`build_cube` pivots the whole table once into a wide Period x (metric, barangay)
+frame; every view of the comparison page is a cheap selection or reduction of
+that cube, so the page never re-pivots the raw rows and never draws more than a
+bounded number of lines, however many barangays are loaded:
+
+- `top_n`: the N barangays with the highest mean value of a ranking metric.
+- `percentile_bands`: per-period percentiles across all barangays.
+- `search`: barangays whose name contains a query, for a hand-picked subset.
+"""
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['Copra_Production (MT)', 'Farmgate Price (PHP/kg)', 'Millgate Price (PHP/kg)']
+RANKING_METRIC = 'Copra_Production (MT)'
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def build_cube(df):
+    """
+    Pivots the long table into one wide frame.
+
+    Args:
+        df (pd.DataFrame): Long table with 'Period', 'Barangay' and the metric columns.
+
+    Returns:
+        pd.DataFrame: Indexed by Period, with (metric, barangay) MultiIndex columns.
+    """
+    return df.pivot_table(index='Period', columns='Barangay', values=METRIC_COLUMNS, observed=True).sort_index()
+
+
+def metric_frame(cube, metric, barangays=None):
+    """
+    The Period x Barangay frame of one metric.
+
+    Args:
+        cube (pd.DataFrame): Output of `build_cube`.
+        metric (str): One of METRIC_COLUMNS.
+        barangays (list): Columns to keep, in this order (all barangays if None).
+    """
+    frame = cube[metric]
+    if barangays is not None:
+        frame = frame[list(barangays)]
+    frame.columns.name = 'Barangay'
+    return frame
+
+
+def barangays(cube):
+    """All barangays in the cube, sorted by name."""
+    return sorted(cube.columns.get_level_values('Barangay').unique())
+
+
+def rank(cube, by=RANKING_METRIC):
+    """Barangays ordered by their mean value of `by`, highest first."""
+    means = metric_frame(cube, by).mean()
+    return list(means.sort_values(ascending=False, kind='stable').index)
+
+
+def top_n(cube, n, by=RANKING_METRIC):
+    """The `n` barangays with the highest mean value of `by`."""
+    return rank(cube, by)[:n]
+
+
+def percentile_bands(cube, metric, percentiles=DEFAULT_PERCENTILES):
+    """
+    Per-period percentiles of one metric across all barangays.
+
+    Args:
+        cube (pd.DataFrame): Output of `build_cube`.
+        metric (str): One of METRIC_COLUMNS.
+        percentiles (tuple): Percentiles to compute, between 0 and 100.
+
+    Returns:
+        pd.DataFrame: Indexed by Period with one column per percentile (e.g. 'p50'),
+        plus the number of barangays reporting in that period ('count').
+    """
+    values = metric_frame(cube, metric).to_numpy(dtype=np.float64)
+    count = np.sum(~np.isnan(values), axis=1)
+    bands = np.full((len(values), len(percentiles)), np.nan)
+    reported = count > 0
+    if reported.any():
+        # One vectorized call over all periods; empty periods would only raise warnings
+        bands[reported] = np.nanpercentile(values[reported], percentiles, axis=1).T
+    frame = pd.DataFrame(bands, index=cube.index, columns=[f"p{p:g}" for p in percentiles])
+    frame['count'] = count
+    return frame
+
+
+def search(names, query):
+    """Names containing `query` (case-insensitive); all names if the query is empty."""
+    query = (query or '').strip().lower()
+    if not query:
+        return list(names)
+    return [name for name in names if query in str(name).lower()]
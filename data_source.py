@@ -0,0 +1,200 @@
+"""
+Pluggable loading of Copra Production data files from disk.
+
+Source files (CSV, XLSX, or anything with a registered reader) are ingested in
+chunks and written once to a Parquet file in a columnar cache directory. Later
+loads read the Parquet file directly, and the source is only re-ingested when
+its fingerprint changes: size and modification time by default, or a content
+hash with `verify='hash'`.
+
+    from data_source import load_dataset
+    df_raw = load_dataset('Copra_Production_2015-2025.xlsx')
+
+Readers for other formats are added with `register_reader('.ext', reader)`,
+where `reader(path, chunksize)` yields DataFrames in the dataset schema.
+"""
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+# Columns of the Copra Production schema and their types in the columnar cache
+SCHEMA_COLUMNS = {
+    'Barangay': 'str',
+    'Year': 'int64',
+    'Quarter': 'str',
+    'Period': 'datetime64[ns]',
+    'Copra_Production (MT)': 'float64',
+    'Farmgate Price (PHP/kg)': 'float64',
+    'Millgate Price (PHP/kg)': 'float64',
+}
+
+# Grouping columns kept when a source has them (see hierarchy.py)
+OPTIONAL_COLUMNS = {
+    'Province': 'str',
+    'Municipality': 'str',
+}
+
+DEFAULT_CHUNKSIZE = 250_000
+
+_READERS = {}
+
+
+# --- 1. Source Readers ---
+
+def register_reader(extension, reader):
+    """
+    Registers a chunked reader for files ending in `extension` (e.g. '.csv').
+
+    Args:
+        extension (str): File extension including the dot, case-insensitive.
+        reader (callable): reader(path, chunksize) yielding DataFrames.
+    """
+    _READERS[extension.lower()] = reader
+
+
+def _read_csv(path, chunksize):
+    """Streams a CSV file in chunks of `chunksize` rows."""
+    yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def _read_excel(path, chunksize):
+    """Streams the first worksheet of an XLSX workbook in chunks of `chunksize` rows."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportError("Reading .xlsx files requires openpyxl (pip install openpyxl).") from e
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(name).strip() for name in next(rows)]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _read_parquet(path, chunksize):
+    """Reads a Parquet file batch by batch."""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+register_reader('.csv', _read_csv)
+register_reader('.xlsx', _read_excel)
+register_reader('.parquet', _read_parquet)
+
+
+def _normalize_chunk(chunk):
+    """Coerces one chunk to the cache schema so every Parquet row group matches."""
+    chunk = chunk.rename(columns=lambda name: str(name).strip())
+    missing = [col for col in SCHEMA_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Data source is missing required columns: {missing}")
+
+    optional = {col: dtype for col, dtype in OPTIONAL_COLUMNS.items() if col in chunk.columns}
+    chunk = chunk[list(SCHEMA_COLUMNS) + list(optional)].copy()
+    chunk['Period'] = pd.to_datetime(chunk['Period'])
+    for col in ('Copra_Production (MT)', 'Farmgate Price (PHP/kg)', 'Millgate Price (PHP/kg)'):
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    chunk['Year'] = pd.to_numeric(chunk['Year'], errors='coerce').fillna(chunk['Period'].dt.year)
+    return chunk.astype({**SCHEMA_COLUMNS, **optional})
+
+
+# --- 2. Fingerprinting and Columnar Cache ---
+
+def source_fingerprint(path, verify='mtime'):
+    """
+    Identifies the current version of a source file.
+
+    Args:
+        path (str): Source file.
+        verify (str): 'mtime' uses size and modification time (no read);
+            'hash' uses a SHA-256 of the file contents.
+    """
+    if verify == 'hash':
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 ** 2), b''):
+                digest.update(block)
+        return digest.hexdigest()[:32]
+    if verify != 'mtime':
+        raise ValueError(f"Unknown verify mode '{verify}'; expected 'mtime' or 'hash'.")
+    stat = os.stat(path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def _default_cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), '.columnar_cache')
+
+
+def _ingest(path, target, chunksize):
+    """Streams `path` chunk by chunk into the Parquet file `target`."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _READERS:
+        raise ValueError(f"No reader registered for '{extension}' files.")
+
+    tmp_target = f"{target}.tmp"
+    writer = None
+    try:
+        for chunk in _READERS[extension](path, chunksize):
+            table = pa.Table.from_pandas(_normalize_chunk(chunk), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_target, table.schema)
+            writer.write_table(table)
+        if writer is None:
+            raise ValueError(f"Data source '{path}' contains no rows.")
+        writer.close()
+        writer = None
+        os.replace(tmp_target, target)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+
+
+def load_dataset(path, cache_dir=None, verify='mtime', chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Loads a data file through the columnar cache.
+
+    Args:
+        path (str): CSV, XLSX or Parquet file in the Copra Production schema.
+        cache_dir (str): Directory for the Parquet cache. Defaults to
+            '.columnar_cache' next to the source file.
+        verify (str): How to detect source changes, 'mtime' or 'hash'.
+        chunksize (int): Rows per ingest chunk, bounding memory for very large files.
+
+    Returns:
+        pd.DataFrame: The raw (not yet preprocessed) data.
+    """
+    cache_dir = cache_dir or _default_cache_dir(path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    stem = os.path.basename(path)
+    target = os.path.join(cache_dir, f"{stem}.{source_fingerprint(path, verify)}.parquet")
+
+    if not os.path.exists(target):
+        _ingest(path, target, chunksize)
+        # Drop columnar copies of earlier versions of the same source
+        for stale in glob.glob(os.path.join(glob.escape(cache_dir), f"{glob.escape(stem)}.*.parquet")):
+            fingerprint = os.path.basename(stale)[len(stem) + 1:-len('.parquet')]
+            if stale != target and '.' not in fingerprint:
+                os.remove(stale)
+
+    return pd.read_parquet(target, memory_map=True)
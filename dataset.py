@@ -0,0 +1,459 @@
+"""
+Barangay-indexed view of the Copra Production data with row-level edits.
+
+`IndexedDataset` keeps the full table together with, for every barangay, the
+row labels of its quarters in period order. Per-barangay slices are looked up
+through that index instead of filtering the whole table with boolean masks,
+and are memoized until the barangay is edited. Edits from `st.data_editor`
+are applied as deltas (changed cells, added rows, deleted rows) to just the
+affected rows rather than rebuilding the table.
+
+The table itself is kept compact (see `compact_frame`): barangay and grouping
+names are categorical codes, and the calendar columns Year and Quarter are not
+stored but derived from 'Period' when shown (`with_calendar_columns`).
+
+`SessionDataset` shares one `IndexedDataset` between all sessions as a read-only
+base and keeps a session's edits as a copy-on-write overlay: the first edit to
+a barangay copies just that barangay's rows into the session. Its
+`data_version()` is the base version plus a content hash of the overlay, so
+sessions that have not edited anything (or made the same edits) share cache
+entries.
+"""
+import hashlib
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import validation
+
+# Name columns stored as categorical codes instead of one string per row
+CATEGORICAL_COLUMNS = ('Barangay', 'Province', 'Municipality')
+# Measured quantities; `compact_frame` can store them as float32
+MEASURE_COLUMNS = ('Copra_Production (MT)', 'Farmgate Price (PHP/kg)', 'Millgate Price (PHP/kg)')
+# Calendar columns derivable from 'Period', only added for display
+CALENDAR_COLUMNS = ('Year', 'Quarter')
+
+
+def compact_frame(df, measure_dtype='float64'):
+    """
+    Converts a Copra Production table to its compact in-memory form.
+
+    Args:
+        df (pd.DataFrame): Table with a datetime 'Period' column.
+        measure_dtype (str): 'float64' (default) or 'float32' for the measure columns.
+
+    Returns:
+        pd.DataFrame: The table without the Year/Quarter columns, with name columns
+        as categoricals and the measures in `measure_dtype`.
+    """
+    df = df.drop(columns=[col for col in CALENDAR_COLUMNS if col in df.columns])
+    dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS if col in df.columns}
+    dtypes.update({col: measure_dtype for col in MEASURE_COLUMNS if col in df.columns})
+    return df.astype(dtypes)
+
+
+def with_calendar_columns(df):
+    """A copy of `df` with 'Year' and 'Quarter' (e.g. 'Q3') derived from 'Period', placed before it."""
+    df = df.copy()
+    position = df.columns.get_loc('Period')
+    df.insert(position, 'Quarter', 'Q' + df['Period'].dt.quarter.astype(str))
+    df.insert(position, 'Year', df['Period'].dt.year)
+    return df
+
+
+def memory_usage(df):
+    """Bytes held by a DataFrame, including the contents of string and categorical columns."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class IndexedDataset:
+    """
+    The Copra Production table indexed by barangay and period.
+
+    Args:
+        df (pd.DataFrame): Preprocessed data with 'Barangay' and 'Period' columns.
+    """
+
+    def __init__(self, df):
+        self._df = df.reset_index(drop=True)
+        self._next_label = len(self._df)
+        # Distinguishes this dataset (and its edits) from every other instance
+        self._token = uuid.uuid4().hex
+        self._edits = 0
+        self._versions = {}
+        self._slices = {}
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Recomputes the barangay -> period-ordered row labels index."""
+        ordered = self._df.sort_values('Period', kind='stable')
+        labels = ordered.index.to_numpy()
+        self._labels = {
+            barangay: labels[positions]
+            for barangay, positions in ordered.groupby('Barangay', sort=False, observed=True).indices.items()
+        }
+        self._slices.clear()
+
+    def _touch(self, barangay):
+        """Marks a barangay as modified, invalidating its memoized slices."""
+        self._versions[barangay] = self._versions.get(barangay, 0) + 1
+        self._edits += 1
+        self._slices.pop(barangay, None)
+
+    # --- Read Access ---
+
+    @property
+    def frame(self):
+        """The full table (not a copy; do not modify it directly)."""
+        return self._df
+
+    def barangays(self):
+        """Barangays in order of first appearance."""
+        return list(self._df['Barangay'].unique())
+
+    def has_barangay(self, barangay):
+        """Whether the barangay has rows (a dictionary lookup in the barangay index)."""
+        return len(self._labels.get(barangay, ())) > 0
+
+    def version(self, barangay):
+        """Counter that increases every time the barangay's rows change."""
+        return self._versions.get(barangay, 0)
+
+    def data_version(self):
+        """Identifies the current contents of the whole table; changes with every edit."""
+        return f"{self._token}:{self._edits}"
+
+    def memory_usage(self):
+        """Bytes held by the table (see `memory_usage`)."""
+        return memory_usage(self._df)
+
+    def __len__(self):
+        return len(self._df)
+
+    def rows(self, barangay):
+        """
+        The barangay's rows in period order, with their row labels as index.
+
+        The result is memoized and shared between calls; copy it before modifying.
+        """
+        slices = self._slices.setdefault(barangay, {})
+        if 'rows' not in slices:
+            labels = self._labels.get(barangay, np.array([], dtype=np.int64))
+            slices['rows'] = self._df.loc[labels]
+        return slices['rows']
+
+    def series_frame(self, barangay):
+        """The barangay's rows indexed by 'Period' (memoized like `rows`)."""
+        slices = self._slices.setdefault(barangay, {})
+        if 'series' not in slices:
+            slices['series'] = self.rows(barangay).set_index('Period')
+        return slices['series']
+
+    def model_series_frame(self, barangay):
+        """
+        The barangay's rows regularized for modelling (see `validation.regularize_panel`).
+
+        Edits can leave duplicate, missing or off-quarter periods and non-positive values
+        in the stored rows; the result has one row per quarter start, indexed by 'Period'.
+        Memoized like `rows`.
+
+        Returns:
+            tuple: (pd.DataFrame, pd.DataFrame) -> (The regularized rows indexed by 'Period',
+                   the validation report of each metric, indexed by metric)
+        """
+        slices = self._slices.setdefault(barangay, {})
+        if 'model' not in slices:
+            rows = self.rows(barangay)
+            metrics = [col for col in MEASURE_COLUMNS if col in rows.columns]
+            regularized, report = validation.regularize_panel(rows, metrics)
+            if regularized is rows:
+                frame = self.series_frame(barangay)
+            else:
+                frame = regularized.set_index('Period')
+            slices['model'] = (frame, report.droplevel('Barangay'))
+        return slices['model']
+
+    def display_rows(self, barangay):
+        """`rows(barangay)` with the derived Year and Quarter columns (memoized like `rows`)."""
+        slices = self._slices.setdefault(barangay, {})
+        if 'display' not in slices:
+            slices['display'] = with_calendar_columns(self.rows(barangay))
+        return slices['display']
+
+    # --- Row-Level Edits ---
+
+    def update_cells(self, changes):
+        """
+        Sets individual cells in place.
+
+        Args:
+            changes (dict): {row label: {column: new value}}
+        """
+        for label, row_changes in changes.items():
+            barangay = self._df.at[label, 'Barangay']
+            for col, value in row_changes.items():
+                self._df.at[label, col] = value
+            if 'Period' in row_changes:
+                self._reorder(barangay)
+            self._touch(barangay)
+
+    def append_rows(self, rows):
+        """
+        Appends new rows.
+
+        Args:
+            rows (list): Dicts mapping column names to values; must include
+                'Barangay' and 'Period'.
+        """
+        if not rows:
+            return
+        new_labels = range(self._next_label, self._next_label + len(rows))
+        self._next_label += len(rows)
+        new_df = pd.DataFrame(rows, index=new_labels).reindex(columns=self._df.columns)
+        for col, dtype in self._df.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                # Names not seen before become new categories instead of missing values
+                new_names = pd.Index(new_df[col].dropna().unique()).difference(dtype.categories)
+                if len(new_names):
+                    self._df[col] = self._df[col].cat.add_categories(new_names)
+        new_df = new_df.astype({col: dtype for col, dtype in self._df.dtypes.items() if col in new_df})
+        self._df = pd.concat([self._df, new_df])
+        for barangay in new_df['Barangay'].unique():
+            added = new_df.index[new_df['Barangay'] == barangay].to_numpy()
+            self._labels[barangay] = np.concatenate([self._labels.get(barangay, added[:0]), added])
+            self._reorder(barangay)
+            self._touch(barangay)
+
+    def delete_rows(self, labels):
+        """Deletes rows by label."""
+        if len(labels) == 0:
+            return
+        barangays = set(self._df.loc[labels, 'Barangay'])
+        self._df = self._df.drop(index=labels)
+        for barangay in barangays:
+            kept = ~np.isin(self._labels[barangay], labels)
+            self._labels[barangay] = self._labels[barangay][kept]
+            self._touch(barangay)
+
+    def _reorder(self, barangay):
+        """Re-sorts one barangay's labels by period after rows were added or re-dated."""
+        labels = self._labels[barangay]
+        periods = self._df.loc[labels, 'Period'].to_numpy()
+        self._labels[barangay] = labels[np.argsort(periods, kind='stable')]
+
+    def _coerce(self, col, value):
+        """Converts a raw value from the data editor to the column's type."""
+        if value is None:
+            return np.nan if pd.api.types.is_numeric_dtype(self._df[col]) else None
+        if col == 'Period':
+            return pd.to_datetime(value)
+        if pd.api.types.is_integer_dtype(self._df[col]):
+            return int(value)
+        if pd.api.types.is_float_dtype(self._df[col]):
+            return float(value)
+        return value
+
+    def apply_editor_delta(self, barangay, displayed, editor_state):
+        """
+        Applies the change state of an `st.data_editor` showing `display_rows(barangay)`.
+
+        Args:
+            barangay (str): The barangay shown in the editor.
+            displayed (pd.DataFrame): The exact frame passed to the editor.
+            editor_state (dict): The editor's session state, with 'edited_rows'
+                ({position: {column: value}}), 'added_rows' and 'deleted_rows'.
+
+        Returns:
+            tuple: (bool, int) -> (Whether anything changed, Number of added rows skipped
+                   because they had no Period)
+        """
+        if not editor_state:
+            return False, 0
+
+        changes = {}
+        for position, row_changes in editor_state.get('edited_rows', {}).items():
+            label = displayed.index[int(position)]
+            # Derived display columns (Year, Quarter) are not stored
+            changes[label] = {
+                col: self._coerce(col, value) for col, value in row_changes.items() if col in self._df.columns
+            }
+
+        new_rows = []
+        skipped = 0
+        for added in editor_state.get('added_rows', []):
+            row = {col: self._coerce(col, value) for col, value in added.items() if col in self._df.columns}
+            if row.get('Period') is None:
+                skipped += 1
+                continue
+            row['Barangay'] = barangay
+            new_rows.append(row)
+
+        deleted = [displayed.index[int(position)] for position in editor_state.get('deleted_rows', [])]
+
+        # Cell edits that only restate the current value are not changes
+        changes = {
+            label: {col: value for col, value in row_changes.items() if not _same(self._df.at[label, col], value)}
+            for label, row_changes in changes.items()
+        }
+        changes = {label: row_changes for label, row_changes in changes.items() if row_changes}
+
+        self.update_cells(changes)
+        self.delete_rows(deleted)
+        self.append_rows(new_rows)
+        return bool(changes or deleted or new_rows), skipped
+
+
+def _same(old, new):
+    """Equality that treats two missing values as equal."""
+    if pd.isna(old) and pd.isna(new):
+        return True
+    return old == new
+
+
+class SessionDataset:
+    """
+    One session's view of a shared, read-only `IndexedDataset`, with its own edits.
+
+    Reads of barangays the session has not edited go straight to the base (and its
+    memoized slices). Each edited barangay lives in a small `IndexedDataset` of its own
+    rows in the overlay; the base is never modified.
+
+    Args:
+        base (IndexedDataset): The shared dataset. It must not be edited.
+    """
+
+    def __init__(self, base):
+        self._base = base
+        # barangay -> IndexedDataset holding the session's version of its rows
+        self._overlay = {}
+        self._overlay_edits = 0
+        self._memo = {}
+
+    def _source(self, barangay):
+        return self._overlay.get(barangay, self._base)
+
+    def _copy_on_write(self, barangay):
+        """The overlay dataset of `barangay`, created from the base rows on first use."""
+        if barangay not in self._overlay:
+            self._overlay[barangay] = IndexedDataset(self._base.rows(barangay))
+        return self._overlay[barangay]
+
+    def _changed(self):
+        self._overlay_edits += 1
+        self._memo.clear()
+
+    # --- Read Access ---
+
+    @property
+    def base(self):
+        """The shared dataset."""
+        return self._base
+
+    @property
+    def frame(self):
+        """The full table with this session's edits (not a copy; do not modify it)."""
+        if not self._overlay:
+            return self._base.frame
+        if 'frame' not in self._memo:
+            base = self._base.frame
+            kept = base[~base['Barangay'].isin(list(self._overlay))]
+            frame = pd.concat([kept] + [overlay.frame for overlay in self._overlay.values()], ignore_index=True)
+            for col, dtype in base.dtypes.items():
+                if isinstance(dtype, pd.CategoricalDtype) and not isinstance(frame[col].dtype, pd.CategoricalDtype):
+                    # Names added in the session give the parts different categories
+                    frame[col] = frame[col].astype('category')
+            self._memo['frame'] = frame
+        return self._memo['frame']
+
+    def barangays(self):
+        """Barangays with rows, base barangays first, in order of first appearance."""
+        base_names = self._base.barangays()
+        if not self._overlay:
+            return base_names
+        # Only overlays can differ from the base: emptied ones are dropped, new ones appended
+        emptied = {name for name, overlay in self._overlay.items() if not len(overlay)}
+        known = set(base_names)
+        return ([name for name in base_names if name not in emptied]
+                + [name for name, overlay in self._overlay.items() if name not in known and len(overlay)])
+
+    def has_barangay(self, barangay):
+        """Whether the barangay has rows in this session's view."""
+        if barangay in self._overlay:
+            return len(self._overlay[barangay]) > 0
+        return self._base.has_barangay(barangay)
+
+    def edited_barangays(self):
+        """Barangays this session has edited."""
+        return list(self._overlay)
+
+    def overlay_hash(self):
+        """Content hash of the session's edits ('' when there are none)."""
+        if not self._overlay:
+            return ''
+        if 'hash' not in self._memo:
+            digest = hashlib.sha256()
+            for barangay in sorted(self._overlay):
+                rows = self._overlay[barangay].rows(barangay)
+                digest.update(str(barangay).encode())
+                digest.update(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes())
+            self._memo['hash'] = digest.hexdigest()[:16]
+        return self._memo['hash']
+
+    def data_version(self):
+        """The base version plus the overlay hash; equal for sessions with the same data."""
+        overlay = self.overlay_hash()
+        return f"{self._base.data_version()}+{overlay}" if overlay else self._base.data_version()
+
+    def memory_usage(self):
+        """Bytes held by this session's overlay (the base is shared)."""
+        return sum(overlay.memory_usage() for overlay in self._overlay.values())
+
+    def __len__(self):
+        return len(self.frame)
+
+    def rows(self, barangay):
+        return self._source(barangay).rows(barangay)
+
+    def series_frame(self, barangay):
+        return self._source(barangay).series_frame(barangay)
+
+    def model_series_frame(self, barangay):
+        return self._source(barangay).model_series_frame(barangay)
+
+    def display_rows(self, barangay):
+        return self._source(barangay).display_rows(barangay)
+
+    # --- Edits (copy-on-write) ---
+
+    def append_rows(self, rows):
+        """Appends rows (see `IndexedDataset.append_rows`) to the overlays of their barangays."""
+        by_barangay = {}
+        for row in rows:
+            by_barangay.setdefault(row['Barangay'], []).append(row)
+        for barangay, barangay_rows in by_barangay.items():
+            if barangay not in self._overlay and barangay not in self._base.barangays():
+                # A new barangay starts from an empty table with the base's columns and types
+                self._overlay[barangay] = IndexedDataset(self._base.frame.iloc[:0])
+            self._copy_on_write(barangay).append_rows(barangay_rows)
+        if rows:
+            self._changed()
+
+    def apply_editor_delta(self, barangay, displayed, editor_state):
+        """
+        Applies the change state of an `st.data_editor` showing `display_rows(barangay)`.
+
+        See `IndexedDataset.apply_editor_delta`. The barangay is only copied into the
+        overlay when the editor reports changes.
+        """
+        if not editor_state or not any(editor_state.get(name) for name in ('edited_rows', 'added_rows', 'deleted_rows')):
+            return False, 0
+        created = barangay not in self._overlay
+        overlay = self._copy_on_write(barangay)
+        # Same rows in the same order as `displayed`, so editor positions map to the copy's labels
+        changed, skipped = overlay.apply_editor_delta(barangay, overlay.display_rows(barangay), editor_state)
+        if changed:
+            self._changed()
+        elif created:
+            del self._overlay[barangay]
+        return changed, skipped
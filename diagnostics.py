@@ -0,0 +1,152 @@
+"""
+Deferred ARIMA model diagnostics.
+
+Fitting a model only needs its parameters; the statsmodels summary table
+(standard errors, Ljung-Box, Jarque-Bera and heteroskedasticity tests) and the
+residual autocorrelations are only needed when someone opens the diagnostics.
+`ModelDiagnostics` keeps what is required to produce them (the series, the
+order and the fitted parameters) and computes each artifact on first request.
+
+Computed artifacts are kept in a small process-wide cache keyed by the series
+content, order and parameters, so copies of the same diagnostics (e.g. the ones
+returned by `st.cache_data` on every rerun) compute them only once.
+"""
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Computed artifacts for this many models are kept in memory
+MAX_CACHED_MODELS = 512
+
+_artifacts = OrderedDict()
+_artifacts_lock = threading.Lock()
+
+
+def _cached(key, name, compute):
+    """Returns artifact `name` of model `key`, computing and caching it on first use."""
+    with _artifacts_lock:
+        entry = _artifacts.get(key)
+        if entry is not None and name in entry:
+            _artifacts.move_to_end(key)
+            return entry[name]
+
+    value = compute()
+
+    with _artifacts_lock:
+        _artifacts.setdefault(key, {})[name] = value
+        _artifacts.move_to_end(key)
+        while len(_artifacts) > MAX_CACHED_MODELS:
+            _artifacts.popitem(last=False)
+    return value
+
+
+class ModelDiagnostics:
+    """
+    Summary, residual ACF and test statistics of a fitted ARIMA model, computed on demand.
+
+    Args:
+        data_series (pd.Series): The series the model was fitted on.
+        order (tuple): The (p, d, q) order.
+        params (pd.Series): The fitted parameters, indexed by name.
+        results: The statsmodels results object, if already at hand. It is used
+            instead of re-filtering but is not pickled.
+        backtest_fit (tuple): (first window size, parameters estimated on it) of the
+            model's rolling-origin backtest (see `backtest.first_window_fit`), or None.
+    """
+
+    def __init__(self, data_series, order, params, results=None, backtest_fit=None):
+        self.data_series = data_series
+        self.order = tuple(order)
+        self.params = params
+        self.backtest_fit = backtest_fit
+        self._results = results
+        self._key = None
+
+    def __getstate__(self):
+        # The results object is large and can always be rebuilt from the parameters
+        state = self.__dict__.copy()
+        state['_results'] = None
+        return state
+
+    def __str__(self):
+        return self.summary_text()
+
+    @property
+    def key(self):
+        """Content hash of the series, order and parameters."""
+        if self._key is None:
+            digest = hashlib.sha256()
+            digest.update(np.ascontiguousarray(self.data_series.values, dtype=np.float64).tobytes())
+            digest.update(np.asarray(self.data_series.index.values, dtype='datetime64[ns]').tobytes())
+            digest.update(repr(self.order).encode())
+            digest.update(np.ascontiguousarray(self.params.values, dtype=np.float64).tobytes())
+            self._key = digest.hexdigest()
+        return self._key
+
+    def results(self):
+        """The statsmodels results, rebuilt by filtering with the fitted parameters if needed."""
+        if self._results is None:
+            from statsmodels.tsa.arima.model import ARIMA
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                model = ARIMA(self.data_series, order=self.order, freq='QS-JAN')
+                self._results = model.filter(self.params.reindex(model.param_names).values)
+        return self._results
+
+    def summary_text(self):
+        """The statsmodels summary table as text."""
+        def compute():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return self.results().summary().as_text()
+        return _cached(self.key, 'summary', compute)
+
+    def residual_acf(self, nlags=12):
+        """
+        Autocorrelation of the standardized residuals.
+
+        Returns:
+            pd.DataFrame: Indexed by 'Lag' with columns 'ACF' and 'Bound' (approximate
+            95% band, +/- 1.96 / sqrt(n)).
+        """
+        def compute():
+            from statsmodels.tsa.stattools import acf
+
+            residuals = self.results().resid.iloc[self.order[1]:]
+            lags = min(nlags, len(residuals) - 1)
+            values = acf(residuals, nlags=lags, fft=False)[1:]
+            return pd.DataFrame(
+                {'ACF': values, 'Bound': 1.96 / np.sqrt(len(residuals))},
+                index=pd.Index(np.arange(1, lags + 1), name='Lag')
+            )
+        return _cached(self.key, f"acf:{nlags}", compute).copy()
+
+    def test_statistics(self):
+        """
+        The residual tests reported in the summary table.
+
+        Returns:
+            dict: {test name: {'statistic': float, 'p_value': float}} for the Ljung-Box
+            (lag 1), Jarque-Bera and heteroskedasticity (H) tests.
+        """
+        def compute():
+            results = self.results()
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                ljung_box = results.test_serial_correlation(method='ljungbox', lags=[1])
+                jarque_bera = results.test_normality(method='jarquebera')
+                heteroskedasticity = results.test_heteroskedasticity(method='breakvar')
+            return {
+                'Ljung-Box (L1)': {'statistic': float(ljung_box[0, 0, 0]), 'p_value': float(ljung_box[0, 1, 0])},
+                'Jarque-Bera': {'statistic': float(jarque_bera[0, 0]), 'p_value': float(jarque_bera[0, 1])},
+                'Heteroskedasticity (H)': {
+                    'statistic': float(heteroskedasticity[0, 0]),
+                    'p_value': float(heteroskedasticity[0, 1]),
+                },
+            }
+        return {name: dict(values) for name, values in _cached(self.key, 'tests', compute).items()}
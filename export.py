@@ -0,0 +1,260 @@
+"""
+Streaming export of the forecasts of every barangay and metric.
+
+Each exported row is one forecast quarter of one (barangay, metric) series, with
+its 80% and 95% prediction intervals, the backtest MAPE, the model order and the
+fit status. Series that could not be fitted get a single row with their error.
+
+Rows are written batch by batch as forecasts complete, so memory stays bounded by
+one batch whatever the number of barangays:
+
+- CSV: the header is written once, then every batch is appended.
+- Parquet: every batch becomes a row group of one `pyarrow.parquet.ParquetWriter`.
+- XLSX: rows are streamed into a write-only openpyxl workbook.
+
+Command line (forecasts are fitted in chunks of barangays with
+`batch_forecast.iter_batch_forecast`, on one process pool, and each chunk is written
+as soon as it is done):
+
+    $ python export.py --output forecasts.parquet --engine vectorized --chunk-barangays 500
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from simulation import INTERVAL_LEVELS
+
+EXPORT_FORMATS = ('csv', 'parquet', 'xlsx')
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+INTERVAL_COLUMNS = [f"{side} {level}%" for level in INTERVAL_LEVELS for side in ('Lower', 'Upper')]
+EXPORT_COLUMNS = ['Barangay', 'Metric', 'Period', 'Year', 'Quarter', 'Forecast', *INTERVAL_COLUMNS,
+                  'MAPE (%)', 'Order', 'Status']
+# Column types of every batch, so all batches share one Parquet schema
+EXPORT_DTYPES = {
+    'Barangay': 'str', 'Metric': 'str', 'Period': 'datetime64[ns]', 'Year': 'Int64', 'Quarter': 'str',
+    'Forecast': 'float64', **{col: 'float64' for col in INTERVAL_COLUMNS},
+    'MAPE (%)': 'float64', 'Order': 'str', 'Status': 'str',
+}
+
+
+# --- 1. Export Rows ---
+
+def _mape_value(mape):
+    """MAPE in percent from its display string ('12.34% '), or NaN for 'N/A'."""
+    try:
+        return float(str(mape).strip().rstrip('%'))
+    except ValueError:
+        return np.nan
+
+
+def forecast_rows(barangay, metric, result):
+    """
+    Export rows of one series' forecast.
+
+    Args:
+        barangay (str): The barangay.
+        metric (str): The metric column.
+        result (SeriesForecast): The fitted forecast, or a failed one (`forecast` None,
+            error message in `summary`).
+
+    Returns:
+        pd.DataFrame: One row per forecast quarter in EXPORT_COLUMNS, or a single row
+        with the error as 'Status' if the series was not fitted.
+    """
+    order = str(tuple(result.order)) if result.order is not None else None
+    if result.forecast is None:
+        row = dict.fromkeys(EXPORT_COLUMNS)
+        row.update({'Barangay': barangay, 'Metric': metric, 'Order': order, 'Status': str(result.summary)})
+        return pd.DataFrame([row], columns=EXPORT_COLUMNS)
+
+    periods = pd.DatetimeIndex(result.forecast.index)
+    frame = pd.DataFrame({
+        'Barangay': barangay,
+        'Metric': metric,
+        'Period': periods,
+        'Year': periods.year,
+        'Quarter': 'Q' + periods.quarter.astype(str),
+        'Forecast': result.forecast.to_numpy(dtype=np.float64),
+    })
+    for level in INTERVAL_LEVELS:
+        for side in ('lower', 'upper'):
+            column = f"{side}_{level}"
+            frame[f"{side.capitalize()} {level}%"] = (
+                result.intervals[column].to_numpy(dtype=np.float64)
+                if result.intervals is not None and column in result.intervals else np.nan
+            )
+    frame['MAPE (%)'] = _mape_value(result.mape)
+    frame['Order'] = order
+    frame['Status'] = 'OK'
+    return frame
+
+
+# --- 2. Incremental Writers ---
+
+class ExportWriter:
+    """
+    Writes export batches to one CSV, Parquet or XLSX file as they arrive.
+
+    Use as a context manager; the file is complete once it is closed.
+
+    Args:
+        target (str or file-like): Path, or a binary file object opened for writing.
+        fmt (str): One of EXPORT_FORMATS.
+    """
+
+    def __init__(self, target, fmt):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'; expected one of {', '.join(EXPORT_FORMATS)}.")
+        self.target = target
+        self.fmt = fmt
+        self.rows = 0
+        self._handle = None
+        self._writer = None
+
+        if fmt == 'csv':
+            self._handle = open(target, 'wb') if isinstance(target, (str, os.PathLike)) else target
+            self._handle.write((','.join(EXPORT_COLUMNS) + '\n').encode())
+        elif fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._schema = pa.Schema.from_pandas(
+                pd.DataFrame(columns=EXPORT_COLUMNS).astype(EXPORT_DTYPES), preserve_index=False
+            )
+            self._writer = pq.ParquetWriter(target, self._schema)
+        else:
+            from openpyxl import Workbook
+            # Write-only workbooks stream rows to disk instead of keeping every cell in memory
+            self._writer = Workbook(write_only=True)
+            self._sheet = self._writer.create_sheet('Forecasts')
+            self._sheet.append(EXPORT_COLUMNS)
+
+    def write(self, frame):
+        """Appends one batch of rows (a DataFrame in EXPORT_COLUMNS)."""
+        if frame.empty:
+            return
+        frame = frame[EXPORT_COLUMNS]
+        if self.fmt == 'csv':
+            self._handle.write(frame.to_csv(index=False, header=False).encode())
+        elif self.fmt == 'parquet':
+            import pyarrow as pa
+            self._writer.write_table(
+                pa.Table.from_pandas(frame.astype(EXPORT_DTYPES), schema=self._schema, preserve_index=False)
+            )
+        else:
+            for row in frame.itertuples(index=False):
+                self._sheet.append([_cell(value) for value in row])
+        self.rows += len(frame)
+
+    def close(self):
+        """Finishes the file (footer, workbook) and closes what this writer opened."""
+        if self.fmt == 'csv':
+            if isinstance(self.target, (str, os.PathLike)):
+                self._handle.close()
+            else:
+                self._handle.flush()
+        elif self.fmt == 'parquet':
+            self._writer.close()
+        else:
+            self._writer.save(self.target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _cell(value):
+    """An XLSX cell value: Timestamps become datetimes and missing values empty cells."""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def export_forecasts(batches, target, fmt):
+    """
+    Streams batches of forecast results to a file.
+
+    Args:
+        batches (iterable): Lists of (barangay, metric, SeriesForecast); each list is
+            converted and written as soon as it is produced.
+        target (str or file-like): Output path or binary file object.
+        fmt (str): One of EXPORT_FORMATS.
+
+    Returns:
+        int: Number of rows written.
+    """
+    with ExportWriter(target, fmt) as writer:
+        for batch in batches:
+            frames = [forecast_rows(barangay, metric, result) for barangay, metric, result in batch]
+            if frames:
+                writer.write(pd.concat(frames, ignore_index=True))
+    return writer.rows
+
+
+def format_from_path(path):
+    """The export format implied by a file extension ('csv' if unknown)."""
+    extension = os.path.splitext(str(path))[1].lower().lstrip('.')
+    return extension if extension in EXPORT_FORMATS else 'csv'
+
+
+# --- 3. Command Line ---
+
+def main(argv=None):
+    """Command line entry point: forecasts every barangay in chunks and streams them to one file."""
+    # batch_forecast imports the app module, so it is only loaded for command-line runs
+    from batch_forecast import iter_batch_forecast
+    from data_source import load_dataset
+    from streamlit_app import load_data, preprocess_data
+
+    parser = argparse.ArgumentParser(description="Export forecasts of every barangay and metric.")
+    parser.add_argument('--input', help="CSV/XLSX/Parquet file in the Copra Production schema "
+                                        "(defaults to COPRA_DATA_SOURCE or the embedded dataset).")
+    parser.add_argument('--output', default='forecasts_export.csv', help="Output file (.csv, .parquet or .xlsx).")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                        help="Output format (default: from the --output extension).")
+    parser.add_argument('--end-year', type=int, default=2035, help="Last year to forecast to.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: number of CPUs).")
+    parser.add_argument('--engine', choices=['statsmodels', 'vectorized'], default='statsmodels',
+                        help="Fit each series with statsmodels, or all ARIMA(1,1,0) fits at once with NumPy.")
+    parser.add_argument('--order', default='1,1,0', help="ARIMA order as 'p,d,q', or 'auto' to select it per series.")
+    parser.add_argument('--criterion', choices=['aic', 'bic'], default='aic', help="Criterion for --order auto.")
+    parser.add_argument('--chunk-barangays', type=int, default=500,
+                        help="Barangays forecast and written per batch (default 500).")
+    args = parser.parse_args(argv)
+
+    df = preprocess_data(load_dataset(args.input)) if args.input else load_data()
+    order = 'auto' if args.order == 'auto' else tuple(int(x) for x in args.order.split(','))
+    fmt = args.format or format_from_path(args.output)
+    n_barangays = df['Barangay'].nunique()
+
+    def batches():
+        done = 0
+        # One process pool for every chunk; series shared across chunks are fitted once
+        for results in iter_batch_forecast(
+            df, args.chunk_barangays, forecast_end_year=args.end_year, max_workers=args.workers,
+            engine=args.engine, order=order, criterion=args.criterion
+        ):
+            yield [(barangay, metric, result) for (barangay, metric), result in results.items()]
+            done += len({barangay for barangay, _ in results})
+            print(f"Exported {done}/{n_barangays} barangays ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    n_rows = export_forecasts(batches(), args.output, fmt)
+    print(f"Wrote {n_rows} rows to {args.output} in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
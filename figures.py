@@ -0,0 +1,339 @@
+"""
+Cached chart rendering for the dashboard.
+
+Every chart is drawn on a standalone `matplotlib.figure.Figure` (not through
+pyplot, so no figure is ever registered globally or left open), saved to PNG
+or SVG bytes and released. The bytes are kept in a process-wide LRU cache keyed
+by a hash of the plotted data and the plot parameters, so a rerun with
+unchanged data only looks the image up instead of drawing it again.
+
+The cache is bounded by the total size of the stored images
+(COPRA_FIGURE_CACHE_MB, default 64).
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Same output settings as st.pyplot, so cached images look like the figures they replace
+DEFAULT_DPI = 200
+# Streamlit downsizes (and re-encodes) wider images on every st.image call; rendering
+# no wider than this keeps cached bytes servable as they are
+MAX_IMAGE_WIDTH = 1460
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_state = {'bytes': 0, 'hits': 0, 'misses': 0}
+
+
+def _max_cache_bytes():
+    return int(float(os.environ.get('COPRA_FIGURE_CACHE_MB', 64)) * 1024 ** 2)
+
+
+def data_digest(*objects):
+    """Content hash of pandas objects (values, index and names) and plain parameters."""
+    digest = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+            names = obj.columns if isinstance(obj, pd.DataFrame) else [obj.name]
+            digest.update(repr(list(names)).encode())
+        else:
+            digest.update(repr(obj).encode())
+    return digest.hexdigest()
+
+
+def render(key, draw, figsize, fmt='png', dpi=DEFAULT_DPI):
+    """
+    Returns the image for `key`, drawing it with `draw(fig, ax)` on a cache miss.
+
+    Args:
+        key (str): Identifies the chart's data and parameters (see `data_digest`).
+        draw (callable): draw(fig, ax) that plots onto the given axes.
+        figsize (tuple): Figure size in inches.
+        fmt (str): 'png' or 'svg'.
+        dpi (int): Resolution for PNG output; lowered if the image would be wider
+            than MAX_IMAGE_WIDTH pixels.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    cache_key = (key, tuple(figsize), fmt, dpi)
+    with _cache_lock:
+        image = _cache.get(cache_key)
+        if image is not None:
+            _cache.move_to_end(cache_key)
+            _cache_state['hits'] += 1
+            return image
+        _cache_state['misses'] += 1
+
+    # matplotlib is imported on the first cache miss, not when the app starts
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.subplots()
+        draw(fig, ax)
+        if fmt == 'png':
+            # Width of the tight bounding box (plus savefig's default 0.1 in padding per side)
+            tight_width = fig.get_tightbbox(fig.canvas.get_renderer()).width + 0.2
+            dpi = min(dpi, MAX_IMAGE_WIDTH / tight_width)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+        image = buffer.getvalue()
+    finally:
+        # Drop every artist so nothing holds on to the data once the bytes exist
+        fig.clear()
+
+    with _cache_lock:
+        if cache_key not in _cache:
+            _cache[cache_key] = image
+            _cache_state['bytes'] += len(image)
+        max_bytes = _max_cache_bytes()
+        while _cache_state['bytes'] > max_bytes and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_state['bytes'] -= len(evicted)
+    return image
+
+
+def cache_stats():
+    """Hit/miss counters, number of images and total bytes in the figure cache."""
+    with _cache_lock:
+        return {**_cache_state, 'images': len(_cache)}
+
+
+def clear_cache():
+    """Empties the figure cache."""
+    with _cache_lock:
+        _cache.clear()
+        _cache_state.update(bytes=0, hits=0, misses=0)
+
+
+# --- Dashboard Charts ---
+
+def history_production(ts_production):
+    """Historical production line chart (main page, section 2)."""
+    def draw(fig, ax):
+        ts_production.plot(ax=ax, marker='o', linestyle='-', color='#0077B6', label='Production (MT)')
+        ax.set_title('Copra Production Trend')
+        ax.set_xlabel('Time (Quarterly)')
+        ax.set_ylabel('Production (MT)')
+        ax.grid(axis='y', linestyle='--')
+        ax.legend(loc='upper left')
+    return render(data_digest('history_production', ts_production), draw, (10, 5))
+
+
+def history_prices(ts_farmgate, ts_millgate):
+    """Historical farmgate and millgate price chart (main page, section 2)."""
+    def draw(fig, ax):
+        ts_farmgate.plot(ax=ax, marker='s', linestyle='-', color='#48A9A6', label='Farmgate Price')
+        ts_millgate.plot(ax=ax, marker='^', linestyle='-', color='#F4A261', label='Millgate Price')
+        ax.set_title('Copra Price Trends')
+        ax.set_xlabel('Time (Quarterly)')
+        ax.set_ylabel('Price (PHP/kg)')
+        ax.grid(axis='y', linestyle='--')
+        ax.legend(loc='upper left')
+    return render(data_digest('history_prices', ts_farmgate, ts_millgate), draw, (10, 5))
+
+
+def _interval_bands(ax, intervals, color, label=None):
+    """Shades the prediction intervals of `simulation.interval_frame`, widest first."""
+    levels = sorted((int(column.split('_')[1]) for column in intervals.columns if column.startswith('lower_')),
+                    reverse=True)
+    for i, level in enumerate(levels):
+        ax.fill_between(
+            intervals.index, intervals[f'lower_{level}'], intervals[f'upper_{level}'], color=color,
+            alpha=0.12 + 0.1 * i, linewidth=0, label=f'{label} {level}% interval' if label else f'{level}% interval'
+        )
+
+
+def forecast_production(df_combined_plot, barangay, last_historical_date, intervals=None):
+    """
+    Historical + forecast production chart (main page, section 3).
+
+    Args:
+        intervals (pd.DataFrame): Optional prediction intervals of the forecast, shaded around it.
+    """
+    def draw(fig, ax):
+        # Plot Historical Production
+        df_combined_plot[df_combined_plot['Type'] == 'Historical']['Copra_Production (MT)'].plot(
+            ax=ax, label='Historical Production', color='#1E88E5', linestyle='-', marker='.'
+        )
+        # Plot Forecast Production
+        df_combined_plot[df_combined_plot['Type'] == 'Forecast']['Copra_Production (MT)'].plot(
+            ax=ax, label='ARIMA Forecast', color='#FF7043', linestyle='--', marker='.'
+        )
+        if intervals is not None:
+            _interval_bands(ax, intervals, '#FF7043')
+        ax.set_title(f'Copra Production Forecast for {barangay}')
+        ax.set_xlabel('Period')
+        ax.set_ylabel('Copra Production (MT)')
+        ax.legend()
+        ax.grid(axis='y', linestyle=':')
+        # Draw a line at the last historical point
+        ax.axvline(x=last_historical_date, color='grey', linestyle=':', linewidth=2, label='Forecast Start')
+    key = data_digest('forecast_production', df_combined_plot, barangay, last_historical_date,
+                      intervals if intervals is not None else 'none')
+    return render(key, draw, (10, 5))
+
+
+def forecast_prices(df_combined_plot, barangay, last_historical_date, farmgate_intervals=None,
+                    millgate_intervals=None):
+    """
+    Historical + forecast farmgate and millgate price chart (main page, section 3).
+
+    Args:
+        farmgate_intervals (pd.DataFrame): Optional prediction intervals of the farmgate forecast.
+        millgate_intervals (pd.DataFrame): Optional prediction intervals of the millgate forecast.
+    """
+    def draw(fig, ax):
+        # Plot Historical Prices
+        df_hist = df_combined_plot[df_combined_plot['Type'] == 'Historical']
+        df_hist['Farmgate Price (PHP/kg)'].plot(ax=ax, label='Historical Farmgate', color='#00A896', linestyle='-', marker='s')
+        df_hist['Millgate Price (PHP/kg)'].plot(ax=ax, label='Historical Millgate', color='#F4B400', linestyle='-', marker='^')
+        # Plot Forecast Prices
+        df_fore = df_combined_plot[df_combined_plot['Type'] == 'Forecast']
+        df_fore['Farmgate Price (PHP/kg)'].plot(ax=ax, label='Forecast Farmgate', color='#00A896', linestyle='--', alpha=0.7)
+        df_fore['Millgate Price (PHP/kg)'].plot(ax=ax, label='Forecast Millgate', color='#F4B400', linestyle='--', alpha=0.7)
+        if farmgate_intervals is not None:
+            _interval_bands(ax, farmgate_intervals, '#00A896', 'Farmgate')
+        if millgate_intervals is not None:
+            _interval_bands(ax, millgate_intervals, '#F4B400', 'Millgate')
+        ax.set_title(f'Price Forecast for {barangay}')
+        ax.set_xlabel('Period')
+        ax.set_ylabel('Price (PHP/kg)')
+        ax.legend(loc='upper left')
+        ax.grid(axis='y', linestyle=':')
+        # Draw a line at the last historical point
+        ax.axvline(x=last_historical_date, color='grey', linestyle=':', linewidth=2, label='Forecast Start')
+    key = data_digest('forecast_prices', df_combined_plot, barangay, last_historical_date,
+                      *(frame if frame is not None else 'none' for frame in (farmgate_intervals, millgate_intervals)))
+    return render(key, draw, (10, 5))
+
+
+def comparison(df_pivot, title, ylabel, figsize=(10, 5), legend_kwargs=None):
+    """
+    One line per barangay (comparison page).
+
+    Args:
+        df_pivot (pd.DataFrame): Period x Barangay values.
+        title (str): Chart title.
+        ylabel (str): Y axis label.
+        figsize (tuple): Figure size in inches.
+        legend_kwargs (dict): Keyword arguments for the legend.
+    """
+    legend_kwargs = legend_kwargs or {}
+
+    def draw(fig, ax):
+        df_pivot.plot(ax=ax, marker='.', linestyle='-')
+        ax.set_title(title)
+        ax.set_xlabel('Period')
+        ax.set_ylabel(ylabel)
+        ax.legend(title='Barangay', **legend_kwargs)
+        ax.grid(axis='y', linestyle=':')
+        fig.tight_layout()
+    key = data_digest('comparison', df_pivot, title, ylabel, sorted(legend_kwargs.items()))
+    return render(key, draw, figsize)
+
+
+def percentile_band(bands, title, ylabel, figsize=(10, 5), highlight=None):
+    """
+    Median line with shaded percentile bands across barangays (comparison page).
+
+    Args:
+        bands (pd.DataFrame): Period x percentile columns ('p10', 'p25', 'p50', ...)
+            as returned by `comparison.percentile_bands`.
+        title (str): Chart title.
+        ylabel (str): Y axis label.
+        figsize (tuple): Figure size in inches.
+        highlight (pd.DataFrame): Optional Period x Barangay lines drawn over the bands.
+    """
+    percentile_columns = sorted(
+        (column for column in bands.columns if column.startswith('p')), key=lambda column: float(column[1:])
+    )
+
+    def draw(fig, ax):
+        # Shade from the outermost pair of percentiles inwards
+        for i in range(len(percentile_columns) // 2):
+            low, high = percentile_columns[i], percentile_columns[-1 - i]
+            ax.fill_between(bands.index, bands[low], bands[high], color='#0077B6', alpha=0.15 + 0.15 * i,
+                            linewidth=0, label=f"{low[1:]}th-{high[1:]}th percentile")
+        if len(percentile_columns) % 2:
+            median = percentile_columns[len(percentile_columns) // 2]
+            ax.plot(bands.index, bands[median], color='#023E8A', linestyle='-', marker='.',
+                    label=f"{median[1:]}th percentile")
+        if highlight is not None:
+            for barangay in highlight.columns:
+                ax.plot(highlight.index, highlight[barangay], linestyle='--', linewidth=1.2, label=barangay)
+        ax.set_title(title)
+        ax.set_xlabel('Period')
+        ax.set_ylabel(ylabel)
+        ax.legend(loc='upper left', fontsize=8)
+        ax.grid(axis='y', linestyle=':')
+        fig.tight_layout()
+    key = data_digest('percentile_band', bands, highlight if highlight is not None else 'none', title, ylabel)
+    return render(key, draw, figsize)
+
+
+def hierarchy_forecast(history, base, reconciled, node, method_label):
+    """
+    History, base forecast and reconciled forecast of one hierarchy node (hierarchical page).
+
+    Args:
+        history (pd.Series): The node's historical values.
+        base (pd.Series): The node's independent (base) forecast.
+        reconciled (pd.Series): The node's reconciled forecast.
+        node (str): Node name, used in the title.
+        method_label (str): Name of the reconciliation method, used in the legend.
+    """
+    def draw(fig, ax):
+        history.plot(ax=ax, label='Historical', color='#1E88E5', linestyle='-', marker='.', x_compat=True)
+        base.plot(ax=ax, label='Base forecast', color='#9E9E9E', linestyle='--', marker='.')
+        reconciled.plot(ax=ax, label=f'Reconciled ({method_label})', color='#FF7043', linestyle='-', marker='.')
+        ax.axvline(x=history.index.max(), color='grey', linestyle=':', linewidth=2)
+        ax.set_title(f'Copra Production Forecast: {node}')
+        ax.set_xlabel('Period')
+        ax.set_ylabel('Copra Production (MT)')
+        ax.legend(loc='upper left')
+        ax.grid(axis='y', linestyle=':')
+    key = data_digest('hierarchy_forecast', history, base, reconciled, node, method_label)
+    return render(key, draw, (10, 5))
+
+
+def fan_chart(history, quantiles, title, ylabel, color='#FF7043'):
+    """
+    Simulated forecast quantiles as nested bands around the median (main page, section 3).
+
+    Args:
+        history (pd.Series): Historical values drawn before the forecast (may be None).
+        quantiles (pd.DataFrame): Period x quantile columns ('q05', ..., 'q50', ..., 'q95')
+            as returned by `simulation.path_quantiles`.
+        title (str): Chart title.
+        ylabel (str): Y axis label.
+        color (str): Color of the bands and the median.
+    """
+    columns = list(quantiles.columns)
+
+    def draw(fig, ax):
+        if history is not None:
+            # x_compat keeps date units on the axis, so the bands below line up with the history
+            history.plot(ax=ax, label='Historical', color='#1E88E5', linestyle='-', marker='.', x_compat=True)
+        for i in range(len(columns) // 2):
+            low, high = columns[i], columns[-1 - i]
+            ax.fill_between(quantiles.index, quantiles[low], quantiles[high], color=color, alpha=0.12 + 0.1 * i,
+                            linewidth=0, label=f"{int(low[1:])}th-{int(high[1:])}th percentile")
+        if len(columns) % 2:
+            ax.plot(quantiles.index, quantiles[columns[len(columns) // 2]], color=color, linestyle='--',
+                    marker='.', label='Median')
+        ax.set_title(title)
+        ax.set_xlabel('Period')
+        ax.set_ylabel(ylabel)
+        ax.legend(loc='upper left', fontsize=8)
+        ax.grid(axis='y', linestyle=':')
+    key = data_digest('fan_chart', history if history is not None else 'none', quantiles, title, ylabel, color)
+    return render(key, draw, (10, 5))
@@ -0,0 +1,211 @@
+"""
+Persistent on-disk cache of per-series forecasts.
+
+Entries are keyed by a content hash of the series (values and dates) together
+with the model settings, the forecast horizon and the versions of the numeric
+libraries, so a restart or redeploy with unchanged data is served from disk
+without refitting. Each entry is one compressed `.npz` file holding the
+forecast, backtest table, fitted parameters and a small JSON header; model
+diagnostics are not stored, since they can be rebuilt from the parameters.
+
+The cache is bounded: when it grows past `max_bytes`, the least recently used
+entries (by file modification time, refreshed on every hit) are deleted.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout changes so stale entries are never read
+CACHE_FORMAT_VERSION = 2
+
+
+def _library_versions():
+    """Versions that can change fitted results, folded into every key."""
+    import statsmodels
+    return f"numpy={np.__version__};pandas={pd.__version__};statsmodels={statsmodels.__version__}"
+
+
+def series_hash(data_series):
+    """Content hash of a series' values and dates."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data_series.values, dtype=np.float64).tobytes())
+    digest.update(np.asarray(data_series.index.values, dtype='datetime64[ns]').tobytes())
+    return digest.hexdigest()
+
+
+def series_key(data_series, order, criterion, forecast_end_year):
+    """
+    Cache key for forecasting `data_series` with the given settings.
+
+    Args:
+        data_series (pd.Series): The time series data.
+        order (tuple or str): The (p, d, q) order or 'auto'.
+        criterion (str): Selection criterion (only relevant when order is 'auto').
+        forecast_end_year (int): The last year forecast to.
+    """
+    settings = f"v{CACHE_FORMAT_VERSION};order={order};criterion={criterion};end={forecast_end_year};{_library_versions()}"
+    return hashlib.sha256(f"{series_hash(data_series)};{settings}".encode()).hexdigest()
+
+
+class ForecastCache:
+    """
+    Size-bounded LRU cache of forecast payloads in a directory.
+
+    A payload is a dict with keys 'forecast' (pd.Series), 'mape' (str), 'order' (tuple), 'backtest' (pd.DataFrame or None),
+    'params' (pd.Series of fitted parameters) and optionally 'backtest_fit' ((first window size, parameters estimated on
+    it) of the backtest, see `backtest.first_window_fit`).
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _entries(self):
+        """Yields (path, mtime, size) for every cache file."""
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.npz'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, key):
+        """Returns the cached payload for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                payload = self._decode(data)
+            os.utime(path)  # Mark as recently used
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return payload
+
+    def put(self, key, payload):
+        """Stores a payload under `key`, evicting old entries if over budget."""
+        arrays = self._encode(payload)
+        path = self._path(key)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._total_bytes += os.path.getsize(path) - old_size
+            over_budget = self._total_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in `max_bytes`."""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._total_bytes = total
+
+    def clear(self):
+        """Deletes every entry and resets the counters."""
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                os.remove(path)
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes': self._total_bytes,
+            }
+
+    # --- Serialization ---
+
+    @staticmethod
+    def _encode(payload):
+        forecast = payload['forecast']
+        backtest = payload.get('backtest')
+        params = payload['params']
+        backtest_fit = payload.get('backtest_fit')
+        header = {
+            'mape': payload['mape'],
+            'order': list(payload['order']),
+            'param_names': list(params.index),
+            'backtest_columns': list(backtest.columns) if backtest is not None else None,
+            'backtest_index': [int(h) for h in backtest.index] if backtest is not None else None,
+            'backtest_initial': int(backtest_fit[0]) if backtest_fit is not None else None,
+        }
+        arrays = {
+            'header': np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8),
+            'forecast_values': np.asarray(forecast.values, dtype=np.float64),
+            'forecast_index': np.asarray(forecast.index.values, dtype='datetime64[ns]'),
+            'params': np.asarray(params.values, dtype=np.float64),
+        }
+        if backtest is not None:
+            arrays['backtest'] = np.asarray(backtest.values, dtype=np.float64)
+        if backtest_fit is not None:
+            arrays['backtest_params'] = np.asarray(backtest_fit[1].values, dtype=np.float64)
+        return arrays
+
+    @staticmethod
+    def _decode(data):
+        header = json.loads(data['header'].tobytes().decode('utf-8'))
+        backtest = None
+        if header['backtest_columns'] is not None:
+            backtest = pd.DataFrame(
+                data['backtest'],
+                columns=header['backtest_columns'],
+                index=pd.Index(header['backtest_index'], name='Horizon')
+            )
+            backtest['Forecasts'] = backtest['Forecasts'].astype(int)
+        backtest_fit = None
+        # Entries written before the backtest's first-window fit was stored have no 'backtest_initial'
+        if header.get('backtest_initial') is not None:
+            backtest_fit = (header['backtest_initial'], pd.Series(data['backtest_params'], index=header['param_names']))
+        return {
+            'forecast': pd.Series(
+                data['forecast_values'],
+                index=pd.DatetimeIndex(data['forecast_index']),
+                name='predicted_mean'
+            ),
+            'mape': header['mape'],
+            'order': tuple(header['order']),
+            'backtest': backtest,
+            'params': pd.Series(data['params'], index=header['param_names']),
+            'backtest_fit': backtest_fit,
+        }
@@ -0,0 +1,187 @@
+"""
+Background forecasting jobs.
+
+A `JobRegistry` runs forecasts on a small thread pool so that a page can render
+its other sections immediately and poll the job for progress. Each owner (one
+browser session) has at most one current job: submitting a job with a different
+key, e.g. after switching barangay, cancels the superseded one. Cancellation is
+cooperative; the job function calls `job.check_cancelled()` between series, so
+a fit that is already running finishes but nothing after it starts.
+
+    job = registry.submit(session_token, key, lambda job: arima_forecast(..., _job=job),
+                          steps=METRIC_COLUMNS)
+    if job.wait(0.1):
+        results = job.result()
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Finished jobs of owners that never come back (closed sessions) are dropped after this long
+FINISHED_JOB_TTL = 600.0
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled."""
+
+
+class ForecastJob:
+    """
+    One submitted forecast.
+
+    Attributes:
+        key (tuple): What is being forecast; jobs with equal keys are interchangeable.
+        steps (dict): {step name: 'queued' | 'running' | 'done'}, updated by the job function.
+        status (str): 'pending', 'running', 'done', 'failed' or 'cancelled'.
+    """
+
+    def __init__(self, key, steps):
+        self.key = key
+        self.steps = {name: 'queued' for name in steps}
+        self.status = 'pending'
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._result = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._future = None
+
+    # --- Called from the job function ---
+
+    def check_cancelled(self):
+        """Raises JobCancelled if the job has been cancelled."""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def set_step(self, name, state):
+        """Records the state ('running' or 'done') of one step."""
+        self.steps[name] = state
+
+    # --- Called from the page ---
+
+    @property
+    def finished(self):
+        return self._done_event.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def progress(self):
+        """Fraction of steps done, between 0 and 1."""
+        if not self.steps:
+            return 1.0 if self.finished else 0.0
+        return sum(state == 'done' for state in self.steps.values()) / len(self.steps)
+
+    def elapsed(self):
+        """Seconds since the job started running (or its total run time once finished)."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def wait(self, timeout=None):
+        """Waits up to `timeout` seconds for the job to finish; returns whether it has."""
+        return self._done_event.wait(timeout)
+
+    def result(self):
+        """The job function's return value; raises its exception if the job failed."""
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+    def cancel(self):
+        """Requests cancellation; a job that has not started yet never runs."""
+        self._cancel_event.set()
+        if self._future is not None and self._future.cancel():
+            self._finish('cancelled')
+
+    def _run(self, target):
+        if self._cancel_event.is_set():
+            self._finish('cancelled')
+            return
+        self.status = 'running'
+        self.started_at = time.time()
+        try:
+            self._result = target(self)
+            self._finish('done')
+        except JobCancelled:
+            self._finish('cancelled')
+        except Exception as e:
+            print(f"Forecast job {self.key} failed: {e}")
+            self.error = e
+            self._finish('failed')
+
+    def _finish(self, status):
+        self.status = status
+        self.finished_at = time.time()
+        self._done_event.set()
+
+
+class JobRegistry:
+    """
+    Runs forecast jobs on a thread pool and tracks the current job of each owner.
+
+    Args:
+        max_workers (int): Concurrent jobs. Defaults to the COPRA_FORECAST_WORKERS
+            environment variable, or min(4, number of CPUs).
+    """
+
+    def __init__(self, max_workers=None):
+        max_workers = max_workers or int(os.environ.get('COPRA_FORECAST_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='forecast-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, key, target, steps=()):
+        """
+        Returns the owner's job for `key`, starting one if needed.
+
+        If the owner's current job is for a different key, it is cancelled.
+
+        Args:
+            owner (str): Identifies the requester, e.g. a per-session token.
+            key (tuple): Hashable description of the forecast.
+            target (callable): target(job) computing the result; should call
+                `job.check_cancelled()` and `job.set_step()` as it goes.
+            steps (list): Names of the steps reported through `job.set_step`.
+
+        Returns:
+            ForecastJob
+        """
+        with self._lock:
+            self._prune()
+            current = self._jobs.get(owner)
+            if current is not None and current.key == key and current.status not in ('failed', 'cancelled'):
+                return current
+            if current is not None and not current.finished:
+                current.cancel()
+            job = ForecastJob(key, steps)
+            self._jobs[owner] = job
+            job._future = self._executor.submit(job._run, target)
+            return job
+
+    def get(self, owner):
+        """The owner's current job, or None."""
+        with self._lock:
+            return self._jobs.get(owner)
+
+    def cancel(self, owner):
+        """Cancels the owner's current job, if any."""
+        with self._lock:
+            job = self._jobs.pop(owner, None)
+        if job is not None:
+            job.cancel()
+
+    def active_jobs(self):
+        """Number of jobs that are queued or running."""
+        with self._lock:
+            return sum(not job.finished for job in self._jobs.values())
+
+    def _prune(self):
+        """Drops jobs that finished more than FINISHED_JOB_TTL seconds ago (caller holds the lock)."""
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for owner in [owner for owner, job in self._jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self._jobs[owner]
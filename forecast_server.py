@@ -0,0 +1,434 @@
+"""
+Local HTTP/JSON forecast service.
+
+Serves the same per-series forecasts as the dashboard's `arima_forecast`:
+results come from memory or from the persistent forecast cache shared with the
+app (COPRA_CACHE_DIR), and only uncached series are fitted. Requests that arrive
+within a short window (`--batch-window-ms`) are collected, de-duplicated and
+their uncached series fitted together in one pass.
+
+    $ python forecast_server.py --port 8765
+    $ curl 'http://127.0.0.1:8765/forecast?barangay=Poblacion&metric=production'
+
+Endpoints:
+
+    GET  /health                      -> {"status": "ok", ...} with the startup timeline
+    GET  /barangays                   -> barangays and metrics available
+    GET  /forecast?barangay=B[&metric=M][&order=p,d,q|auto][&criterion=aic|bic]
+                                      -> forecasts of one or all metrics of B
+    POST /forecast  {"requests": [{"barangay": B, "metric": M, ...}, ...]}
+                                      -> forecasts for every request, in order
+
+Metrics can be given by column name or by the aliases 'production',
+'farmgate' and 'millgate'.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from backtest import overall_mape
+from batch_forecast import _forecast_task, _limit_blas_threads
+from data_source import load_dataset
+from dataset import IndexedDataset
+from forecast_cache import ForecastCache, series_hash, series_key
+import perf
+from streamlit.logger import set_log_level
+from streamlit_app import DEFAULT_ORDER, METRIC_COLUMNS, SeriesForecast, load_data, preprocess_data
+
+# Calling the app's st.cache_data loaders outside `streamlit run` logs a warning per call
+set_log_level('error')
+warnings.filterwarnings("ignore")
+
+METRIC_ALIASES = {
+    'production': 'Copra_Production (MT)',
+    'farmgate': 'Farmgate Price (PHP/kg)',
+    'millgate': 'Millgate Price (PHP/kg)',
+}
+
+
+class RequestError(ValueError):
+    """A client error, reported as HTTP 400/404."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_order(value):
+    """Parses 'p,d,q' or 'auto' (None gives the default order)."""
+    if value is None:
+        return DEFAULT_ORDER
+    if value == 'auto':
+        return 'auto'
+    try:
+        order = tuple(int(x) for x in str(value).split(','))
+    except ValueError:
+        order = ()
+    if len(order) != 3 or min(order) < 0:
+        raise RequestError(f"Invalid order '{value}'; expected 'p,d,q' or 'auto'.")
+    return order
+
+
+# --- 1. Forecast Service ---
+
+class ForecastService:
+    """
+    Looks up or computes forecasts for (barangay, metric) series.
+
+    Args:
+        df (pd.DataFrame): Preprocessed data, e.g. from `load_data()`.
+        forecast_end_year (int): The last year to forecast to.
+        disk_cache (ForecastCache): Persistent cache shared with the app, or None.
+        max_workers (int): Worker processes for fitting a batch; 1 fits in-process.
+        batch_window (float): Seconds to wait for more requests before fitting a batch.
+    """
+
+    def __init__(self, df, forecast_end_year=2035, disk_cache=None, max_workers=1, batch_window=0.05):
+        self.dataset = IndexedDataset(df)
+        self.forecast_end_year = forecast_end_year
+        self.disk_cache = disk_cache
+        self.batch_window = batch_window
+        self.stats = {'requests': 0, 'memory_hits': 0, 'disk_hits': 0, 'fitted': 0, 'batches': 0}
+        # (barangay, metric, order, criterion) -> (series hash, SeriesForecast)
+        self._results = {}
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_cond = threading.Condition(self._lock)
+        self._executor = None
+        if max_workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_limit_blas_threads, initargs=(1,)
+            )
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='forecast-batcher', daemon=True)
+        self._dispatcher.start()
+
+    def series(self, barangay, metric):
+        """The (Period-indexed) series of one barangay and metric."""
+        # JSON arrays and objects are never barangay names (and cannot be looked up)
+        if isinstance(barangay, (list, dict)) or not self.dataset.has_barangay(barangay):
+            raise RequestError(f"Unknown barangay '{barangay}'.", status=404)
+        metric = METRIC_ALIASES.get(metric, metric)
+        if metric not in METRIC_COLUMNS:
+            raise RequestError(f"Unknown metric '{metric}'; expected one of {METRIC_COLUMNS} or {list(METRIC_ALIASES)}.")
+        return metric, self.dataset.series_frame(barangay)[metric]
+
+    def forecast(self, requests):
+        """
+        Forecasts a list of requests, batching them with concurrent callers.
+
+        Args:
+            requests (list): Dicts with 'barangay', 'metric' and optional 'order'/'criterion'.
+
+        Returns:
+            list: One JSON-ready dict per request.
+        """
+        # Validate everything before queueing anything
+        entries = []
+        for i, request in enumerate(requests):
+            if not isinstance(request, dict):
+                raise RequestError(f"Request {i} must be an object with 'barangay' and 'metric', not {json.dumps(request)}.")
+            metric, series = self.series(request.get('barangay'), request.get('metric'))
+            criterion = request.get('criterion') or 'aic'
+            if criterion not in ('aic', 'bic'):
+                raise RequestError(f"Invalid criterion '{criterion}'; expected 'aic' or 'bic'.")
+            key = (request['barangay'], metric, parse_order(request.get('order')), criterion)
+            entries.append((key, series, Future()))
+
+        with self._lock:
+            self._pending.extend(entries)
+            self.stats['requests'] += len(entries)
+            self._pending_cond.notify()
+        return [future.result() for _, _, future in entries]
+
+    def prewarm(self):
+        """Forecasts every series with the default settings, filling memory and the disk cache."""
+        self.forecast([
+            {'barangay': barangay, 'metric': metric}
+            for barangay in self.dataset.barangays()
+            for metric in METRIC_COLUMNS
+        ])
+
+    # --- Batching ---
+
+    def _dispatch_loop(self):
+        """Collects pending requests for `batch_window` seconds, then resolves them as one batch."""
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._pending_cond.wait()
+            time.sleep(self.batch_window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+            try:
+                self._resolve(batch)
+            except Exception as e:
+                print(f"Forecast batch failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _resolve(self, batch):
+        """Answers a batch from memory or disk and fits all remaining series in one pass."""
+        unique = {}
+        for key, series, future in batch:
+            unique.setdefault(key, (series, []))[1].append(future)
+
+        answers = {}
+        to_fit = []
+        for key, (series, _) in unique.items():
+            cached = self._lookup(key, series)
+            if cached is not None:
+                answers[key] = cached
+            else:
+                to_fit.append((key, series))
+
+        if to_fit:
+            # Identical series requested under different keys (e.g. the market prices of
+            # different barangays) are fitted once
+            distinct = {}
+            for key, series in to_fit:
+                distinct.setdefault((series_hash(series), key[2], key[3]), []).append((key, series))
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['fitted'] += len(distinct)
+            tasks = []
+            for members in distinct.values():
+                key, series = members[0]
+                tasks.append((key[0], key[1], series, self.forecast_end_year, key[2], key[3]))
+            outputs = self._executor.map(_forecast_task, tasks) if self._executor else map(_forecast_task, tasks)
+            for members, (_, _, result) in zip(distinct.values(), outputs):
+                for key, series in members:
+                    self._remember(key, series, result)
+                    answers[key] = (result, 'fit')
+
+        for key, (series, futures) in unique.items():
+            result, source = answers[key]
+            payload = _to_json(key, series, result, source)
+            for future in futures:
+                future.set_result(payload)
+
+    def _lookup(self, key, series):
+        """Returns (SeriesForecast, source) from memory or the disk cache, or None."""
+        digest = series_hash(series)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and entry[0] == digest:
+                self.stats['memory_hits'] += 1
+                return entry[1], 'memory'
+
+        if self.disk_cache is not None:
+            payload = self.disk_cache.get(series_key(series, key[2], key[3], self.forecast_end_year))
+            if payload is not None:
+                result = SeriesForecast(
+                    payload['forecast'], None, payload['mape'], payload['order'], payload['backtest'], None
+                )
+                with self._lock:
+                    self._results[key] = (digest, result)
+                    self.stats['disk_hits'] += 1
+                return result, 'disk'
+        return None
+
+    def _remember(self, key, series, result):
+        """Keeps a fitted result in memory and, if it succeeded, in the disk cache."""
+        if result.forecast is None:
+            return
+        with self._lock:
+            self._results[key] = (series_hash(series), result)
+        if self.disk_cache is not None:
+            self.disk_cache.put(series_key(series, key[2], key[3], self.forecast_end_year), {
+                'forecast': result.forecast,
+                'mape': result.mape,
+                'order': result.order,
+                'backtest': result.backtest,
+                'params': result.summary.params,
+                'backtest_fit': result.summary.backtest_fit,
+            })
+
+
+def _finite_or_none(value):
+    return float(value) if value is not None and np.isfinite(value) else None
+
+
+def _to_json(key, series, result, source):
+    """JSON-ready description of one forecast."""
+    barangay, metric, _, _ = key
+    document = {
+        'barangay': barangay,
+        'metric': metric,
+        'source': source,
+        'n_observations': len(series),
+        'last_period': series.index[-1].strftime('%Y-%m-%d') if len(series) else None,
+    }
+    if result.forecast is None:
+        document['error'] = result.summary
+        return document
+
+    document.update({
+        'order': list(result.order),
+        'mape': _finite_or_none(overall_mape(result.backtest)) if result.backtest is not None else None,
+        'forecast': [
+            {'period': period.strftime('%Y-%m-%d'), 'value': float(value)}
+            for period, value in result.forecast.items()
+        ],
+    })
+    if result.backtest is not None:
+        document['backtest'] = [
+            {
+                'horizon': int(horizon),
+                'forecasts': int(row['Forecasts']),
+                'mae': _finite_or_none(row['MAE']),
+                'rmse': _finite_or_none(row['RMSE']),
+                'mape': _finite_or_none(row['MAPE (%)']),
+            }
+            for horizon, row in result.backtest.iterrows()
+        ]
+    return document
+
+
+# --- 2. HTTP Interface ---
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over a `ForecastService` (set as the server's `service` attribute)."""
+
+    server_version = 'CopraForecast/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, document):
+        body = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, produce):
+        try:
+            self._send(200, produce())
+        except RequestError as e:
+            self._send(e.status, {'error': str(e)})
+        except Exception as e:
+            print(f"Forecast request failed: {e}")
+            self._send(500, {'error': str(e)})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        service = self.server.service
+
+        if url.path == '/health':
+            self._handle(lambda: {'status': 'ok', **service.stats, 'startup_s': dict(perf.startup.milestones)})
+        elif url.path == '/barangays':
+            self._handle(lambda: {'barangays': service.dataset.barangays(), 'metrics': METRIC_COLUMNS})
+        elif url.path == '/forecast':
+            def produce():
+                if 'barangay' not in params:
+                    raise RequestError("Missing 'barangay' parameter.")
+                metrics = [params['metric']] if 'metric' in params else METRIC_COLUMNS
+                requests = [
+                    {'barangay': params['barangay'], 'metric': metric,
+                     'order': params.get('order'), 'criterion': params.get('criterion', 'aic')}
+                    for metric in metrics
+                ]
+                return {'forecasts': service.forecast(requests)}
+            self._handle(produce)
+        else:
+            self._send(404, {'error': f"Unknown path '{url.path}'."})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/forecast':
+            self._send(404, {'error': f"Unknown path '{url.path}'."})
+            return
+
+        def produce():
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                document = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError as e:
+                raise RequestError(f"Invalid JSON body: {e}")
+            requests = document.get('requests') if isinstance(document, dict) else None
+            if not isinstance(requests, list) or not requests:
+                raise RequestError("Body must be {\"requests\": [{\"barangay\": ..., \"metric\": ...}, ...]}.")
+            return {'forecasts': self.server.service.forecast(requests)}
+        self._handle(produce)
+
+
+def make_server(service, host='127.0.0.1', port=8765, verbose=False):
+    """Creates (but does not start) a threaded HTTP server for `service`; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), ForecastRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Serve Copra forecasts over local HTTP/JSON.")
+    parser.add_argument('--input', help="CSV/XLSX/Parquet file in the Copra Production schema "
+                                        "(defaults to COPRA_DATA_SOURCE or the embedded dataset).")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on (default: localhost only).")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on.")
+    parser.add_argument('--end-year', type=int, default=2035, help="Last year to forecast to.")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for fitting uncached series.")
+    parser.add_argument('--batch-window-ms', type=float, default=50, help="How long to collect requests into one batch.")
+    parser.add_argument('--cache-dir', default=None, help="Persistent forecast cache (default: as the app).")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the persistent forecast cache.")
+    parser.add_argument('--prewarm', action='store_true',
+                        help="Forecast every series in the background at startup, so first requests are cache hits.")
+    parser.add_argument('--verbose', action='store_true', help="Log every request.")
+    args = parser.parse_args(argv)
+
+    df = preprocess_data(load_dataset(args.input)) if args.input else load_data()
+    perf.startup.mark('data loaded')
+    disk_cache = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.environ.get(
+            'COPRA_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.forecast_cache')
+        )
+        max_bytes = int(float(os.environ.get('COPRA_CACHE_MAX_MB', 256)) * 1024 ** 2)
+        disk_cache = ForecastCache(cache_dir, max_bytes=max_bytes)
+
+    service = ForecastService(
+        df,
+        forecast_end_year=args.end_year,
+        disk_cache=disk_cache,
+        max_workers=args.workers,
+        batch_window=args.batch_window_ms / 1000
+    )
+    server = make_server(service, args.host, args.port, verbose=args.verbose)
+    perf.startup.mark('listening')
+    print(f"Serving forecasts for {len(service.dataset.barangays())} barangays on http://{args.host}:{server.server_port}")
+
+    if args.prewarm:
+        def prewarm():
+            try:
+                service.prewarm()
+            except Exception as e:
+                print(f"Prewarm failed: {e}")
+                return
+            perf.startup.mark('prewarmed')
+            print(f"Prewarmed {len(service.dataset.barangays()) * len(METRIC_COLUMNS)} series.")
+
+        threading.Thread(target=prewarm, name='forecast-prewarm', daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Hierarchical forecasting and forecast reconciliation.
+
+Barangays roll up into their municipality (and province, when the data has
+`Municipality` / `Province` columns) and finally into one 'Total' node.
+Forecasting every node independently gives totals that do not match the sum
+of their parts; reconciliation adjusts all base forecasts at once so that they
+add up (Hyndman & Athanasopoulos, *Forecasting: Principles and Practice*,
+ch. 11):
+
+- 'bottom_up': aggregates are the sums of the barangay forecasts.
+- 'ols': orthogonal projection onto the coherent subspace (W = I).
+- 'mint_shrink': MinT with the shrinkage estimate of the one-step residual
+  covariance (Schaefer & Strimmer), which weights each node by its fit.
+
+The hierarchy is a sparse summing matrix S (nodes x barangays). Reconciled
+forecasts are computed in the equivalent constrained form
+
+    y~ = y^ - W C' (C W C')^-1 C y^,    C = [I  -S_agg],
+
+so only a system with one row per aggregate node is solved. For MinT-shrink,
+W = lambda D + (1 - lambda) R'R / T is kept as its diagonal D and the
+T x nodes residual matrix R, never as a dense nodes x nodes matrix, so trees
+with thousands of barangays reconcile in milliseconds.
+
+Only additive metrics (production) can be reconciled; prices do not sum.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Optional grouping columns, from the top of the tree down to the barangays
+HIERARCHY_LEVELS = ('Province', 'Municipality')
+ROOT = 'Total'
+RECONCILIATION_METHODS = ('bottom_up', 'ols', 'mint_shrink')
+METHOD_LABELS = {'bottom_up': 'Bottom-up', 'ols': 'OLS', 'mint_shrink': 'MinT (shrinkage)'}
+# Metrics whose aggregates are the sums of their barangay values
+ADDITIVE_METRICS = ['Copra_Production (MT)']
+
+# history: Period x node actuals; base: horizon x node independent forecasts; reconciled:
+# {method: horizon x node coherent forecasts}; shrinkage: the MinT-shrink lambda (None if not run)
+HierarchicalForecast = namedtuple('HierarchicalForecast', ['history', 'base', 'reconciled', 'shrinkage'])
+
+
+# --- 1. Hierarchy Structure ---
+
+class Hierarchy:
+    """
+    Tree of aggregate nodes over the barangays.
+
+    Attributes:
+        nodes (list): All node names; aggregates first (top-down), then the barangays.
+        aggregates (list): Aggregate node names ('Total', 'Total / <Province>', ...).
+        bottom (list): Barangay names, in summing matrix column order.
+        levels (dict): {node: level name} ('Total', 'Province', 'Municipality' or 'Barangay').
+        summing_matrix (scipy.sparse.csr_matrix): S, nodes x barangays, S[i, j] = 1 when
+            barangay j is under node i.
+    """
+
+    def __init__(self, bottom, paths):
+        """
+        Args:
+            bottom (list): Barangay names.
+            paths (list): For each barangay, its (level name, group) ancestors from the
+                top, excluding the root, e.g. [('Municipality', 'Tagum')].
+        """
+        self.bottom = list(bottom)
+        self.aggregates = [ROOT]
+        self.levels = {ROOT: ROOT}
+        rows = [np.arange(len(self.bottom))]
+        node_rows = {}
+        members = {}
+        for j, path in enumerate(paths):
+            name = ROOT
+            for level, group in path:
+                name = f"{name} / {group}"
+                if name not in node_rows:
+                    node_rows[name] = len(self.aggregates)
+                    self.aggregates.append(name)
+                    self.levels[name] = level
+                members.setdefault(name, []).append(j)
+        for name in self.aggregates[1:]:
+            rows.append(np.asarray(members[name]))
+        for name in self.bottom:
+            self.levels[name] = 'Barangay'
+        self.nodes = self.aggregates + self.bottom
+
+        from scipy import sparse
+
+        n_aggregates = len(self.aggregates)
+        row_index = np.concatenate(
+            [np.full(len(cols), i) for i, cols in enumerate(rows)] + [n_aggregates + np.arange(len(self.bottom))]
+        )
+        col_index = np.concatenate(rows + [np.arange(len(self.bottom))])
+        self.summing_matrix = sparse.csr_matrix(
+            (np.ones(len(row_index)), (row_index, col_index)), shape=(len(self.nodes), len(self.bottom))
+        )
+
+    @classmethod
+    def from_frame(cls, df, levels=None):
+        """
+        Builds the hierarchy of the barangays in a Copra Production DataFrame.
+
+        Args:
+            df (pd.DataFrame): Data with a 'Barangay' column and, optionally, grouping columns.
+            levels (list): Grouping columns from the top (defaults to the HIERARCHY_LEVELS
+                present in `df`). Without any, every barangay sits directly under 'Total'.
+        """
+        levels = [level for level in (levels or HIERARCHY_LEVELS) if level in df.columns]
+        groups = df[['Barangay'] + levels].drop_duplicates('Barangay').sort_values('Barangay')
+        paths = [
+            [(level, 'Unassigned' if pd.isna(value) else value) for level, value in zip(levels, row)]
+            for row in groups[levels].itertuples(index=False)
+        ]
+        return cls(groups['Barangay'].tolist(), paths)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def aggregate(self, bottom_values):
+        """
+        Sums barangay values up the tree.
+
+        Args:
+            bottom_values (pd.DataFrame): Period x barangay values; missing values count as zero.
+
+        Returns:
+            pd.DataFrame: Period x node values, columns in `nodes` order.
+        """
+        values = bottom_values[self.bottom].to_numpy(dtype=np.float64, na_value=np.nan)
+        summed = (self.summing_matrix @ np.nan_to_num(values).T).T
+        frame = pd.DataFrame(summed, index=bottom_values.index, columns=self.nodes)
+        # Keep the barangays' own gaps; only the aggregates treat them as zero
+        frame[self.bottom] = values
+        return frame
+
+    def constraint_matrix(self):
+        """C = [I  -S_agg]: C y = 0 exactly when every aggregate equals the sum of its barangays."""
+        from scipy import sparse
+
+        n_aggregates = len(self.aggregates)
+        return sparse.hstack(
+            [sparse.identity(n_aggregates, format='csr'), -self.summing_matrix[:n_aggregates]], format='csr'
+        )
+
+
+# --- 2. Reconciliation ---
+
+def shrinkage_covariance(residuals):
+    """
+    Shrinkage estimate of the one-step forecast error covariance, in factored form.
+
+    The estimate is lambda * D + (1 - lambda) * F'F, with D the diagonal of the sample
+    covariance F'F (F = residuals / sqrt(T), uncentered as in MinT) and lambda the
+    Schaefer-Strimmer intensity that shrinks the correlations towards zero. Lambda is
+    computed from T x T Gram matrices, so the cost is linear in the number of nodes.
+
+    Args:
+        residuals (np.ndarray): T x nodes in-sample one-step residuals (no missing values).
+
+    Returns:
+        tuple: (diagonal (nodes,), factor F (T x nodes), lambda)
+    """
+    residuals = np.asarray(residuals, dtype=np.float64)
+    n_obs = residuals.shape[0]
+    if n_obs < 2:
+        raise ValueError("MinT-shrink needs at least 2 in-sample residuals per node.")
+    factor = residuals / np.sqrt(n_obs)
+    diagonal = np.einsum('ij,ij->j', factor, factor)
+    # Constant series have no residual variance; keep W positive definite
+    diagonal = np.maximum(diagonal, np.finfo(np.float64).eps * max(diagonal.max(), 1.0))
+
+    # Residuals scaled to unit mean square, so x'x / T is their correlation matrix
+    scaled = residuals / np.sqrt(diagonal)
+    squares = scaled ** 2
+    row_squares = squares.sum(axis=1)
+    column_squares = squares.sum(axis=0)
+    gram = scaled @ scaled.T
+    # Sums over i != j of sum_t x_ti^2 x_tj^2 and of (sum_t x_ti x_tj)^2
+    fourth_moments = (row_squares ** 2).sum() - (squares ** 2).sum()
+    cross_products = (gram ** 2).sum() - (column_squares ** 2).sum()
+    variance_sum = (fourth_moments - cross_products / n_obs) / (n_obs * (n_obs - 1))
+    correlation_sum = cross_products / n_obs ** 2
+    shrinkage = 1.0 if correlation_sum <= 0 else float(np.clip(variance_sum / correlation_sum, 0.0, 1.0))
+    return diagonal, factor, shrinkage
+
+
+def reconcile(hierarchy, base, method='mint_shrink', residuals=None):
+    """
+    Makes base forecasts coherent with the hierarchy.
+
+    Args:
+        hierarchy (Hierarchy): The tree the forecasts belong to.
+        base (pd.DataFrame): Horizon x node base forecasts (columns include every node).
+        method (str): 'bottom_up', 'ols' or 'mint_shrink'.
+        residuals (pd.DataFrame): T x node in-sample one-step residuals, required for
+            'mint_shrink'.
+
+    Returns:
+        pd.DataFrame: Reconciled forecasts with the same index and `hierarchy.nodes` columns.
+    """
+    values = base[hierarchy.nodes].to_numpy(dtype=np.float64).T
+    n_aggregates = len(hierarchy.aggregates)
+
+    if method == 'bottom_up':
+        reconciled = hierarchy.summing_matrix @ values[n_aggregates:]
+    elif method in ('ols', 'mint_shrink'):
+        constraint = hierarchy.constraint_matrix()
+        incoherence = constraint @ values
+        if method == 'ols':
+            # C C' has one row per aggregate and is nonzero only for ancestor/descendant pairs
+            from scipy.sparse.linalg import splu
+
+            adjustment = constraint.T @ splu((constraint @ constraint.T).tocsc()).solve(incoherence)
+        else:
+            if residuals is None:
+                raise ValueError("MinT-shrink reconciliation needs the in-sample residuals of every node.")
+            diagonal, factor, shrinkage = shrinkage_covariance(residuals[hierarchy.nodes].to_numpy())
+            weighted = constraint.multiply(diagonal[None, :]).tocsr()
+            factor_constraint = np.asarray((constraint @ factor.T).T)
+            system = shrinkage * (weighted @ constraint.T).toarray() + (1 - shrinkage) * factor_constraint.T @ factor_constraint
+            solved = np.linalg.solve(system, incoherence)
+            adjustment = (
+                shrinkage * (weighted.T @ solved)
+                + (1 - shrinkage) * factor.T @ (factor_constraint @ solved)
+            )
+        reconciled = values - adjustment
+    else:
+        raise ValueError(f"Unknown reconciliation method '{method}'; expected one of {RECONCILIATION_METHODS}.")
+
+    return pd.DataFrame(np.asarray(reconciled).T, index=base.index, columns=hierarchy.nodes)
+
+
+# --- 3. Forecasting the Tree ---
+
+def _residuals(result):
+    """In-sample one-step residuals of a SeriesForecast, re-filtered from its parameters if needed."""
+    fitted = result.results if result.results is not None else result.summary.results()
+    return fitted.resid.iloc[result.order[1]:]
+
+
+def forecast_hierarchy(hierarchy, bottom_history, forecast_node, methods=RECONCILIATION_METHODS):
+    """
+    Forecasts every node of the hierarchy and reconciles the forecasts.
+
+    Barangay forecasts come from `forecast_node`, so callers can hand back models that
+    are already fitted (e.g. from the dashboard's model store); only the aggregate
+    series need new fits.
+
+    Args:
+        hierarchy (Hierarchy): The tree to forecast.
+        bottom_history (pd.DataFrame): Period x barangay history of one additive metric.
+        forecast_node (callable): forecast_node(node, series) -> SeriesForecast.
+        methods (list): Reconciliation methods to run.
+
+    Returns:
+        HierarchicalForecast
+
+    Raises:
+        ValueError: If a node cannot be forecast.
+    """
+    history = hierarchy.aggregate(bottom_history)
+    forecasts = {}
+    residuals = {}
+    for node in hierarchy.nodes:
+        result = forecast_node(node, history[node].dropna())
+        if result.forecast is None:
+            raise ValueError(f"Could not forecast '{node}': {result.summary}")
+        forecasts[node] = result.forecast
+        if 'mint_shrink' in methods:
+            residuals[node] = _residuals(result)
+
+    # Nodes whose data ends earlier have fewer forecast quarters; keep the common horizon
+    base = pd.DataFrame(forecasts, columns=hierarchy.nodes).dropna()
+    if base.empty:
+        raise ValueError("The node forecasts have no quarter in common.")
+
+    reconciled = {}
+    shrinkage = None
+    residual_frame = None
+    if residuals:
+        residual_frame = pd.DataFrame(residuals, columns=hierarchy.nodes).dropna()
+        shrinkage = shrinkage_covariance(residual_frame.to_numpy())[2]
+    for method in methods:
+        reconciled[method] = reconcile(hierarchy, base, method, residuals=residual_frame)
+    return HierarchicalForecast(history, base, reconciled, shrinkage)
+
+
+def coherence_error(hierarchy, forecasts):
+    """Largest absolute difference between an aggregate forecast and the sum of its barangays."""
+    values = forecasts[hierarchy.nodes].to_numpy(dtype=np.float64).T
+    return float(np.abs(hierarchy.constraint_matrix() @ values).max())
@@ -0,0 +1,169 @@
+"""
+Automatic ARIMA order selection.
+
+The differencing order d is chosen first with repeated KPSS tests, since
+information criteria computed on differently-differenced data are not
+comparable. The (p, q) grid is then explored in waves of increasing model size
+(p + q = 0, 1, 2, ...):
+
+* every candidate in a wave is fitted in parallel on a shared process pool,
+* each candidate is warm-started from the already-fitted neighbour it extends
+  ((p-1, q) or (p, q-1)), so the optimizer starts next to a good solution,
+* only candidates within `prune_margin` of the best criterion so far are
+  expanded into the next wave; the rest of the grid is never fitted.
+"""
+import multiprocessing
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Shared pools for candidate fits, one per worker count, created on first use. Searches
+# run on Streamlit script threads and forecast job threads at once, so pools are created
+# under a lock and never shut down while another search may still be submitting to them.
+_EXECUTORS = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def _pool_context():
+    """Start method of the pool workers: forking this multi-threaded process is unsafe."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _get_executor(max_workers):
+    """Returns a process pool with `max_workers` workers, reusing it across searches."""
+    with _EXECUTORS_LOCK:
+        executor = _EXECUTORS.get(max_workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context())
+            _EXECUTORS[max_workers] = executor
+        return executor
+
+
+def select_differencing(values, max_d=2, alpha=0.05):
+    """
+    Chooses the differencing order with repeated KPSS stationarity tests.
+
+    Args:
+        values (np.ndarray): The observed series.
+        max_d (int): Largest differencing order to consider.
+        alpha (float): Significance level of the KPSS test.
+
+    Returns:
+        int: The smallest d for which stationarity is not rejected (capped at max_d).
+    """
+    from statsmodels.tsa.stattools import kpss
+
+    x = np.asarray(values, dtype=float)
+    for d in range(max_d):
+        if len(x) < 4 or np.ptp(x) == 0:
+            return d
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            p_value = kpss(x, regression='c', nlags='auto')[1]
+        if p_value >= alpha:
+            return d
+        x = np.diff(x)
+    return max_d
+
+
+def _fit_candidate(data_series, order, parent_params, criterion):
+    """
+    Fits one candidate order, warm-started from its parent's parameters.
+
+    Runs inside a pool worker, so it returns only plain data.
+
+    Returns:
+        tuple: (order, criterion value, {param name: value})
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = ARIMA(data_series, order=order, freq='QS-JAN')
+            start_params = None
+            if parent_params:
+                # Parameters shared with the parent keep their fitted values; new lags start at zero
+                start_params = [
+                    parent_params.get(name, 0.0 if name.startswith(('ar.', 'ma.')) else default)
+                    for name, default in zip(model.param_names, model.start_params)
+                ]
+            fit = model.fit(start_params=start_params)
+        value = float(getattr(fit, criterion))
+        if not np.isfinite(value):
+            value = np.inf
+        return order, value, dict(zip(model.param_names, np.asarray(fit.params)))
+    except Exception:
+        return order, np.inf, {}
+
+
+def select_arima_order(data_series, max_p=3, max_d=2, max_q=3, criterion='aic',
+                       prune_margin=4.0, max_workers=None):
+    """
+    Searches a bounded (p, d, q) grid for the order minimizing AIC or BIC.
+
+    Args:
+        data_series (pd.Series): The time series data.
+        max_p (int): Largest autoregressive order.
+        max_d (int): Largest differencing order.
+        max_q (int): Largest moving-average order.
+        criterion (str): 'aic' or 'bic'.
+        prune_margin (float): Candidates worse than the best criterion by more than
+            this margin are not expanded further.
+        max_workers (int): Worker processes for candidate fits. Defaults to the number
+            of CPUs; 1 fits candidates sequentially in the current process (use this
+            when already running inside a pool worker).
+
+    Returns:
+        tuple: (tuple, pd.DataFrame) -> (Best (p, d, q) Order, Table of Evaluated Candidates)
+    """
+    if criterion not in ('aic', 'bic'):
+        raise ValueError(f"Unknown criterion '{criterion}'; expected 'aic' or 'bic'.")
+
+    d = select_differencing(data_series.values, max_d=max_d)
+    max_workers = max_workers or os.cpu_count() or 1
+    executor = _get_executor(max_workers) if max_workers > 1 else None
+
+    evaluated = {}  # (p, q) -> (criterion value, params)
+    best_pq, best_value = None, np.inf
+    wave = {(0, 0): None}  # (p, q) -> parent (p, q)
+
+    while wave:
+        jobs = [
+            (data_series, (p, d, q), evaluated[parent][1] if parent else None, criterion)
+            for (p, q), parent in wave.items()
+        ]
+        if executor is not None and len(jobs) > 1:
+            outputs = executor.map(_fit_candidate, *zip(*jobs))
+        else:
+            outputs = (_fit_candidate(*job) for job in jobs)
+
+        for (p, _, q), value, params in outputs:
+            evaluated[(p, q)] = (value, params)
+            if value < best_value:
+                best_pq, best_value = (p, q), value
+
+        # Expand only the candidates that could still plausibly win
+        next_wave = {}
+        for p, q in wave:
+            value = evaluated[(p, q)][0]
+            if not value <= best_value + prune_margin:
+                continue
+            for child in ((p + 1, q), (p, q + 1)):
+                if child[0] > max_p or child[1] > max_q or child in evaluated or child in next_wave:
+                    continue
+                next_wave[child] = (p, q)
+        wave = next_wave
+
+    if best_pq is None:
+        raise ValueError("No candidate ARIMA order could be fitted.")
+
+    table = pd.DataFrame(
+        [{'order': (p, d, q), criterion: value} for (p, q), (value, _) in evaluated.items()]
+    ).sort_values(criterion, ignore_index=True)
+    return (best_pq[0], d, best_pq[1]), table
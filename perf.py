@@ -0,0 +1,221 @@
+"""
+Lightweight per-stage timing and opt-in profiling for dashboard reruns.
+
+Code marks its stages with the `stage` context manager:
+
+    with perf.stage('arima_forecast'):
+        with perf.stage('fit'):
+            ...
+
+Stages nest, so the example records 'arima_forecast' and 'fit' within it.
+While a rerun is being recorded (`record_rerun`), every stage is collected for
+the sidebar performance panel. Independently, when the COPRA_PERF_LOG
+environment variable is set (to a file path, or 'stderr'), each stage and each
+finished rerun is written as one JSON line to that log. Outside a recorded
+rerun and without the log, `stage` only costs a clock read.
+
+`profile_run` wraps a single rerun in cProfile or, if installed, pyinstrument
+and returns the report as text.
+
+`startup` records the milestones of the process start (imports done, data
+loaded, caches prewarmed, ...) once each, in seconds since this module was
+first imported.
+"""
+import contextlib
+import contextvars
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+_logger = logging.getLogger('copra.perf')
+_logger.propagate = False
+_log_configured = False
+
+# The rerun being recorded in the current thread (each Streamlit session runs its script in its own thread)
+_current_run = contextvars.ContextVar('copra_perf_run', default=None)
+# Names of the stages currently open, outermost first
+_stage_stack = contextvars.ContextVar('copra_perf_stack', default=())
+
+PROFILERS = ('cProfile', 'pyinstrument')
+
+
+# --- 1. JSON Log ---
+
+def _configure_log():
+    """Attaches the COPRA_PERF_LOG handler on first use; returns whether logging is on."""
+    global _log_configured
+    if not _log_configured:
+        _log_configured = True
+        target = os.environ.get('COPRA_PERF_LOG')
+        if target:
+            handler = logging.StreamHandler(sys.stderr) if target == 'stderr' else logging.FileHandler(target)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _logger.addHandler(handler)
+            _logger.setLevel(logging.INFO)
+        else:
+            _logger.setLevel(logging.CRITICAL + 1)
+    return _logger.isEnabledFor(logging.INFO)
+
+
+def _log(event, **fields):
+    if _configure_log():
+        _logger.info(json.dumps({'event': event, 'time': time.time(), **fields}, default=str))
+
+
+# --- 2. Stage Timing ---
+
+class RunTimings:
+    """Stage timings of one rerun as (stage names from the outermost, start, seconds) tuples."""
+
+    def __init__(self, name):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stages = []
+        self.total = None
+
+    def add(self, stack, start, seconds):
+        self.stages.append((stack, start, seconds))
+
+    def to_rows(self):
+        """
+        Rows for display in the order the stages started.
+
+        Each row has the stage's own name ('Stage'), its full path ('Path'), its
+        nesting depth, the time in milliseconds and its share of the rerun.
+        """
+        total = self.total or sum(seconds for stack, _, seconds in self.stages if len(stack) == 1) or 1.0
+        rows = []
+        for stack, _, seconds in sorted(self.stages, key=lambda stage: stage[1]):
+            rows.append({
+                'Stage': stack[-1],
+                'Path': '/'.join(stack),
+                'Depth': len(stack) - 1,
+                'Time (ms)': seconds * 1000,
+                'Share (%)': seconds / total * 100,
+            })
+        return rows
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times the enclosed block as stage `name`, nested under any open stage."""
+    stack = _stage_stack.get() + (name,)
+    token = _stage_stack.set(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stage_stack.reset(token)
+        run = _current_run.get()
+        if run is not None:
+            run.add(stack, start, elapsed)
+        _log('stage', stage=list(stack), ms=round(elapsed * 1000, 3), run_id=run.run_id if run else None)
+
+
+@contextlib.contextmanager
+def record_rerun(name):
+    """
+    Records every stage of one rerun.
+
+    Yields:
+        RunTimings: Filled in as stages finish; `total` is set when the block exits.
+    """
+    run = RunTimings(name)
+    token = _current_run.set(run)
+    start = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run.total = time.perf_counter() - start
+        _current_run.reset(token)
+        _log('rerun', page=name, run_id=run.run_id, ms=round(run.total * 1000, 3), stages=len(run.stages))
+
+
+# --- 3. Profiling ---
+
+@contextlib.contextmanager
+def profile_run(profiler='cProfile', limit=40):
+    """
+    Profiles the enclosed block.
+
+    Args:
+        profiler (str): 'cProfile' (standard library) or 'pyinstrument' (optional dependency).
+        limit (int): Number of functions listed in the cProfile report.
+
+    Yields:
+        dict: Its 'report' key holds the text report once the block exits.
+    """
+    result = {'profiler': profiler, 'report': None}
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            result['report'] = "pyinstrument is not installed (pip install pyinstrument)."
+            yield result
+            return
+        profiler_obj = Profiler()
+        profiler_obj.start()
+        try:
+            yield result
+        finally:
+            profiler_obj.stop()
+            result['report'] = profiler_obj.output_text(unicode=True, color=False)
+    elif profiler == 'cProfile':
+        import cProfile
+        import pstats
+
+        profiler_obj = cProfile.Profile()
+        try:
+            profiler_obj.enable()
+        except ValueError:
+            # Another profiler (e.g. a concurrent session's) is already active in this process
+            result['report'] = "Another profiler is already running; try again."
+            yield result
+            return
+        try:
+            yield result
+        finally:
+            profiler_obj.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler_obj, stream=stream).sort_stats('cumulative').print_stats(limit)
+            result['report'] = stream.getvalue()
+    else:
+        raise ValueError(f"Unknown profiler '{profiler}'; expected one of {PROFILERS}.")
+
+
+# --- 4. Startup Timeline ---
+
+class StartupTimeline:
+    """
+    Named milestones of the process start, in seconds since the timeline was created.
+
+    Each milestone is kept the first time it is marked, so code that runs on every
+    rerun can mark it unconditionally.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.milestones = {}
+
+    def mark(self, name):
+        """Records milestone `name` now, unless it was already recorded."""
+        with self._lock:
+            if name in self.milestones:
+                return
+            self.milestones[name] = time.perf_counter() - self._start
+        _log('startup', milestone=name, ms=round(self.milestones[name] * 1000, 3))
+
+    def to_rows(self):
+        """Rows for display, in the order the milestones were reached."""
+        return [{'Milestone': name, 'Time (s)': seconds} for name, seconds in self.milestones.items()]
+
+
+# The timeline of this process
+startup = StartupTimeline()
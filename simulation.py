@@ -0,0 +1,166 @@
+"""
+Prediction intervals and Monte Carlo forecast paths.
+
+Analytic intervals come straight from statsmodels (`get_forecast().conf_int()`).
+For quantities that are not a single model's output, such as revenue =
+production x price, future paths are simulated instead. An ARIMA(p, d, q)
+forecast error h steps ahead is a weighted sum of the future shocks,
+
+    y[T+h] - y^[T+h] = sum_{j<h} psi[j] * e[T+h-j],    e ~ N(0, sigma2),
+
+with psi the MA(infinity) weights of the model including its differencing.
+`simulate_paths` draws the shocks for every series and path at once and applies
+the weights as one batched matrix product, so thousands of paths for all
+series of a barangay take a few milliseconds. Series are simulated
+independently of each other.
+"""
+import numpy as np
+import pandas as pd
+
+# Central prediction intervals (in %) drawn around every forecast
+INTERVAL_LEVELS = (80, 95)
+# Quantiles drawn as the bands of a fan chart (outermost pair first, median in the middle)
+FAN_QUANTILES = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95)
+DEFAULT_PATHS = 5000
+# Copra production is recorded in metric tons, prices per kilogram
+KG_PER_MT = 1000.0
+
+
+def interval_frame(prediction, levels=INTERVAL_LEVELS):
+    """
+    Prediction intervals of a statsmodels forecast.
+
+    Args:
+        prediction: The `get_forecast()` results.
+        levels (tuple): Interval coverages in percent.
+
+    Returns:
+        pd.DataFrame: Columns 'lower_<level>' and 'upper_<level>' for each level,
+        aligned with the forecast.
+    """
+    columns = {}
+    for level in levels:
+        bounds = np.asarray(prediction.conf_int(alpha=1 - level / 100))
+        columns[f"lower_{level}"] = bounds[:, 0]
+        columns[f"upper_{level}"] = bounds[:, 1]
+    return pd.DataFrame(columns)
+
+
+def gaussian_interval_frame(means, psi, sigma2, index=None, levels=INTERVAL_LEVELS):
+    """
+    Prediction intervals of a forecast from its MA(infinity) weights, as in `interval_frame`.
+
+    Used where no statsmodels results object exists (e.g. the vectorized batch engine):
+    the h-step forecast error has variance sigma2 * sum_{j<h} psi[j]^2.
+
+    Args:
+        means (np.ndarray): (steps,) point forecasts.
+        psi (np.ndarray): (steps,) MA(infinity) weights (see `psi_weights`).
+        sigma2 (float): Shock variance.
+        index (pd.Index): Optional index of the returned frame.
+        levels (tuple): Interval coverages in percent.
+
+    Returns:
+        pd.DataFrame: Columns 'lower_<level>' and 'upper_<level>' for each level.
+    """
+    from statistics import NormalDist
+
+    means = np.asarray(means, dtype=np.float64)
+    se = np.sqrt(sigma2 * np.cumsum(np.asarray(psi, dtype=np.float64) ** 2))
+    columns = {}
+    for level in levels:
+        z = NormalDist().inv_cdf(0.5 + level / 200)
+        columns[f"lower_{level}"] = means - z * se
+        columns[f"upper_{level}"] = means + z * se
+    return pd.DataFrame(columns, index=index)
+
+
+def psi_weights(order, params, steps):
+    """
+    MA(infinity) weights of an ARIMA model, including its differencing.
+
+    Args:
+        order (tuple): The (p, d, q) order.
+        params (pd.Series): Fitted parameters named as by statsmodels ('ar.L1', 'ma.L1', ...).
+        steps (int): Number of weights (forecast horizon).
+
+    Returns:
+        np.ndarray: psi[0..steps-1], with psi[0] = 1.
+    """
+    from statsmodels.tsa.arima_process import arma2ma
+
+    p, d, q = order
+    ar_poly = np.r_[1.0, -np.array([params.get(f"ar.L{i}", 0.0) for i in range(1, p + 1)], dtype=np.float64)]
+    ma_poly = np.r_[1.0, np.array([params.get(f"ma.L{i}", 0.0) for i in range(1, q + 1)], dtype=np.float64)]
+    for _ in range(d):
+        ar_poly = np.convolve(ar_poly, [1.0, -1.0])
+    return arma2ma(ar_poly, ma_poly, lags=steps)
+
+
+def simulate_paths(means, psi, sigma2, n_paths=DEFAULT_PATHS, seed=0):
+    """
+    Simulates future paths of several series in one vectorized call.
+
+    Args:
+        means (np.ndarray): (series, steps) point forecasts.
+        psi (np.ndarray): (series, steps) MA(infinity) weights (see `psi_weights`).
+        sigma2 (np.ndarray): (series,) shock variances.
+        n_paths (int): Paths per series.
+        seed (int): Random seed; the same inputs and seed always give the same paths.
+
+    Returns:
+        np.ndarray: (series, paths, steps) simulated values.
+    """
+    means = np.atleast_2d(np.asarray(means, dtype=np.float64))
+    psi = np.atleast_2d(np.asarray(psi, dtype=np.float64))
+    scale = np.sqrt(np.asarray(sigma2, dtype=np.float64)).reshape(-1, 1, 1)
+    n_series, steps = means.shape
+
+    # kernel[s, h, j] = psi[s, h - j] for j <= h: the weight of shock j in step h
+    lag = np.arange(steps)[:, None] - np.arange(steps)[None, :]
+    kernel = np.where(lag >= 0, psi[:, np.clip(lag, 0, None)], 0.0)
+
+    shocks = np.random.default_rng(seed).standard_normal((n_series, n_paths, steps)) * scale
+    return means[:, None, :] + shocks @ kernel.transpose(0, 2, 1)
+
+
+def path_quantiles(paths, index, quantiles=FAN_QUANTILES):
+    """
+    Per-step quantiles of simulated paths.
+
+    Args:
+        paths (np.ndarray): (paths, steps) simulated values of one quantity.
+        index (pd.Index): The forecast periods.
+        quantiles (tuple): Quantiles between 0 and 1.
+
+    Returns:
+        pd.DataFrame: Indexed like `index`, one column per quantile ('q05', 'q50', ...).
+    """
+    values = np.quantile(paths, quantiles, axis=0).T
+    return pd.DataFrame(values, index=index, columns=[f"q{q * 100:02.0f}" for q in quantiles])
+
+
+def revenue_paths(production_paths, price_paths):
+    """Revenue paths (PHP) from production (MT) and price (PHP/kg) paths, both floored at zero."""
+    return np.maximum(production_paths, 0.0) * KG_PER_MT * np.maximum(price_paths, 0.0)
+
+
+def annual_quantiles(paths, index, quantiles=(0.05, 0.5, 0.95)):
+    """
+    Quantiles of the yearly totals of simulated quarterly paths.
+
+    Args:
+        paths (np.ndarray): (paths, steps) simulated quarterly values.
+        index (pd.DatetimeIndex): The forecast periods.
+        quantiles (tuple): Quantiles between 0 and 1.
+
+    Returns:
+        pd.DataFrame: One row per year, one column per quantile, plus the number of
+        quarters covered ('Quarters').
+    """
+    years = index.year
+    unique_years = np.unique(years)
+    totals = np.stack([paths[:, years == year].sum(axis=1) for year in unique_years], axis=1)
+    frame = path_quantiles(totals, pd.Index(unique_years, name='Year'), quantiles)
+    frame['Quarters'] = [int((years == year).sum()) for year in unique_years]
+    return frame
@@ -1,11 +1,31 @@
+# perf is imported first: its startup timeline counts from here
+import perf
 import streamlit as st
 import pandas as pd
+import functools
 import io
-import matplotlib.pyplot as plt
-from statsmodels.tsa.arima.model import ARIMA
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict, namedtuple
 from pandas.tseries.offsets import DateOffset
 import warnings
-from sklearn.metrics import mean_absolute_percentage_error as calculate_mape
+from backtest import first_window_fit, overall_mape, rolling_origin_backtest
+import comparison
+import export
+from data_source import load_dataset, source_fingerprint
+from dataset import IndexedDataset, SessionDataset, compact_frame
+from diagnostics import ModelDiagnostics
+import figures
+import hierarchy
+from forecast_cache import ForecastCache, series_hash, series_key
+from forecast_jobs import JobRegistry
+from order_search import select_arima_order
+import simulation
+import validation
+
+perf.startup.mark('imports')
 
 # Suppress warnings from statsmodels, which are common in Streamlit environments
 warnings.filterwarnings("ignore")
@@ -402,161 +422,934 @@ Nueva Era,2025,Q2,2025-04-01,12.40,64.55,81.00
 Nueva Era,2025,Q3,2025-07-01,12.50,56.79,72.70
 """
 
-@st.cache_data
-def load_data():
-    """Loads and preprocesses the Copra Production data."""
-    df = pd.read_csv(io.StringIO(CSV_CONTENT))
+# Metrics that are modelled and forecast for every barangay
+METRIC_COLUMNS = ['Copra_Production (MT)', 'Farmgate Price (PHP/kg)', 'Millgate Price (PHP/kg)']
+
+def preprocess_data(df):
+    """
+    Applies the standard preprocessing to a raw Copra Production DataFrame.
+
+    The result is compact (see `dataset.compact_frame`): Year and Quarter are dropped
+    (they are derived from 'Period' for display), names are categorical, and the
+    measures are float64, or float32 when COPRA_MEASURE_DTYPE=float32.
 
-    # Convert 'Period' to datetime objects and set as index
+    Every series is also validated and regularized (see `validation.regularize_panel`):
+    one row per quarter start, with missing quarters and missing or non-positive values
+    interpolated within the barangay. Series too short to fit are kept but reported.
+    """
+    # Convert 'Period' to datetime objects; rows without a period cannot be placed in a series
     df['Period'] = pd.to_datetime(df['Period'])
-    df['Year'] = df['Period'].dt.year
-    df['Quarter'] = 'Q' + df['Period'].dt.quarter.astype(str)
-    
-    # Handle any potential missing values by filling with the mean of the column
-    # We do this before using the data in case of dynamic row additions.
-    df.fillna(df.mean(numeric_only=True), inplace=True) 
+    df = compact_frame(df.dropna(subset=['Period']), measure_dtype=os.environ.get('COPRA_MEASURE_DTYPE', 'float64'))
+
+    df, report = validation.regularize_panel(df, METRIC_COLUMNS)
+    status = report['Status'].value_counts()
+    if status.get('regularize', 0) or status.get('reject', 0):
+        print(
+            f"Data validation: regularized {status.get('regularize', 0)} and rejected "
+            f"{status.get('reject', 0)} of {len(report)} series."
+        )
     
     return df
 
+@st.cache_data
+def _load_embedded_data():
+    """Loads and preprocesses the embedded CSV_CONTENT sample."""
+    return preprocess_data(pd.read_csv(io.StringIO(CSV_CONTENT)))
+
+@st.cache_data
+def _load_source_data(source, fingerprint):
+    """Loads and preprocesses a data file; `fingerprint` invalidates the cache when it changes."""
+    return preprocess_data(load_dataset(source))
+
+def load_data(source=None):
+    """
+    Loads and preprocesses the Copra Production data.
+
+    Args:
+        source (str): CSV/XLSX/Parquet file to read. Defaults to the COPRA_DATA_SOURCE
+            environment variable, or the embedded sample when neither is set.
+    """
+    source = source or os.environ.get('COPRA_DATA_SOURCE')
+    if not source:
+        return _load_embedded_data()
+    return _load_source_data(source, source_fingerprint(source))
+
+@st.cache_resource(max_entries=2)
+def _shared_dataset(source, fingerprint):
+    """The read-only dataset shared by every session; `fingerprint` changes with the source file."""
+    return IndexedDataset(load_data(source))
+
+def get_base_dataset():
+    """Returns the shared base dataset of the current data source (see `SessionDataset`)."""
+    source = os.environ.get('COPRA_DATA_SOURCE')
+    return _shared_dataset(source, source_fingerprint(source) if source else None)
+
 def initialize_session_data():
-    """Initializes the data into Streamlit session state if not already present."""
-    if 'df_data' not in st.session_state:
-        st.session_state['df_data'] = load_data()
+    """
+    Initializes the session's dataset into Streamlit session state if not already present.
+
+    Every session reads the same shared base table; only the rows of barangays the
+    session edits are copied into its state.
+    """
+    if 'dataset' not in st.session_state:
+        st.session_state['dataset'] = SessionDataset(get_base_dataset())
+    if 'session_token' not in st.session_state:
+        # Identifies this session's background forecast job in the shared job registry
+        st.session_state['session_token'] = uuid.uuid4().hex
 
 
 # --- 2. ARIMA Forecasting Helper Function ---
 
-def _fit_and_forecast_single_series(data_series, forecast_end_year, series_name):
+# Default model order used for production and both prices
+DEFAULT_ORDER = (1, 1, 0)
+# Forecasts are always computed to the end of this year; shorter horizons are slices of them
+MAX_FORECAST_END_YEAR = int(os.environ.get('COPRA_MAX_FORECAST_YEAR', 2035))
+
+# Result of forecasting a single series; `summary` is the deferred ModelDiagnostics (or the
+# error message if forecasting failed), `order` is the (p, d, q) actually fitted,
+# `backtest` the per-horizon rolling-origin error table (None if it could not be run),
+# `results` the fitted statsmodels results object (None once stripped for caching) and
+# `intervals` the forecast's prediction intervals (see `simulation.interval_frame`), if computed
+SeriesForecast = namedtuple(
+    'SeriesForecast', ['forecast', 'summary', 'mape', 'order', 'backtest', 'results', 'intervals'], defaults=(None,)
+)
+
+@functools.lru_cache(maxsize=1024)
+def future_quarters(last_date, forecast_end_year):
     """
-    Fits an ARIMA model for a single time series, calculates MAPE, and forecasts.
-    
+    The quarter starts after `last_date` up to the last quarter of `forecast_end_year`.
+
+    Memoized: every series ending on the same date shares one (immutable) index.
+    """
+    return pd.date_range(start=last_date + DateOffset(months=3), end=f'{forecast_end_year}-10-01', freq='QS')
+
+
+def slice_forecast_outputs(outputs, forecast_end_year):
+    """
+    The `arima_forecast` outputs cut to a shorter horizon.
+
+    Forecasts are computed once to MAX_FORECAST_END_YEAR; any earlier end year is
+    served by slicing them, without refitting. MAPE, orders, diagnostics and backtests
+    do not depend on the horizon and are returned as they are.
+
     Args:
+        outputs (tuple): The `arima_forecast` outputs.
+        forecast_end_year (int): The last year to keep.
+
+    Returns:
+        tuple: Outputs of the same shape, with forecasts up to the last quarter of `forecast_end_year`.
+    """
+    df_combined_plot, df_combined_forecast, mape_metrics, model_summaries, model_orders, backtest_tables, \
+        forecast_intervals = outputs
+    end = pd.Timestamp(f'{forecast_end_year}-10-01')
+    if df_combined_forecast is None or df_combined_forecast.index[-1] <= end:
+        return outputs
+    df_combined_plot = df_combined_plot[(df_combined_plot['Type'] == 'Historical') | (df_combined_plot.index <= end)]
+    forecast_intervals = {
+        metric: intervals.loc[:end] if intervals is not None else None
+        for metric, intervals in forecast_intervals.items()
+    }
+    return (df_combined_plot, df_combined_forecast.loc[:end], mape_metrics, model_summaries, model_orders,
+            backtest_tables, forecast_intervals)
+
+
+def _forecast_from_results(model_fit, data_series, forecast_end_year, order, backtest_fit=None):
+    """
+    Backtests and forecasts a series from an already-fitted ARIMA results object.
+
+    Args:
+        model_fit: statsmodels ARIMA results fitted on `data_series`.
         data_series (pd.Series): The time series data.
         forecast_end_year (int): The last year to forecast to (e.g., 2035).
-        series_name (str): The name of the series for context.
-        
+        order (tuple): The (p, d, q) order of `model_fit`.
+        backtest_fit (tuple): (first window size, parameters) of an earlier backtest of
+            a series with the same first window (see `backtest.first_window_fit`). It is
+            reused instead of estimating the window again; None estimates it.
+
     Returns:
-        tuple: (pd.Series, str, str) -> (Forecast Values Series, Model Summary Text, MAPE String)
+        SeriesForecast
     """
-    if data_series.empty or len(data_series) < 5:
-        return None, f"Error: Insufficient data for {series_name} (need at least 5 quarters).", "N/A"
-        
     n_test = 4
     mape_str = "N/A (Not enough data points for validation)"
-    
+    backtest_table = None
+
+    # 1. Rolling-Origin Backtest for MAPE Calculation (horizons of 1 to 4 quarters)
+    # The model is fitted once on the first window and extended to each later origin
     try:
-        # 1. Backtest Split for MAPE Calculation (using last 4 quarters for testing)
-        if len(data_series) > n_test:
-            train_data = data_series[:-n_test]
-            test_data = data_series[-n_test:]
-
-            # Temporarily fit model on training data for evaluation
-            # Using freq='QS-JAN' assumes quarterly data starting in Jan (Q1, Q2, Q3, Q4)
-            # ARIMA order (1, 1, 0) is a simple model for demonstration
-            model_train = ARIMA(train_data, order=(1, 1, 0), freq='QS-JAN')
-            model_fit_train = model_train.fit()
-            
-            # Predict the test period
-            test_forecast = model_fit_train.get_forecast(steps=n_test)
-            test_pred = test_forecast.predicted_mean
-            
-            # Calculate MAPE
-            mape_value = calculate_mape(test_data.values, test_pred.values) * 100
-            mape_str = f"{mape_value:.2f}% "
-            
-        # 2. Main Forecast: Fit model on ALL available historical data
-        model_full = ARIMA(data_series, order=(1, 1, 0), freq='QS-JAN')
-        model_fit_full = model_full.fit()
-        
-        # Determine the start date for forecasting
-        start_date = data_series.index[-1] + DateOffset(months=3)
-        
-        # Create the future date range (Quarterly Start frequency)
-        future_dates = pd.date_range(start=start_date, end=f'{forecast_end_year}-10-01', freq='QS')
-        
-        # Generate the forecast
-        forecast = model_fit_full.get_forecast(steps=len(future_dates))
+        with perf.stage('backtest'):
+            if backtest_fit is None:
+                backtest_fit = first_window_fit(data_series, order)
+            backtest_table = rolling_origin_backtest(
+                data_series,
+                order=order,
+                horizon=n_test,
+                initial=backtest_fit[0],
+                params=backtest_fit[1]
+            )
+        mape_str = f"{overall_mape(backtest_table):.2f}% "
+    except ValueError:
+        backtest_fit = None
+
+    # The future date range (Quarterly Start frequency), shared by all series ending on the same date
+    future_dates = future_quarters(data_series.index[-1], forecast_end_year)
+    
+    # Generate the forecast
+    with perf.stage('forecast'):
+        forecast = model_fit.get_forecast(steps=len(future_dates))
         forecast_values = forecast.predicted_mean
         forecast_values.index = future_dates
+        intervals = simulation.interval_frame(forecast).set_index(future_dates)
+
+    # The summary table and residual tests are only computed when the diagnostics are viewed
+    diagnostics = ModelDiagnostics(data_series, order, model_fit.params, results=model_fit, backtest_fit=backtest_fit)
+    
+    return SeriesForecast(forecast_values, diagnostics, mape_str, tuple(order), backtest_table, model_fit, intervals)
+
+def _arima_class():
+    """statsmodels' ARIMA, imported on first use: statsmodels takes about a second to import."""
+    from statsmodels.tsa.arima.model import ARIMA
+    # Importing statsmodels turns its model warnings back on ahead of the filter set above
+    warnings.filterwarnings("ignore")
+    return ARIMA
+
+def _fit_and_forecast_single_series(data_series, forecast_end_year, series_name, order=DEFAULT_ORDER,
+                                    criterion='aic', search_workers=None):
+    """
+    Fits an ARIMA model for a single time series, backtests it, and forecasts.
+    
+    Args:
+        data_series (pd.Series): The time series data.
+        forecast_end_year (int): The last year to forecast to (e.g., 2035).
+        series_name (str): The name of the series for context.
+        order (tuple or str): The (p, d, q) order, or 'auto' to select it by `criterion`.
+        criterion (str): 'aic' or 'bic', used when order is 'auto'.
+        search_workers (int): Worker processes for the automatic order search.
+        
+    Returns:
+        SeriesForecast: (Forecast Values Series, Model Diagnostics, MAPE String, (p, d, q) Order,
+                         Backtest Error Table, Fitted Results)
+    """
+    # Reject series the quarterly model cannot take before spending a fit on them
+    problems = validation.series_problems(data_series)
+    if problems:
+        return SeriesForecast(None, f"Error: {series_name} cannot be fitted: {'; '.join(problems)}.", "N/A", None, None, None)
+    
+    try:
+        # 0. Order Selection: search a bounded (p, d, q) grid when requested
+        if order == 'auto':
+            with perf.stage('order_search'):
+                order, _ = select_arima_order(data_series, criterion=criterion, max_workers=search_workers)
+
+        ARIMA = _arima_class()
+
+        # 1. Main Forecast: Fit model on ALL available historical data
+        # Using freq='QS-JAN' assumes quarterly data starting in Jan (Q1, Q2, Q3, Q4)
+        with perf.stage('fit'):
+            model_full = ARIMA(data_series, order=order, freq='QS-JAN')
+            model_fit_full = model_full.fit()
         
-        return forecast_values, model_fit_full.summary().as_text(), mape_str
+        # 2. Backtest and forecast from the fitted model
+        return _forecast_from_results(model_fit_full, data_series, forecast_end_year, order)
         
     except Exception as e:
         # Print the error to the console for debugging but return a user-friendly message
         print(f"ARIMA Model Error for {series_name}: {e}")
-        return None, f"ARIMA Model Error for {series_name}: {e}", "N/A"
+        return SeriesForecast(None, f"ARIMA Model Error for {series_name}: {e}", "N/A", None, None, None)
+
+# --- 2.5. Incremental Model Store ---
+
+# Fitted models kept for this many (barangay, metric) keys (least recently used first out)
+MAX_STORED_MODELS = int(os.environ.get('COPRA_MAX_STORED_MODELS', 1024))
+# Results registered by series content are kept for this many distinct series (least recently used first out)
+MAX_CONTENT_MODELS = int(os.environ.get('COPRA_MAX_CONTENT_MODELS', 512))
+
+class ModelStore:
+    """
+    Keeps the fitted ARIMA results for each (barangay, metric) and model setting between reruns.
+
+    When a series comes back unchanged except for newly appended quarters, the stored
+    results are extended with `append()` (Kalman filtering only, parameters kept fixed)
+    and the forecast is produced from them, instead of re-estimating from scratch. The
+    backtest reuses the first window and the parameters estimated on it by the original
+    fit (`ModelDiagnostics.backtest_fit`), so its MAPE stays out-of-sample without
+    estimating anything either.
+    Any other change to the series, a different order setting, or `refit=True`
+    triggers a full fit, which is looked up in the optional on-disk `disk_cache` first.
+
+    Results are also registered by series content, so a series identical to one
+    already forecast under another key (e.g. the market prices, which are the same
+    for every barangay) shares that result instead of being fitted again. That registry
+    is an LRU bounded by `max_content` series, and a content entry is dropped as soon
+    as no key uses it any more (e.g. after an edit replaced the series).
+
+    The keys themselves are an LRU bounded by `max_entries`, so a prewarm of a large
+    panel keeps only the most recently forecast models in memory (the rest stay in
+    the disk cache).
+    """
+
+    def __init__(self, disk_cache=None, max_entries=MAX_STORED_MODELS, max_content=MAX_CONTENT_MODELS):
+        self.disk_cache = disk_cache
+        self.max_entries = max_entries
+        self.max_content = max_content
+        # ((barangay, metric), (order, criterion, forecast end year) setting) -> (data series, setting,
+        # SeriesForecast, series hash)
+        self._entries = OrderedDict()
+        # (series hash, setting) -> SeriesForecast of the most recent forecast of that content
+        self._by_content = OrderedDict()
+        # (series hash, setting) -> number of keys whose current entry has that content
+        self._content_users = {}
+        # Guards the entries only; fits run outside the lock so sessions don't serialize
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drops all stored models."""
+        with self._lock:
+            self._entries.clear()
+            self._by_content.clear()
+            self._content_users.clear()
+
+    def _release_content(self, content_key):
+        """Forgets one user of a content entry, dropping the entry when it has none left (lock held)."""
+        users = self._content_users.get(content_key, 0) - 1
+        if users > 0:
+            self._content_users[content_key] = users
+        else:
+            self._content_users.pop(content_key, None)
+            self._by_content.pop(content_key, None)
+
+    def _store(self, key, data_series, setting, result, content_hash):
+        content_key = (content_hash, setting)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                # The superseded series' result is no longer needed under this key
+                self._release_content((old[3], old[1]))
+            self._entries[key] = (data_series, setting, result, content_hash)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._release_content((evicted[3], evicted[1]))
+            self._content_users[content_key] = self._content_users.get(content_key, 0) + 1
+            self._by_content[content_key] = result
+            self._by_content.move_to_end(content_key)
+            while len(self._by_content) > self.max_content:
+                evicted, _ = self._by_content.popitem(last=False)
+                self._content_users.pop(evicted, None)
+
+    @staticmethod
+    def _appended_points(old_series, new_series):
+        """Returns the points appended to `old_series` to give `new_series`, or None."""
+        n_old = len(old_series)
+        if len(new_series) <= n_old:
+            return None
+        if not new_series.index[:n_old].equals(old_series.index):
+            return None
+        if not (new_series.values[:n_old] == old_series.values).all():
+            return None
+        return new_series.iloc[n_old:]
+
+    def _full_fit(self, data_series, forecast_end_year, series_name, order, criterion):
+        """Fits from scratch, or restores an identical earlier fit from the disk cache."""
+        cache_key = None
+        if self.disk_cache is not None:
+            cache_key = series_key(data_series, order, criterion, forecast_end_year)
+            with perf.stage('disk_cache_lookup'):
+                payload = self.disk_cache.get(cache_key)
+            if payload is not None:
+                # Rebuild the results object by filtering with the cached parameters (no optimization)
+                with perf.stage('disk_cache_restore'):
+                    model_fit = _arima_class()(data_series, order=payload['order'], freq='QS-JAN').filter(payload['params'])
+                    intervals = simulation.interval_frame(
+                        model_fit.get_forecast(steps=len(payload['forecast']))
+                    ).set_index(payload['forecast'].index)
+                diagnostics = ModelDiagnostics(
+                    data_series, payload['order'], payload['params'], results=model_fit,
+                    backtest_fit=payload['backtest_fit']
+                )
+                return SeriesForecast(
+                    payload['forecast'], diagnostics, payload['mape'],
+                    payload['order'], payload['backtest'], model_fit, intervals
+                )
+
+        result = _fit_and_forecast_single_series(
+            data_series, forecast_end_year, series_name, order=order, criterion=criterion
+        )
+        if cache_key is not None and result.forecast is not None:
+            self.disk_cache.put(cache_key, {
+                'forecast': result.forecast,
+                'mape': result.mape,
+                'order': result.order,
+                'backtest': result.backtest,
+                'params': result.results.params,
+                'backtest_fit': result.summary.backtest_fit,
+            })
+        return result
+
+    def forecast(self, key, data_series, forecast_end_year, series_name, order=DEFAULT_ORDER,
+                 criterion='aic', refit=False):
+        """
+        Forecasts a series, updating the stored model instead of refitting when possible.
+
+        Args:
+            key (tuple): (barangay, metric) identifying the series.
+            refit (bool): Re-estimate the parameters even if data was only appended.
+            Other arguments are as for `_fit_and_forecast_single_series`.
+
+        Returns:
+            SeriesForecast
+        """
+        setting = (order, criterion, forecast_end_year)
+        # Each setting keeps its own model, so pages forecasting with different settings don't evict each other
+        key = (key, setting)
+        content_hash = series_hash(data_series)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            shared = self._by_content.get((content_hash, setting))
+            if shared is not None:
+                self._by_content.move_to_end((content_hash, setting))
+
+        if entry is None or entry[1] != setting or entry[2].results is None:
+            entry = None
+        if entry is not None and entry[0].equals(data_series) and not refit:
+            return entry[2]
+
+        # The same series has already been forecast under another key (e.g. shared market prices)
+        if shared is not None and not refit:
+            self._store(key, data_series, setting, shared, content_hash)
+            return shared
+
+        if entry is not None and not refit:
+            old_series, _, old_result, _ = entry
+            new_points = self._appended_points(old_series, data_series)
+            if new_points is not None:
+                try:
+                    with perf.stage('append'):
+                        model_fit = old_result.results.append(new_points)
+                    # The backtest keeps the original fit's first window and its parameters: the appended
+                    # quarters only add origins, all after that window, so the MAPE stays out-of-sample
+                    # (the appended model's own parameters have seen every origin) and nothing is estimated
+                    result = _forecast_from_results(
+                        model_fit, data_series, forecast_end_year, old_result.order,
+                        backtest_fit=old_result.summary.backtest_fit
+                    )
+                    self._store(key, data_series, setting, result, content_hash)
+                    return result
+                except Exception as e:
+                    print(f"Incremental update failed for {series_name}, refitting: {e}")
+
+        result = self._full_fit(data_series, forecast_end_year, series_name, order, criterion)
+        if result.forecast is not None:
+            self._store(key, data_series, setting, result, content_hash)
+        return result
+
+@st.cache_resource
+def get_forecast_cache():
+    """
+    Returns the process-wide persistent forecast cache.
+
+    Location and size are set by the COPRA_CACHE_DIR (default: .forecast_cache next
+    to this file) and COPRA_CACHE_MAX_MB (default: 256) environment variables.
+    """
+    directory = os.environ.get(
+        'COPRA_CACHE_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '.forecast_cache')
+    )
+    max_bytes = int(float(os.environ.get('COPRA_CACHE_MAX_MB', 256)) * 1024 ** 2)
+    return ForecastCache(directory, max_bytes=max_bytes)
+
+@st.cache_resource
+def get_model_store():
+    """
+    Returns the process-wide model store.
+
+    It is shared across sessions (like the `arima_forecast` cache) so that whichever
+    session computed a forecast leaves the fitted model behind for later appends.
+    """
+    return ModelStore(disk_cache=get_forecast_cache())
+
+@st.cache_resource
+def get_job_registry():
+    """Returns the process-wide registry of background forecast jobs (one current job per session)."""
+    return JobRegistry()
 
 # --- 3. ARIMA Forecasting Pipeline (Cached) ---
 
-@st.cache_data
-def arima_forecast(ts_production, ts_farmgate, ts_millgate, forecast_end_year, last_historical_date):
+def _combine_forecasts(series_map, forecast_results):
+    """
+    Joins the history and forecasts of the three series into the tables the page displays.
+
+    Args:
+        series_map (dict): Metric -> historical series.
+        forecast_results (dict): Metric -> forecast series.
+
+    Returns:
+        tuple: (pd.DataFrame, pd.DataFrame) -> (History and forecasts with a 'Type' column,
+               forecasts only)
+    """
+    # Create the unified historical DataFrame
+    df_combined_history = pd.DataFrame({**series_map, 'Type': 'Historical'})
+
+    # Create the unified forecast DataFrame
+    future_index = forecast_results['Copra_Production (MT)'].index
+    df_combined_forecast = pd.DataFrame({**forecast_results, 'Type': 'Forecast'}, index=future_index)
+
+    # Combine the two resulting dataframes for single display in plots
+    return pd.concat([df_combined_history, df_combined_forecast]), df_combined_forecast
+
+
+@st.cache_data(max_entries=256)
+def arima_forecast(data_key, _ts_production, _ts_farmgate, _ts_millgate, forecast_end_year, last_historical_date,
+                   order=DEFAULT_ORDER, criterion='aic', barangay=None, refit=False, _store=None, _job=None):
     """
     Runs ARIMA forecasting on Copra Production, Farmgate Price, and Millgate Price.
     
+    Args:
+        data_key (str): Content hash of the three series (see `forecast_cache.series_hash`).
+            It stands in for the series in the cache key, so the series themselves
+            (underscore arguments) are not re-hashed by Streamlit on every call.
+        order (tuple or str): The (p, d, q) order for all three series, or 'auto' to
+            select each series' order by `criterion`.
+        criterion (str): 'aic' or 'bic', used when order is 'auto'.
+        barangay (str): The barangay the series belong to, used as the model store key.
+        refit (bool): Re-estimate parameters even when data points were only appended.
+        _store (ModelStore): Optional store of fitted models to update incrementally
+            (not hashed by the cache).
+        _job (ForecastJob): The background job running this forecast, if any. Progress is
+            reported per series, and a cancelled job stops before the next series.
+
     Returns:
-        tuple: (df_combined_plot, df_combined_forecast, mape_metrics, model_summaries)
+        tuple: (df_combined_plot, df_combined_forecast, mape_metrics, model_summaries, model_orders, backtest_tables,
+                forecast_intervals)
         df_combined_plot: DataFrame containing both historical and forecast data for plotting.
         df_combined_forecast: DataFrame containing only the forecast data.
         mape_metrics: Dictionary of MAPE strings for each metric.
-        model_summaries: Dictionary of model summary texts for each metric.
+        model_summaries: Dictionary of deferred ModelDiagnostics for each metric.
+        model_orders: Dictionary of the fitted (p, d, q) order for each metric.
+        backtest_tables: Dictionary of per-horizon rolling-origin error tables for each metric.
+        forecast_intervals: Dictionary of prediction interval tables for each metric.
     """
     
     # Define series to process
     series_map = {
-        'Copra_Production (MT)': ts_production,
-        'Farmgate Price (PHP/kg)': ts_farmgate,
-        'Millgate Price (PHP/kg)': ts_millgate
+        'Copra_Production (MT)': _ts_production,
+        'Farmgate Price (PHP/kg)': _ts_farmgate,
+        'Millgate Price (PHP/kg)': _ts_millgate
     }
     
     # Prepare containers for results
     forecast_results = {}
     mape_metrics = {}
     model_summaries = {}
+    model_orders = {}
+    backtest_tables = {}
+    forecast_intervals = {}
     
     # 1. Run forecast for each series
     for name, series in series_map.items():
-        forecast_series, summary, mape = _fit_and_forecast_single_series(
-            series, 
-            forecast_end_year,
-            name
-        )
+        if _job is not None:
+            _job.check_cancelled()
+            _job.set_step(name, 'running')
+        with perf.stage(name):
+            if _store is not None:
+                result = _store.forecast(
+                    (barangay, name),
+                    series,
+                    forecast_end_year,
+                    name,
+                    order=order,
+                    criterion=criterion,
+                    refit=refit
+                )
+            else:
+                result = _fit_and_forecast_single_series(
+                    series, 
+                    forecast_end_year,
+                    name,
+                    order=order,
+                    criterion=criterion
+                )
         
-        if forecast_series is None:
+        if _job is not None:
+            _job.set_step(name, 'done')
+
+        if result.forecast is None:
             # If any single forecast fails, return None for all. Error is logged/displayed in helper.
-            return None, None, None, None
+            return None, None, None, None, None, None, None
 
-        forecast_results[name] = forecast_series
-        mape_metrics[name] = mape
-        model_summaries[name] = summary
+        forecast_results[name] = result.forecast
+        mape_metrics[name] = result.mape
+        model_summaries[name] = result.summary
+        model_orders[name] = result.order
+        backtest_tables[name] = result.backtest
+        forecast_intervals[name] = result.intervals
 
     # 2. Combine results into two DataFrames (Historical and Forecast)
-    
-    # Create the unified historical DataFrame
-    df_combined_history = pd.DataFrame({
-        'Copra_Production (MT)': ts_production,
-        'Farmgate Price (PHP/kg)': ts_farmgate,
-        'Millgate Price (PHP/kg)': ts_millgate,
-        'Type': 'Historical'
-    })
-    
-    # Create the unified forecast DataFrame
-    future_index = forecast_results['Copra_Production (MT)'].index
-    df_combined_forecast = pd.DataFrame({
-        'Copra_Production (MT)': forecast_results['Copra_Production (MT)'],
-        'Farmgate Price (PHP/kg)': forecast_results['Farmgate Price (PHP/kg)'],
-        'Millgate Price (PHP/kg)': forecast_results['Millgate Price (PHP/kg)'],
-        'Type': 'Forecast'
-    }, index=future_index)
-    
-    # Combine the two resulting dataframes for single display in plots
-    df_combined_plot = pd.concat([df_combined_history, df_combined_forecast])
+    df_combined_plot, df_combined_forecast = _combine_forecasts(series_map, forecast_results)
+
+    return df_combined_plot, df_combined_forecast, mape_metrics, model_summaries, model_orders, backtest_tables, forecast_intervals
+
+
+def forecast_arguments(df_barangay, barangay, order=DEFAULT_ORDER, criterion='aic', refit=False,
+                       forecast_end_year=MAX_FORECAST_END_YEAR):
+    """
+    The `arima_forecast` arguments for one barangay, exactly as the main page passes them.
+
+    Args:
+        df_barangay (pd.DataFrame): The barangay's regularized rows indexed by 'Period'
+            (see `IndexedDataset.model_series_frame`).
+        barangay (str): The barangay.
+        order, criterion, refit: The model settings (see `arima_forecast`).
+        forecast_end_year (int): The last year to forecast to. Keep the default and cut
+            the outputs with `slice_forecast_outputs`, so every horizon shares one fit.
+
+    Returns:
+        tuple: (tuple, dict) -> (Positional arguments, keyword arguments)
+    """
+    series = [df_barangay[metric] for metric in METRIC_COLUMNS]
+    # The cache is keyed by a content hash of the series rather than by the series themselves
+    data_key = '/'.join(series_hash(ts) for ts in series)
+    args = (data_key, *(ts.copy() for ts in series), forecast_end_year, series[0].index.max())
+    kwargs = dict(order=order, criterion=criterion, barangay=barangay, refit=refit, _store=get_model_store())
+    return args, kwargs
+
+
+def baseline_forecast(dataset, barangay, order=DEFAULT_ORDER, criterion='aic'):
+    """
+    The forecast of a barangay's unedited data, the baseline of its scenarios.
+
+    Args:
+        dataset (SessionDataset): The session's data; the baseline comes from its shared base.
+        barangay (str): The barangay.
+        order, criterion: The model settings (see `arima_forecast`).
+
+    Returns:
+        tuple: The `arima_forecast` outputs, or None if the barangay has no usable unedited data.
+    """
+    if not dataset.base.has_barangay(barangay):
+        return None
+    df_base, report = dataset.base.model_series_frame(barangay)
+    if df_base.empty or (report['Status'] == 'reject').any():
+        return None
+    args, kwargs = forecast_arguments(df_base, barangay, order, criterion)
+    outputs = arima_forecast(*args, **kwargs)
+    return outputs if outputs[0] is not None else None
 
+def _unedited_backtest_fit(baseline, series):
+    """
+    The baseline's backtest first-window fit, if `series` only differs from the baseline after that window.
+
+    Args:
+        baseline (ModelDiagnostics): The baseline model.
+        series (pd.Series): The edited series.
+
+    Returns:
+        tuple: The baseline's `backtest_fit`, or None if the first window has to be estimated again.
+    """
+    backtest_fit = baseline.backtest_fit
+    if backtest_fit is None:
+        return None
+    initial = backtest_fit[0]
+    if len(series) <= initial or not series.iloc[:initial].equals(baseline.data_series.iloc[:initial]):
+        return None
+    return backtest_fit
 
-    return df_combined_plot, df_combined_forecast, mape_metrics, model_summaries
+@st.cache_data(max_entries=64)
+def scenario_forecast(data_key, _ts_production, _ts_farmgate, _ts_millgate, forecast_end_year, baseline_keys,
+                      _baseline):
+    """
+    What-if forecast of edited series that keeps the parameters of the baseline models.
+
+    Each model is rebuilt on the edited data by Kalman filtering with the baseline
+    parameters (`ARIMA.filter`). The backtest reuses the baseline's first window and the
+    parameters estimated on it (`ModelDiagnostics.backtest_fit`) when every edit falls
+    after that window, so it is filtered too and its MAPE stays out-of-sample and
+    comparable with the baseline's. Only an edit inside the first window makes the
+    backtest estimate that window again.
+    Series that were not edited keep their baseline results.
+
+    Args:
+        data_key (str): Content hash of the three edited series (as for `arima_forecast`).
+        forecast_end_year (int): The last year to forecast to.
+        baseline_keys (tuple): `ModelDiagnostics.key` of the three baseline models. With
+            `data_key` it identifies the scenario in the cache.
+        _baseline (tuple): The `baseline_forecast` outputs, whose model orders and
+            parameters are reused (not hashed by the cache).
+
+    Returns:
+        tuple: The same outputs as `arima_forecast`, or all None if a model could not
+        be applied to the edited data.
+    """
+    series_map = {
+        'Copra_Production (MT)': _ts_production,
+        'Farmgate Price (PHP/kg)': _ts_farmgate,
+        'Millgate Price (PHP/kg)': _ts_millgate
+    }
+    results = {}
+    for name, series in series_map.items():
+        baseline = _baseline[3][name]
+        if series.equals(baseline.data_series):
+            results[name] = SeriesForecast(
+                _baseline[1][name], baseline, _baseline[2][name], _baseline[4][name], _baseline[5][name], None,
+                _baseline[6][name]
+            )
+            continue
+        problems = validation.series_problems(series)
+        if problems:
+            print(f"Error: scenario for {name} not run: {'; '.join(problems)}.")
+            return None, None, None, None, None, None, None
+        try:
+            with perf.stage(f'scenario: {name}'):
+                model_fit = _arima_class()(series, order=baseline.order, freq='QS-JAN').filter(baseline.params)
+                results[name] = _forecast_from_results(
+                    model_fit, series, forecast_end_year, baseline.order,
+                    backtest_fit=_unedited_backtest_fit(baseline, series)
+                )
+        except Exception as e:
+            print(f"Error: scenario for {name} failed: {e}")
+            return None, None, None, None, None, None, None
+
+    df_combined_plot, df_combined_forecast = _combine_forecasts(
+        series_map, {name: result.forecast for name, result in results.items()}
+    )
+    return (
+        df_combined_plot,
+        df_combined_forecast,
+        {name: result.mape for name, result in results.items()},
+        {name: result.summary for name, result in results.items()},
+        {name: result.order for name, result in results.items()},
+        {name: result.backtest for name, result in results.items()},
+        {name: result.intervals for name, result in results.items()},
+    )
+
+def _prewarm(status):
+    """
+    Loads the data and forecasts every barangay with the default settings.
+
+    The results land in the same caches the main page reads (`arima_forecast`, the
+    model store and the disk cache), so the first visitors are served without fitting.
+    """
+    try:
+        dataset = get_base_dataset()
+        perf.startup.mark('prewarm: data loaded')
+        barangays = dataset.barangays()
+        status['total'] = len(barangays)
+        for barangay in barangays:
+            df_barangay, report = dataset.model_series_frame(barangay)
+            if not df_barangay.empty and not (report['Status'] == 'reject').any():
+                args, kwargs = forecast_arguments(df_barangay, barangay)
+                arima_forecast(*args, **kwargs)
+            status['done'] += 1
+            if status['done'] == 1:
+                perf.startup.mark('prewarm: first barangay forecast')
+        perf.startup.mark('prewarm: all barangays forecast')
+    except Exception as e:
+        print(f"Prewarm failed: {e}")
+        status['error'] = str(e)
+
+@st.cache_resource
+def start_prewarm():
+    """
+    Starts the background prewarm once per process (see `_prewarm`).
+
+    Streamlit runs no app code before the first session, so the prewarm starts right
+    after the first page view. Set COPRA_PREWARM=0 to disable it.
+
+    Returns:
+        dict: Progress ('done' and 'total' barangays, 'error'), or None when disabled.
+    """
+    if os.environ.get('COPRA_PREWARM', '1') == '0':
+        return None
+    status = {'done': 0, 'total': None, 'error': None}
+    threading.Thread(target=_prewarm, args=(status,), name='copra-prewarm', daemon=True).start()
+    return status
+
+
+# Exports larger than this are spooled to a temporary file while they are written
+EXPORT_SPOOL_BYTES = 32 * 1024 * 1024
+
+
+def export_batches(dataset, order=DEFAULT_ORDER, criterion='aic', refit=False, forecast_end_year=MAX_FORECAST_END_YEAR):
+    """
+    Forecasts every barangay of a dataset, one barangay at a time, for `export.export_forecasts`.
+
+    Forecasts go through `arima_forecast` with the same arguments as the main page,
+    so barangays already forecast (or prewarmed) come straight from the caches.
+
+    Args:
+        dataset (SessionDataset): The session's data, including its edits.
+        order, criterion, refit: The model settings (see `arima_forecast`).
+        forecast_end_year (int): The last year to forecast to.
+
+    Yields:
+        list: (barangay, metric, SeriesForecast) for the three metrics of one barangay.
+    """
+    for barangay in dataset.barangays():
+        df_barangay, report = dataset.model_series_frame(barangay)
+        reasons = report.loc[report['Status'] == 'reject', 'Reason']
+        if df_barangay.empty or not reasons.empty:
+            # Like the main page, a barangay with any rejected series is not forecast at all
+            yield [
+                (barangay, metric, SeriesForecast(
+                    None,
+                    f"Error: {barangay} / {metric} rejected before fitting: {reasons.get(metric, 'no usable data')}."
+                    if df_barangay.empty or metric in reasons.index
+                    else f"Error: {barangay} / {metric} not forecast: another series of the barangay was rejected.",
+                    "N/A", None, None, None
+                ))
+                for metric in METRIC_COLUMNS
+            ]
+            continue
+
+        args, kwargs = forecast_arguments(df_barangay, barangay, order, criterion, refit)
+        (_, df_forecast, mape_metrics, _, model_orders, _, forecast_intervals) = slice_forecast_outputs(
+            arima_forecast(*args, **kwargs), forecast_end_year
+        )
+        if df_forecast is None:
+            yield [
+                (barangay, metric, SeriesForecast(None, f"Error: forecasting failed for {barangay}.", "N/A", None, None, None))
+                for metric in METRIC_COLUMNS
+            ]
+            continue
+        yield [
+            (barangay, metric, SeriesForecast(
+                df_forecast[metric], None, mape_metrics[metric], model_orders[metric], None, None,
+                forecast_intervals[metric]
+            ))
+            for metric in METRIC_COLUMNS
+        ]
+
+
+def export_all_forecasts(dataset, fmt, order=DEFAULT_ORDER, criterion='aic', refit=False,
+                         forecast_end_year=MAX_FORECAST_END_YEAR):
+    """
+    Writes the forecasts of every barangay to one file, barangay by barangay.
+
+    Called by the export download button when it is clicked (on a separate thread),
+    so nothing is fitted or written until a file is requested.
+
+    Returns:
+        file: The finished export, rewound to its start.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    with perf.stage('export_forecasts'):
+        export.export_forecasts(export_batches(dataset, order, criterion, refit, forecast_end_year), buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+
+@st.cache_data(max_entries=32)
+def simulate_forecast(model_keys, n_paths, _forecasts, _summaries, seed=0):
+    """
+    Simulates future paths of a barangay's three forecasts and summarizes them as quantiles.
+
+    Args:
+        model_keys (tuple): `ModelDiagnostics.key` of each metric's model. Together with
+            `n_paths` and `seed` it identifies the simulation, so the forecasts and
+            diagnostics themselves (underscore arguments) are not hashed.
+        n_paths (int): Simulated paths per series.
+        _forecasts (pd.DataFrame): Forecast values, one column per metric.
+        _summaries (dict): {metric: ModelDiagnostics} of the fitted models.
+        seed (int): Random seed.
+
+    Returns:
+        dict: {metric: quarterly quantiles} for each metric and 'Farmgate Revenue (PHP)', plus
+        'Annual Farmgate Revenue (PHP)' with the quantiles of the yearly revenue totals.
+    """
+    index = _forecasts.index
+    psi = [simulation.psi_weights(_summaries[metric].order, _summaries[metric].params, len(index))
+           for metric in METRIC_COLUMNS]
+    sigma2 = [_summaries[metric].params['sigma2'] for metric in METRIC_COLUMNS]
+    paths = simulation.simulate_paths(_forecasts[METRIC_COLUMNS].to_numpy().T, psi, sigma2, n_paths=n_paths, seed=seed)
+
+    quantiles = {metric: simulation.path_quantiles(paths[i], index) for i, metric in enumerate(METRIC_COLUMNS)}
+    # Revenue a barangay's farmers receive: production sold at the farmgate price
+    revenue = simulation.revenue_paths(paths[0], paths[1])
+    quantiles['Farmgate Revenue (PHP)'] = simulation.path_quantiles(revenue, index)
+    quantiles['Annual Farmgate Revenue (PHP)'] = simulation.annual_quantiles(revenue, index)
+    return quantiles
+
+@st.cache_data(max_entries=4)
+def hierarchical_forecast(data_version, metric, forecast_end_year, _dataset, _store=None):
+    """
+    Forecasts every node of the barangay hierarchy and reconciles the forecasts.
+
+    Barangay series are forecast through `_store` under the same (barangay, metric) keys
+    as `arima_forecast`, so models the main page fitted with the same (default) setting
+    are reused; only the aggregate nodes are fitted here. Models of other settings are
+    stored separately and are not evicted.
+
+    Args:
+        data_version (str): `SessionDataset.data_version()`: the shared base version plus a
+            hash of the session's edits.
+        metric (str): An additive metric (see `hierarchy.ADDITIVE_METRICS`).
+        forecast_end_year (int): The last year to forecast to (e.g., 2035).
+        _dataset (SessionDataset): The data (not hashed).
+        _store (ModelStore): Optional store of fitted models (not hashed).
+
+    Returns:
+        hierarchy.HierarchicalForecast
+    """
+    tree = hierarchy.Hierarchy.from_frame(_dataset.frame)
+    bottom_history = comparison.metric_frame(comparison_cube(data_version, _dataset.frame), metric)
+
+    def forecast_node(node, series):
+        if tree.levels[node] == 'Barangay':
+            # The exact series the main page forecasts, so the stored model matches
+            series = _dataset.model_series_frame(node)[0][metric]
+            key = (node, metric)
+        else:
+            key = (f"hierarchy:{node}", metric)
+        with perf.stage(node):
+            if _store is not None:
+                return _store.forecast(key, series, forecast_end_year, f"{node} / {metric}")
+            return _fit_and_forecast_single_series(series, forecast_end_year, f"{node} / {metric}")
+
+    return hierarchy.forecast_hierarchy(tree, bottom_history, forecast_node)
 
 
 # --- 4. Page Functions ---
 
+@st.fragment(run_every=1.0)
+def forecast_progress(job):
+    """
+    Shows the progress of a background forecast job, polling once a second.
+
+    When the job finishes, the whole page is rerun so the forecast section renders.
+    """
+    if job.finished:
+        st.rerun(scope="app")
+
+    st.progress(job.progress(), text=f"Fitting models in the background ({job.elapsed():.0f} s)...")
+    labels = {'queued': 'waiting', 'running': 'fitting', 'done': 'done'}
+    for col, (name, state) in zip(st.columns(len(job.steps)), job.steps.items()):
+        col.caption(f"{name}: {labels[state]}")
+
+def forecast_horizon_selector(dataset):
+    """
+    Sidebar choice of the last forecast year, shared by the forecasting pages.
+
+    Every horizon is a slice of the forecasts computed to MAX_FORECAST_END_YEAR, so
+    changing it never fits a model.
+
+    Returns:
+        int: The chosen end year.
+    """
+    first_year = min(dataset.base.frame['Period'].max().year + 1, MAX_FORECAST_END_YEAR)
+    return st.sidebar.select_slider(
+        "Forecast to year:",
+        options=list(range(first_year, MAX_FORECAST_END_YEAR + 1)),
+        value=MAX_FORECAST_END_YEAR,
+        key='forecast_end_year',
+        help=f"Forecasts are computed once to {MAX_FORECAST_END_YEAR} (COPRA_MAX_FORECAST_YEAR); "
+             "shorter horizons reuse them without refitting."
+    )
+
+
 def main_page():
     """Displays the single-barangay data editor, visualization, and ARIMA forecast."""
     
@@ -564,10 +1357,10 @@ def main_page():
     st.markdown("---")
     
     # Use data from session state
-    df_current = st.session_state['df_data']
+    dataset = st.session_state['dataset']
     
     # Get unique barangays for selection
-    barangays = df_current['Barangay'].unique()
+    barangays = dataset.barangays()
     
     # Sidebar for Filtering
     st.sidebar.header("Barangay Selection")
@@ -576,41 +1369,103 @@ def main_page():
         options=barangays,
         key='barangay_select'
     )
+
+    st.sidebar.header("Model Settings")
+    order_mode = st.sidebar.radio(
+        "ARIMA Order:",
+        options=["ARIMA(1, 1, 0)", "Automatic (AIC)", "Automatic (BIC)"],
+        key='order_mode',
+        help="Automatic modes search p, q in 0-3 (d by KPSS test) and keep the order with the lowest criterion."
+    )
+    if order_mode == "ARIMA(1, 1, 0)":
+        model_order, model_criterion = DEFAULT_ORDER, 'aic'
+    else:
+        model_order, model_criterion = 'auto', 'bic' if order_mode == "Automatic (BIC)" else 'aic'
+    refit_on_append = st.sidebar.checkbox(
+        "Re-estimate parameters when data is added",
+        value=False,
+        key='refit_on_append',
+        help="By default, appended quarters only update the fitted models (Kalman filtering with the existing parameters)."
+    )
+    forecast_in_background = st.sidebar.checkbox(
+        "Forecast in the background",
+        value=True,
+        key='forecast_in_background',
+        help="Show the rest of the page while the models are fitted; the forecast section fills in when they finish."
+    )
+    forecast_end_year = forecast_horizon_selector(dataset)
+    scenario_mode = st.sidebar.checkbox(
+        "Scenario mode for edits",
+        value=False,
+        key='scenario_mode',
+        help="Forecast an edited barangay with the parameters already estimated on the unedited data "
+             "and show the change against that baseline. Only edits inside the backtest's first window "
+             "re-estimate anything (that window alone)."
+    )
+
+    with st.sidebar.expander("Export All Barangays"):
+        export_format = st.selectbox("Format", options=export.EXPORT_FORMATS, key='export_format')
+        # The file is only generated when the button is clicked, with the current model settings
+        st.download_button(
+            "Download forecasts",
+            data=lambda: export_all_forecasts(
+                dataset, export_format, model_order, model_criterion, refit_on_append, forecast_end_year
+            ),
+            file_name=f"copra_forecasts.{export_format}",
+            mime=export.MIME_TYPES[export_format],
+            help="Forecasts, 80%/95% prediction intervals, MAPE and model order of every barangay and metric. "
+                 "Barangays not forecast yet are fitted while the file is written."
+        )
     
     # --- A. Data Viewer and Editor ---
     st.header(f"1. Raw Data Viewer & Editor for {selected_barangay}")
     st.info("You can directly edit the values below or use the 'Add New Data Point' section to append a row.")
 
-    # Filter data for the selected barangay to display in the editor
-    df_barangay_editable = df_current[df_current['Barangay'] == selected_barangay].sort_values(by='Period', ascending=True).copy()
+    # Look up the selected barangay's rows (already in period order) through the barangay index
+    with perf.stage('filter'):
+        df_barangay_editable = dataset.display_rows(selected_barangay)
 
     # Use st.data_editor for interactive editing/deleting of the filtered data
-    edited_df = st.data_editor(
-        df_barangay_editable,
-        column_config={
-            "Period": st.column_config.DatetimeColumn("Period", format="YYYY-MM-DD", disabled=True),
-            "Barangay": st.column_config.TextColumn("Barangay", disabled=True),
-        },
-        key='data_editor',
-        hide_index=True,
-        num_rows="dynamic"
-    )
+    with perf.stage('data_editor'):
+        st.data_editor(
+            df_barangay_editable,
+            column_config={
+                "Period": st.column_config.DatetimeColumn("Period", format="YYYY-MM-DD", disabled=True),
+                "Barangay": st.column_config.TextColumn("Barangay", disabled=True),
+                "Year": st.column_config.NumberColumn("Year", format="%d", disabled=True),
+                "Quarter": st.column_config.TextColumn("Quarter", disabled=True),
+            },
+            key='data_editor',
+            hide_index=True,
+            num_rows="dynamic"
+        )
 
-    # Convert edited_df back to the main DataFrame
-    if edited_df.shape[0] != df_barangay_editable.shape[0] or not edited_df.equals(df_barangay_editable):
-        # 1. Remove old data for the selected barangay from the session state
-        df_other_barangays = df_current[df_current['Barangay'] != selected_barangay]
-        
-        # 2. Add the newly edited (or deleted/modified) data
-        st.session_state['df_data'] = pd.concat([df_other_barangays, edited_df], ignore_index=True)
-        # Rerun is usually needed only if the data structure changes, but we rerun later after adding data.
+    # Apply only the editor's changes (edited cells, added and deleted rows) to the affected rows.
+    # Applying them changes the editor's data, which resets its change state on the next rerun.
+    with perf.stage('apply_edits'):
+        _, skipped_rows = dataset.apply_editor_delta(
+            selected_barangay,
+            df_barangay_editable,
+            st.session_state.get('data_editor')
+        )
+    if skipped_rows:
+        st.warning("Rows added in the table need a Period; please use the 'Add New Data Point' section instead.")
         
-    # Filter the final, processed data for the current barangay
-    df_barangay_final = st.session_state['df_data'][st.session_state['df_data']['Barangay'] == selected_barangay].copy()
-    
-    # Convert the final DataFrame back to a time series for modeling and visualization
-    df_barangay_final['Period'] = pd.to_datetime(df_barangay_final['Period'])
-    df_barangay_final = df_barangay_final.set_index('Period').sort_index()
+    # Period-indexed rows of the current barangay for modeling and visualization, regularized
+    # (one row per quarter, gaps and non-positive values interpolated) before any model sees them
+    with perf.stage('validate'):
+        df_barangay_final, validation_report = dataset.model_series_frame(selected_barangay)
+    rejected = validation_report[validation_report['Status'] == 'reject']
+    repaired = validation_report[validation_report['Status'] == 'regularize']
+    if not rejected.empty:
+        st.error("Cannot forecast " + "; ".join(f"{metric}: {reason}" for metric, reason in rejected['Reason'].items()) + ".")
+    elif not repaired.empty:
+        issues = repaired[validation.ISSUE_COLUMNS].max()
+        st.warning(
+            "The data was regularized before modelling ("
+            + ", ".join(f"{name.lower()}: {int(count)}" for name, count in issues.items() if count)
+            + "). Missing quarters and missing or non-positive values are interpolated."
+        )
     
     ts_production = df_barangay_final['Copra_Production (MT)']
     ts_farmgate = df_barangay_final['Farmgate Price (PHP/kg)']
@@ -646,19 +1501,14 @@ def main_page():
                     new_period_dt = pd.to_datetime(new_period)
                     new_data = {
                         'Barangay': new_barangay,
-                        'Year': new_period_dt.year,
-                        'Quarter': f'Q{(new_period_dt.month - 1) // 3 + 1}',
                         'Period': new_period_dt,
                         'Copra_Production (MT)': new_copra,
                         'Farmgate Price (PHP/kg)': new_farmgate,
                         'Millgate Price (PHP/kg)': new_millgate
                     }
                     
-                    # Create a temporary DataFrame for the new row
-                    new_row_df = pd.DataFrame([new_data])
-
-                    # Append to session state
-                    st.session_state['df_data'] = pd.concat([st.session_state['df_data'], new_row_df], ignore_index=True)
+                    # Append to the session's dataset
+                    dataset.append_rows([new_data])
                     st.success(f"New data point added for **{new_barangay}** on **{new_period_dt.strftime('%Y-%m-%d')}**. Rerunning app...")
                     st.rerun() # Rerun to update plots and forecasts
 
@@ -668,104 +1518,142 @@ def main_page():
 
     col1, col2 = st.columns(2)
 
-    with col1:
+    # Charts are rendered to cached PNG bytes, so unchanged data is not redrawn on reruns
+    with col1, perf.stage('plot_historical_production'):
         st.caption("Copra Production (Metric Tons)")
         # Production Line Plot
-        fig_prod, ax_prod = plt.subplots(figsize=(10, 5))
-        ts_production.plot(ax=ax_prod, marker='o', linestyle='-', color='#0077B6', label='Production (MT)')
-        ax_prod.set_title(f'Copra Production Trend')
-        ax_prod.set_xlabel('Time (Quarterly)')
-        ax_prod.set_ylabel('Production (MT)')
-        ax_prod.grid(axis='y', linestyle='--')
-        ax_prod.legend(loc='upper left')
-        st.pyplot(fig_prod)
-        
+        st.image(figures.history_production(ts_production), width='stretch')
 
-    with col2:
+    with col2, perf.stage('plot_historical_prices'):
         st.caption("Farmgate and Millgate Prices (PHP/kg)")
         # Price Line Plot
-        fig_price, ax_price = plt.subplots(figsize=(10, 5))
-        ts_farmgate.plot(ax=ax_price, marker='s', linestyle='-', color='#48A9A6', label='Farmgate Price')
-        ts_millgate.plot(ax=ax_price, marker='^', linestyle='-', color='#F4A261', label='Millgate Price')
-        ax_price.set_title(f'Copra Price Trends')
-        ax_price.set_xlabel('Time (Quarterly)')
-        ax_price.set_ylabel('Price (PHP/kg)')
-        ax_price.grid(axis='y', linestyle='--')
-        ax_price.legend(loc='upper left')
-        st.pyplot(fig_price)
+        st.image(figures.history_prices(ts_farmgate, ts_millgate), width='stretch')
 
     # --- D. Forecasting ---
-    st.header("3. ARIMA Forecasting (2026 - 2035)")
     if last_historical_date is not None:
+        st.header(f"3. ARIMA Forecasting ({(last_historical_date + DateOffset(months=3)).year} - {forecast_end_year})")
         st.caption(f"Forecasting Copra Production and Prices starting from Q1 of the next period after {last_historical_date.strftime('%Y-%m-%d')}.")
     else:
+        st.header("3. ARIMA Forecasting")
         st.warning("No historical data available to run the forecast.")
         return
+    if not rejected.empty:
+        # Rejected series are never sent to a fit (see the validation message above)
+        st.warning("Forecasting is skipped until every series has enough usable quarters.")
+        return
 
     # Perform the forecast pipeline for all three metrics
-    # Need to pass copies because pandas Series might not be hashable/cacheable if modified in place
-    df_combined_plot, df_combined_forecast, mape_metrics, model_summaries = arima_forecast(
-        ts_production.copy(), 
-        ts_farmgate.copy(), 
-        ts_millgate.copy(), 
-        2035,
-        last_historical_date
+    # The cache is keyed by a content hash of the series rather than by the series themselves
+    with perf.stage('arima_forecast'):
+        forecast_args, forecast_kwargs = forecast_arguments(
+            df_barangay_final, selected_barangay, model_order, model_criterion, refit_on_append
+        )
+        data_key = forecast_args[0]
+        # Edits in scenario mode are filtered with the baseline models until a full refit is requested
+        baseline_outputs = None
+        if (scenario_mode and selected_barangay in dataset.edited_barangays()
+                and data_key not in st.session_state.setdefault('scenario_refits', set())):
+            baseline_outputs = baseline_forecast(dataset, selected_barangay, model_order, model_criterion)
+        if baseline_outputs is not None:
+            forecast_outputs = scenario_forecast(
+                *forecast_args[:5], tuple(summary.key for summary in baseline_outputs[3].values()), baseline_outputs
+            )
+        elif forecast_in_background:
+            # One job per session: a job for another barangay or setting supersedes (cancels) the previous one
+            job = get_job_registry().submit(
+                st.session_state['session_token'],
+                (data_key, MAX_FORECAST_END_YEAR, model_order, model_criterion, selected_barangay, refit_on_append),
+                lambda job: arima_forecast(*forecast_args, **forecast_kwargs, _job=job),
+                steps=METRIC_COLUMNS
+            )
+            # Cache hits finish almost immediately; render them inline instead of via the progress poller
+            if not job.wait(0.1):
+                forecast_progress(job)
+                st.markdown("---")
+                return
+            if job.error is not None:
+                st.error(f"Forecasting failed: {job.error}")
+                return
+            forecast_outputs = job.result()
+        else:
+            forecast_outputs = arima_forecast(*forecast_args, **forecast_kwargs)
+        # Forecasts always run to MAX_FORECAST_END_YEAR; the chosen horizon is a slice of them
+        (df_combined_plot, df_combined_forecast, mape_metrics, model_summaries, model_orders, backtest_tables,
+         forecast_intervals) = slice_forecast_outputs(forecast_outputs, forecast_end_year)
+
+    cache_stats = get_forecast_cache().stats()
+    st.sidebar.caption(
+        f"Forecast cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['bytes'] / 1024:.0f} KB on disk)"
     )
 
     if df_combined_plot is not None:
         
         # --- D1. Forecast Visualization (Separate plots for Production and Prices) ---
         st.subheader("Forecast Visualization (Historical + Predicted)")
+        st.caption("Shaded bands are the models' 80% and 95% prediction intervals.")
         
         col_viz_1, col_viz_2 = st.columns(2)
         
         # Plot 1: Production Forecast
-        with col_viz_1:
+        with col_viz_1, perf.stage('plot_forecast_production'):
             st.caption("Copra Production Forecast (MT)")
-            fig_f_prod, ax_f_prod = plt.subplots(figsize=(10, 5))
-            
-            # Plot Historical Production
-            df_combined_plot[df_combined_plot['Type'] == 'Historical']['Copra_Production (MT)'].plot(
-                ax=ax_f_prod, label='Historical Production', color='#1E88E5', linestyle='-', marker='.'
-            )
-            
-            # Plot Forecast Production
-            df_combined_plot[df_combined_plot['Type'] == 'Forecast']['Copra_Production (MT)'].plot(
-                ax=ax_f_prod, label='ARIMA Forecast', color='#FF7043', linestyle='--', marker='.'
-            )
-            
-            ax_f_prod.set_title(f'Copra Production Forecast for {selected_barangay}')
-            ax_f_prod.set_xlabel('Period')
-            ax_f_prod.set_ylabel('Copra Production (MT)')
-            ax_f_prod.legend()
-            ax_f_prod.grid(axis='y', linestyle=':')
-            # Draw a line at the last historical point
-            ax_f_prod.axvline(x=last_historical_date, color='grey', linestyle=':', linewidth=2, label='Forecast Start')
-            st.pyplot(fig_f_prod)
+            st.image(figures.forecast_production(
+                df_combined_plot, selected_barangay, last_historical_date,
+                intervals=forecast_intervals['Copra_Production (MT)']
+            ), width='stretch')
             
         # Plot 2: Price Forecast (Farmgate & Millgate)
-        with col_viz_2:
+        with col_viz_2, perf.stage('plot_forecast_prices'):
             st.caption("Price Forecast (Farmgate & Millgate Price)")
-            fig_f_price, ax_f_price = plt.subplots(figsize=(10, 5))
-
-            # Plot Historical Prices
-            df_hist = df_combined_plot[df_combined_plot['Type'] == 'Historical']
-            df_hist['Farmgate Price (PHP/kg)'].plot(ax=ax_f_price, label='Historical Farmgate', color='#00A896', linestyle='-', marker='s')
-            df_hist['Millgate Price (PHP/kg)'].plot(ax=ax_f_price, label='Historical Millgate', color='#F4B400', linestyle='-', marker='^')
-
-            # Plot Forecast Prices
-            df_fore = df_combined_plot[df_combined_plot['Type'] == 'Forecast']
-            df_fore['Farmgate Price (PHP/kg)'].plot(ax=ax_f_price, label='Forecast Farmgate', color='#00A896', linestyle='--', alpha=0.7)
-            df_fore['Millgate Price (PHP/kg)'].plot(ax=ax_f_price, label='Forecast Millgate', color='#F4B400', linestyle='--', alpha=0.7)
-
-            ax_f_price.set_title(f'Price Forecast for {selected_barangay}')
-            ax_f_price.set_xlabel('Period')
-            ax_f_price.set_ylabel('Price (PHP/kg)')
-            ax_f_price.legend(loc='upper left')
-            ax_f_price.grid(axis='y', linestyle=':')
-            # Draw a line at the last historical point
-            ax_f_price.axvline(x=last_historical_date, color='grey', linestyle=':', linewidth=2, label='Forecast Start')
-            st.pyplot(fig_f_price)
+            st.image(figures.forecast_prices(
+                df_combined_plot, selected_barangay, last_historical_date,
+                farmgate_intervals=forecast_intervals['Farmgate Price (PHP/kg)'],
+                millgate_intervals=forecast_intervals['Millgate Price (PHP/kg)']
+            ), width='stretch')
+
+        # --- D1.5. Simulated Forecast Paths (Optional) ---
+        with st.expander("Simulated Forecast Paths & Revenue Risk (Monte Carlo)"), perf.stage('monte_carlo'):
+            simulate = st.toggle(
+                "Simulate forecast paths",
+                key='monte_carlo',
+                help="Draws future paths of all three models at once and shows their quantiles, including "
+                     "farmgate revenue (production × farmgate price). Series are simulated independently."
+            )
+            n_paths = st.select_slider("Paths per series", options=(1000, 2000, 5000, 10000, 20000),
+                                       value=simulation.DEFAULT_PATHS, key='monte_carlo_paths')
+            if simulate:
+                model_keys = tuple(model_summaries[metric].key for metric in METRIC_COLUMNS)
+                # Paths are simulated (and cached) to the maximum horizon and cut to the chosen one
+                simulated = simulate_forecast(model_keys, n_paths, forecast_outputs[1], model_summaries)
+                simulated = {
+                    name: quantiles.loc[:forecast_end_year] if name == 'Annual Farmgate Revenue (PHP)'
+                    else quantiles.loc[:df_combined_forecast.index[-1]]
+                    for name, quantiles in simulated.items()
+                }
+                revenue = simulated['Farmgate Revenue (PHP)'] / 1e6
+
+                fan_col_1, fan_col_2 = st.columns(2)
+                with fan_col_1:
+                    st.image(figures.fan_chart(
+                        ts_production, simulated['Copra_Production (MT)'],
+                        f'Simulated Copra Production for {selected_barangay}', 'Copra Production (MT)'
+                    ), width='stretch')
+                with fan_col_2:
+                    st.image(figures.fan_chart(
+                        None, revenue, f'Simulated Farmgate Revenue for {selected_barangay}',
+                        'Revenue (PHP million per quarter)', color='#2E7D32'
+                    ), width='stretch')
+
+                st.markdown("**Annual Farmgate Revenue (PHP million)**")
+                annual = simulated['Annual Farmgate Revenue (PHP)']
+                st.dataframe(
+                    (annual.drop(columns='Quarters') / 1e6).round(2)
+                    .rename(columns={'q05': '5th percentile', 'q50': 'Median', 'q95': '95th percentile'})
+                    .assign(Quarters=annual['Quarters']),
+                    height=300
+                )
+                st.caption(f"Quantiles of {n_paths:,} simulated paths; the first year only covers the remaining quarters.")
 
         # --- D2. Forecast Metrics & Table ---
         st.subheader("Forecast Metrics & Data")
@@ -776,23 +1664,33 @@ def main_page():
             st.metric(
                 label="Production MAPE", 
                 value=mape_metrics['Copra_Production (MT)'],
-                help="MAPE is calculated by backtesting the model on the last 4 known historical quarters to estimate predictive accuracy for Production."
+                help="MAPE is averaged over a rolling-origin backtest (forecast horizons of 1 to 4 quarters from every cutoff in the second half of the history) to estimate predictive accuracy for Production."
             )
             
         with mape_col2:
             st.metric(
                 label="Farmgate Price MAPE", 
                 value=mape_metrics['Farmgate Price (PHP/kg)'],
-                help="MAPE is calculated by backtesting the model on the last 4 known historical quarters to estimate predictive accuracy for Farmgate Price."
+                help="MAPE is averaged over a rolling-origin backtest (forecast horizons of 1 to 4 quarters from every cutoff in the second half of the history) to estimate predictive accuracy for Farmgate Price."
             )
 
         with mape_col3:
             st.metric(
                 label="Millgate Price MAPE", 
                 value=mape_metrics['Millgate Price (PHP/kg)'],
-                help="MAPE is calculated by backtesting the model on the last 4 known historical quarters to estimate predictive accuracy for Millgate Price."
+                help="MAPE is averaged over a rolling-origin backtest (forecast horizons of 1 to 4 quarters from every cutoff in the second half of the history) to estimate predictive accuracy for Millgate Price."
             )
 
+        with st.expander("View Rolling-Origin Backtest Errors by Horizon"), perf.stage('backtest_tables'):
+            st.caption("Each origin reuses the model fitted on the first window, extended with the newly observed quarters.")
+            backtest_cols = st.columns(3)
+            for backtest_col, metric in zip(backtest_cols, METRIC_COLUMNS):
+                with backtest_col:
+                    st.markdown(f"**{metric}**")
+                    if backtest_tables[metric] is not None:
+                        st.dataframe(backtest_tables[metric].round(2))
+                    else:
+                        st.write("Not enough data for a rolling backtest.")
 
         st.markdown("**Forecasted Data Table (Production and Prices)**")
         df_table = df_combined_forecast.copy()
@@ -810,18 +1708,56 @@ def main_page():
             height=300
         )
 
+        # --- D2b. Scenario vs. Baseline ---
+        if baseline_outputs is not None:
+            st.subheader("Scenario vs. Baseline")
+            st.caption(
+                "The edited data is forecast with the model parameters estimated on the unedited data. "
+                "Changes are against the forecast of the unedited data."
+            )
+            metric_labels = ["Production (MT)", "Farmgate Price (PHP/kg)", "Millgate Price (PHP/kg)"]
+            df_delta = (df_combined_forecast[METRIC_COLUMNS] - baseline_outputs[1][METRIC_COLUMNS]).dropna(how='all')
+            last_period = df_combined_forecast.index[-1]
+            for delta_col, metric, label in zip(st.columns(3), METRIC_COLUMNS, metric_labels):
+                delta_col.metric(
+                    label=f"{label}, {last_period.year} Q{last_period.quarter}",
+                    value=f"{df_combined_forecast[metric].iloc[-1]:,.2f}",
+                    delta=f"{df_delta[metric].iloc[-1]:+,.2f}" if last_period in df_delta.index else None
+                )
+            with st.expander("View Change by Quarter"):
+                df_delta.index.name = 'Forecast Period'
+                st.dataframe(df_delta.round(2), height=300)
+            if st.button("Refit with full estimation", help="Re-estimate the parameters on the edited data."):
+                st.session_state['scenario_refits'].add(data_key)
+                st.rerun()
+
         # --- D3. Model Diagnostics (Optional) ---
-        with st.expander("View All ARIMA Model Summaries"):
-            st.subheader("Copra Production Model Summary (ARIMA(1, 1, 0))")
-            st.code(model_summaries['Copra_Production (MT)'])
-            
-            st.subheader("Farmgate Price Model Summary (ARIMA(1, 1, 0))")
-            st.code(model_summaries['Farmgate Price (PHP/kg)'])
-            
-            st.subheader("Millgate Price Model Summary (ARIMA(1, 1, 0))")
-            st.code(model_summaries['Millgate Price (PHP/kg)'])
-            
-            st.caption("Note: The model used is a simple ARIMA(1, 1, 0) for demonstration purposes. Results may vary.")
+        with st.expander("View All ARIMA Model Summaries"), perf.stage('model_summaries'):
+            # Expander contents run even while collapsed, so the diagnostics are computed
+            # (and then cached) only once they are explicitly requested
+            show_diagnostics = st.toggle(
+                "Compute model diagnostics",
+                key='show_diagnostics',
+                help="Summary tables, residual autocorrelation and residual tests for the three models."
+            )
+            if show_diagnostics:
+                for metric, label in zip(METRIC_COLUMNS, ["Copra Production", "Farmgate Price", "Millgate Price"]):
+                    diagnostics = model_summaries[metric]
+                    st.subheader(f"{label} Model Summary (ARIMA{model_orders[metric]})")
+                    st.code(diagnostics.summary_text())
+
+                    acf_col, tests_col = st.columns(2)
+                    with acf_col:
+                        st.caption("Residual autocorrelation (bars outside \u00b1Bound are significant at 5%)")
+                        st.bar_chart(diagnostics.residual_acf()['ACF'], height=200)
+                    with tests_col:
+                        st.caption("Residual tests")
+                        st.dataframe(pd.DataFrame(diagnostics.test_statistics()).T.round(4))
+
+            if model_order == 'auto':
+                st.caption(f"Note: Orders were selected automatically by {model_criterion.upper()}. Results may vary.")
+            else:
+                st.caption("Note: The model used is a simple ARIMA(1, 1, 0) for demonstration purposes. Results may vary.")
 
     else:
         # If model_summaries is None, an error occurred in the pipeline
@@ -829,33 +1765,90 @@ def main_page():
 
     st.markdown("---")
 
+# Upper bound on the lines drawn per comparison chart, whatever the number of barangays
+MAX_COMPARISON_LINES = 30
+# Search matches offered in the barangay picker at a time
+MAX_SEARCH_MATCHES = 200
+
+COMPARISON_VIEWS = ("Top N by production", "Percentile bands", "Selected barangays")
+
+@st.cache_data(max_entries=8)
+def comparison_cube(data_version, _df):
+    """
+    Period x (metric, barangay) pivot of the whole dataset, built once per data version.
+
+    Args:
+        data_version (str): `SessionDataset.data_version()`: the shared base version plus a
+            hash of the session's edits.
+        _df (pd.DataFrame): The dataset's table (not hashed).
+    """
+    return comparison.build_cube(_df)
+
+def _comparison_chart(cube, metric, view, selected, title, ylabel, figsize=(10, 5), legend_kwargs=None):
+    """Renders one metric of the comparison page in the chosen view."""
+    if view == "Percentile bands":
+        return figures.percentile_band(comparison.percentile_bands(cube, metric), title, ylabel, figsize=figsize)
+    return figures.comparison(comparison.metric_frame(cube, metric, selected), title, ylabel,
+                              figsize=figsize, legend_kwargs=legend_kwargs)
+
 def comparison_page():
     """Displays comparative visualizations for all barangays, using session state data."""
     
     st.title(":chart_with_upwards_trend: All Barangays Comparison")
     st.markdown("---")
     
-    df_current = st.session_state['df_data']
+    dataset = st.session_state['dataset']
+
+    # One pivot of all metrics, reused by every view until the data is edited
+    with perf.stage('comparison_cube'):
+        cube = comparison_cube(dataset.data_version(), dataset.frame)
+    all_barangays = comparison.barangays(cube)
+
+    view = st.radio("View", COMPARISON_VIEWS, horizontal=True, key='comparison_view')
+    selected = None
+    with perf.stage('select_barangays'):
+        if view == "Top N by production":
+            max_lines = min(len(all_barangays), MAX_COMPARISON_LINES)
+            top = st.slider(
+                "Number of barangays", min_value=1, max_value=max_lines, value=min(10, max_lines),
+                key='comparison_top_n'
+            ) if max_lines > 1 else max_lines
+            selected = comparison.top_n(cube, top)
+            st.caption(f"Showing the {len(selected)} of {len(all_barangays)} barangays with the highest mean production.")
+        elif view == "Percentile bands":
+            st.caption(f"Percentiles across all {len(all_barangays)} barangays for each period.")
+        else:
+            query = st.text_input("Search barangays", key='comparison_search')
+            matches = comparison.search(all_barangays, query)
+            current = [b for b in st.session_state.get('comparison_selected', []) if b in all_barangays]
+            # Keep the current picks selectable while the search narrows the list
+            options = current + [b for b in matches[:MAX_SEARCH_MATCHES] if b not in current]
+            if len(matches) > MAX_SEARCH_MATCHES:
+                st.caption(f"{len(matches)} matches; showing the first {MAX_SEARCH_MATCHES}. Refine the search to see more.")
+            selected = st.multiselect(
+                "Barangays to compare", options, default=current or options[:min(5, len(options))],
+                max_selections=MAX_COMPARISON_LINES, key='comparison_selected'
+            )
+            if not selected:
+                st.info("Select at least one barangay to compare.")
+                return
+
+    st.markdown("---")
 
     st.header("1. Production Comparison (Metric Tons)")
     
-    # Group and pivot data for plotting all series
-    df_pivot_prod = df_current.pivot_table(
-        index='Period', 
-        columns='Barangay', 
-        values='Copra_Production (MT)'
-    )
-    
     # Plot Production Comparison
-    fig_prod, ax_prod = plt.subplots(figsize=(12, 6))
-    df_pivot_prod.plot(ax=ax_prod, marker='.', linestyle='-')
-    ax_prod.set_title('Copra Production (MT) Comparison Across All Barangays')
-    ax_prod.set_xlabel('Period')
-    ax_prod.set_ylabel('Copra Production (MT)')
-    ax_prod.legend(title='Barangay', bbox_to_anchor=(1.05, 1), loc='upper left')
-    ax_prod.grid(axis='y', linestyle=':')
-    plt.tight_layout()
-    st.pyplot(fig_prod)
+    with perf.stage('plot_production'):
+        st.image(
+            _comparison_chart(
+                cube, 'Copra_Production (MT)', view, selected,
+                'Copra Production (MT) Comparison Across Barangays',
+                'Copra Production (MT)',
+                figsize=(12, 6),
+                legend_kwargs={'bbox_to_anchor': (1.05, 1), 'loc': 'upper left'}
+            ),
+            width='stretch'
+        )
     
     st.markdown("---")
     
@@ -864,38 +1857,146 @@ def comparison_page():
     col1, col2 = st.columns(2)
     
     # Plot Farmgate Price Comparison
-    with col1:
-        df_pivot_farm = df_current.pivot_table(
-            index='Period', 
-            columns='Barangay', 
-            values='Farmgate Price (PHP/kg)'
+    with col1, perf.stage('farmgate_comparison'):
+        st.image(
+            _comparison_chart(
+                cube, 'Farmgate Price (PHP/kg)', view, selected,
+                'Farmgate Price (PHP/kg) Comparison',
+                'Price (PHP/kg)',
+                legend_kwargs={'fontsize': 8, 'loc': 'upper left'}
+            ),
+            width='stretch'
         )
-        fig_farm, ax_farm = plt.subplots(figsize=(10, 5))
-        df_pivot_farm.plot(ax=ax_farm, marker='.', linestyle='-')
-        ax_farm.set_title('Farmgate Price (PHP/kg) Comparison')
-        ax_farm.set_xlabel('Period')
-        ax_farm.set_ylabel('Price (PHP/kg)')
-        ax_farm.legend(title='Barangay', fontsize=8, loc='upper left')
-        ax_farm.grid(axis='y', linestyle=':')
-        plt.tight_layout()
-        st.pyplot(fig_farm)
 
     # Plot Millgate Price Comparison
-    with col2:
-        df_pivot_mill = df_current.pivot_table(
-            index='Period', 
-            columns='Barangay', 
-            values='Millgate Price (PHP/kg)'
+    with col2, perf.stage('millgate_comparison'):
+        st.image(
+            _comparison_chart(
+                cube, 'Millgate Price (PHP/kg)', view, selected,
+                'Millgate Price (PHP/kg) Comparison',
+                'Price (PHP/kg)',
+                legend_kwargs={'fontsize': 8, 'loc': 'upper left'}
+            ),
+            width='stretch'
+        )
+
+def hierarchy_page():
+    """Displays coherent municipal/barangay production forecasts reconciled across the hierarchy."""
+
+    st.title(":bar_chart: Municipal Total (Hierarchical Forecast)")
+    st.markdown("---")
+
+    dataset = st.session_state['dataset']
+    metric = hierarchy.ADDITIVE_METRICS[0]
+    forecast_end_year = forecast_horizon_selector(dataset)
+
+    st.markdown(
+        "Every barangay and every aggregate (the municipal total, plus provinces and municipalities "
+        "when the data has those columns) is forecast with ARIMA, and the forecasts are then "
+        "**reconciled** so that each total equals the sum of its barangays."
+    )
+    method = st.radio(
+        "Reconciliation method",
+        hierarchy.RECONCILIATION_METHODS,
+        format_func=hierarchy.METHOD_LABELS.get,
+        index=hierarchy.RECONCILIATION_METHODS.index('mint_shrink'),
+        horizontal=True,
+        key='hierarchy_method'
+    )
+
+    with perf.stage('hierarchical_forecast'), st.spinner("Forecasting and reconciling every node..."):
+        try:
+            result = hierarchical_forecast(
+                dataset.data_version(), metric, MAX_FORECAST_END_YEAR, dataset, _store=get_model_store()
+            )
+        except ValueError as e:
+            print(f"Hierarchical forecast failed: {e}")
+            st.error(f"Hierarchical forecasting could not be completed: {e}")
+            return
+
+    tree = hierarchy.Hierarchy.from_frame(dataset.frame)
+    # Nodes are forecast to MAX_FORECAST_END_YEAR once; the chosen horizon is a slice
+    horizon_end = pd.Timestamp(f'{forecast_end_year}-10-01')
+    base = result.base.loc[:horizon_end]
+    reconciled = result.reconciled[method].loc[:horizon_end]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Nodes", f"{len(tree)} ({len(tree.bottom)} barangays)")
+    col2.metric("Base forecast incoherence (MT)", f"{hierarchy.coherence_error(tree, base):,.2f}")
+    col3.metric("Reconciled incoherence (MT)", f"{hierarchy.coherence_error(tree, reconciled):,.2f}")
+    if method == 'mint_shrink' and result.shrinkage is not None:
+        st.caption(f"Shrinkage intensity of the residual covariance: λ = {result.shrinkage:.3f}")
+
+    st.markdown("---")
+
+    st.header("1. Forecast by Node")
+    node = st.selectbox("Node", tree.nodes, key='hierarchy_node')
+    with perf.stage('plot_hierarchy'):
+        st.image(
+            figures.hierarchy_forecast(
+                result.history[node].dropna(), base[node], reconciled[node], node,
+                hierarchy.METHOD_LABELS[method]
+            ),
+            width='stretch'
+        )
+
+    st.markdown("---")
+
+    st.header("2. Annual Reconciled Forecasts (MT)")
+    with perf.stage('annual_table'):
+        annual = reconciled.groupby(reconciled.index.year).sum().T
+        annual.columns = annual.columns.astype(str)
+        annual.insert(0, 'Level', [tree.levels[name] for name in annual.index])
+        annual.index.name = 'Node'
+        st.dataframe(annual, width='stretch')
+    st.caption("Yearly sums of the quarterly forecasts; the first year only covers the remaining quarters.")
+
+def render_performance_panel(run_timings, show_timings):
+    """
+    Shows the stage timings of this rerun in the sidebar and the last profile report, if any.
+
+    Args:
+        run_timings (perf.RunTimings): Timings recorded for the page that just ran.
+        show_timings (bool): Whether the sidebar timing table is enabled.
+    """
+    if show_timings:
+        st.sidebar.header("Performance")
+        st.sidebar.caption(f"This rerun: {run_timings.total * 1000:.0f} ms ({run_timings.name})")
+        dataset = st.session_state['dataset']
+        st.sidebar.caption(
+            f"Data: {len(dataset):,} rows; {dataset.base.memory_usage() / 1024 ** 2:.2f} MB shared by all sessions, "
+            f"{dataset.memory_usage() / 1024 ** 2:.2f} MB of edits in this session"
         )
-        fig_mill, ax_mill = plt.subplots(figsize=(10, 5))
-        df_pivot_mill.plot(ax=ax_mill, marker='.', linestyle='-')
-        ax_mill.set_title('Millgate Price (PHP/kg) Comparison')
-        ax_mill.set_xlabel('Period')
-        ax_mill.set_ylabel('Price (PHP/kg)')
-        ax_mill.legend(title='Barangay', fontsize=8, loc='upper left')
-        ax_mill.grid(axis='y', linestyle=':')
-        plt.tight_layout()
-        st.pyplot(fig_mill)
+        rows = run_timings.to_rows()
+        if rows:
+            df_timings = pd.DataFrame(rows)
+            # Indent nested stages under their parent
+            df_timings['Stage'] = [
+                '\u2003' * depth + stage for stage, depth in zip(df_timings['Stage'], df_timings['Depth'])
+            ]
+            st.sidebar.dataframe(
+                df_timings[['Stage', 'Time (ms)', 'Share (%)']].round(1),
+                hide_index=True
+            )
+
+        # Process startup, in seconds since the app's modules were first imported
+        st.sidebar.caption("Startup timeline")
+        st.sidebar.dataframe(pd.DataFrame(perf.startup.to_rows()).round(2), hide_index=True)
+        prewarm = start_prewarm()
+        if prewarm is not None:
+            state = f"failed ({prewarm['error']})" if prewarm['error'] else f"{prewarm['done']} of {prewarm['total'] or '?'} barangays"
+            st.sidebar.caption(f"Prewarm: {state}")
+
+    profile = st.session_state.get('perf_profile_report')
+    if profile and profile['report']:
+        with st.expander(f"Profile of the last profiled rerun ({profile['profiler']})"):
+            st.download_button(
+                "Download report",
+                data=profile['report'],
+                file_name=f"profile-{profile['profiler'].lower()}.txt",
+                mime="text/plain"
+            )
+            st.code(profile['report'])
 
 
 # --- 5. Main App Navigation ---
@@ -913,14 +2014,39 @@ def run_app():
     st.sidebar.title("Navigation")
     page = st.sidebar.radio(
         "Select a Page",
-        ("Barangay Forecast & Analysis", "All Barangays Comparison")
+        ("Barangay Forecast & Analysis", "All Barangays Comparison", "Municipal Total (Hierarchical)")
     )
     
+    # Stage timings are always recorded (and logged as JSON when COPRA_PERF_LOG is set);
+    # the sidebar table and a one-off profile of the page are opt-in
+    with st.sidebar.expander("Performance"):
+        show_timings = st.checkbox("Show stage timings", key='perf_show_timings')
+        profiler = st.selectbox("Profiler", perf.PROFILERS, key='perf_profiler')
+        profile_now = st.button(
+            "Profile this page once",
+            key='perf_profile',
+            help="Reruns the current page under the selected profiler and shows the report below the page."
+        )
+
+    page_func, page_name = {
+        "Barangay Forecast & Analysis": (main_page, 'main_page'),
+        "All Barangays Comparison": (comparison_page, 'comparison_page'),
+        "Municipal Total (Hierarchical)": (hierarchy_page, 'hierarchy_page'),
+    }[page]
+
     # Display the selected page
-    if page == "Barangay Forecast & Analysis":
-        main_page()
-    elif page == "All Barangays Comparison":
-        comparison_page()
+    with perf.record_rerun(page_name) as run_timings, perf.stage(page_name):
+        if profile_now:
+            with perf.profile_run(profiler) as profile:
+                st.session_state['perf_profile_report'] = profile
+                page_func()
+        else:
+            page_func()
+
+    perf.startup.mark('first page rendered')
+    # Started after the page so the first visitor's own forecast is not slowed down by it
+    start_prewarm()
+    render_performance_panel(run_timings, show_timings)
 
 if __name__ == "__main__":
     run_app()
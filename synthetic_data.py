@@ -0,0 +1,137 @@
+"""
+Synthetic Copra Production panels for benchmarking at scale.
+
+Generates quarterly data for any number of barangays in the same schema as
+the embedded `CSV_CONTENT` sample. Production levels differ by orders of
+magnitude between barangays (as in the sample), follow a random walk with a
+mild seasonal pattern, and prices share a common market path with small
+per-barangay deviations.
+
+Python API:
+
+    from synthetic_data import generate_panel
+    df_raw = generate_panel(10_000, seed=0)
+
+Command line:
+
+    $ python synthetic_data.py --barangays 100000 --output synthetic.parquet
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Same span as the embedded sample: 2015-Q1 to 2025-Q3
+DEFAULT_START = '2015-01-01'
+DEFAULT_QUARTERS = 43
+
+
+def barangay_names(n_barangays):
+    """Sortable synthetic barangay names ('Barangay 000001', ...)."""
+    width = max(6, len(str(n_barangays)))
+    return [f"Barangay {i:0{width}d}" for i in range(1, n_barangays + 1)]
+
+
+def _market_price(rng, n_quarters):
+    """Common farmgate price path (PHP/kg): a seasonal random walk kept within 12-80."""
+    seasonal = np.tile([1.5, 0.5, -1.0, -1.0], n_quarters // 4 + 1)[:n_quarters]
+    steps = rng.normal(0.0, 3.5, n_quarters)
+    path = 25.0 + np.cumsum(steps) + seasonal
+    return np.clip(path, 12.0, 80.0)
+
+
+def generate_panel(n_barangays, n_quarters=DEFAULT_QUARTERS, start=DEFAULT_START, seed=0,
+                   n_municipalities=0, n_provinces=0):
+    """
+    Generates a raw (not yet preprocessed) synthetic panel.
+
+    Args:
+        n_barangays (int): Number of barangays.
+        n_quarters (int): Quarters per barangay.
+        start (str): First quarter start date.
+        seed (int): Random seed; the same seed always gives the same panel.
+        n_municipalities (int): If positive, adds a 'Municipality' column assigning
+            consecutive barangays to this many municipalities.
+        n_provinces (int): If positive, adds a 'Province' column grouping consecutive
+            municipalities (or barangays, without municipalities) into this many provinces.
+
+    Returns:
+        pd.DataFrame: One row per (barangay, quarter), ordered by barangay then period,
+        with the columns of `CSV_CONTENT` (plus the requested grouping columns).
+    """
+    if n_barangays < 1 or n_quarters < 1:
+        raise ValueError("n_barangays and n_quarters must be positive.")
+    rng = np.random.default_rng(seed)
+    periods = pd.date_range(start, periods=n_quarters, freq='QS-JAN')
+
+    # Production: log-normal base level per barangay, multiplicative random walk and seasonality
+    base = rng.lognormal(mean=3.4, sigma=1.1, size=(n_barangays, 1))
+    log_steps = rng.normal(0.01, 0.12, size=(n_barangays, n_quarters))
+    log_steps[:, 0] = 0.0
+    seasonal = np.tile([0.0, 0.05, -0.05, 0.08], n_quarters // 4 + 1)[:n_quarters]
+    production = base * np.exp(np.cumsum(log_steps, axis=1) + seasonal)
+
+    # Prices: shared market path plus small barangay deviations; millgate carries a margin
+    market = _market_price(rng, n_quarters)
+    farmgate = market[None, :] + rng.normal(0.0, 0.5, size=(n_barangays, n_quarters))
+    farmgate = np.maximum(farmgate, 1.0)
+    margin = rng.choice([4.0, 4.0, 4.0, 9.0], size=(n_barangays, 1))
+    millgate = farmgate + margin + np.abs(rng.normal(0.0, 0.5, size=(n_barangays, n_quarters)))
+
+    period_col = np.tile(periods.values, n_barangays)
+    df = pd.DataFrame({
+        'Barangay': np.repeat(np.array(barangay_names(n_barangays), dtype=object), n_quarters),
+        'Year': np.tile(periods.year.values.astype(np.int64), n_barangays),
+        'Quarter': np.tile(('Q' + periods.quarter.astype(str)).values, n_barangays),
+        'Period': period_col,
+        'Copra_Production (MT)': np.round(production.ravel(), 2),
+        'Farmgate Price (PHP/kg)': np.round(farmgate.ravel(), 2),
+        'Millgate Price (PHP/kg)': np.round(millgate.ravel(), 2),
+    })
+    df['Barangay'] = df['Barangay'].astype('str')
+    df['Quarter'] = df['Quarter'].astype('str')
+
+    # Contiguous blocks of barangays per municipality, and of municipalities per province
+    group = np.arange(n_barangays)
+    if n_municipalities > 0:
+        group = group * n_municipalities // n_barangays
+        df['Municipality'] = np.repeat([f"Municipality {g + 1:03d}" for g in group], n_quarters)
+    if n_provinces > 0:
+        n_groups = n_municipalities if n_municipalities > 0 else n_barangays
+        df['Province'] = np.repeat([f"Province {g * n_provinces // n_groups + 1:02d}" for g in group], n_quarters)
+    return df
+
+
+def write_panel(df, path):
+    """Writes a panel to CSV, Parquet or XLSX, chosen by the file extension."""
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False, date_format='%Y-%m-%d')
+    elif path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith('.xlsx'):
+        df.to_excel(path, index=False)
+    else:
+        raise ValueError(f"Unsupported output format for '{path}'; use .csv, .parquet or .xlsx.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Copra Production panel.")
+    parser.add_argument('--barangays', type=int, default=1000, help="Number of barangays.")
+    parser.add_argument('--quarters', type=int, default=DEFAULT_QUARTERS, help="Quarters per barangay.")
+    parser.add_argument('--start', default=DEFAULT_START, help="First quarter start date.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    parser.add_argument('--municipalities', type=int, default=0, help="Add a Municipality column with this many groups.")
+    parser.add_argument('--provinces', type=int, default=0, help="Add a Province column with this many groups.")
+    parser.add_argument('--output', required=True, help="Output file (.csv, .parquet or .xlsx).")
+    args = parser.parse_args()
+
+    df = generate_panel(
+        args.barangays, n_quarters=args.quarters, start=args.start, seed=args.seed,
+        n_municipalities=args.municipalities, n_provinces=args.provinces
+    )
+    write_panel(df, args.output)
+    print(f"Wrote {len(df):,} rows for {args.barangays:,} barangays to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Tests for the pre-fit validation and regularization of quarterly series (`validation.py`)."""
+import numpy as np
+import pandas as pd
+
+import validation
+
+
+def _panel(barangays, n_quarters=6):
+    """A regular panel with `n_quarters` positive quarters per barangay."""
+    frames = [
+        pd.DataFrame({
+            'Barangay': barangay,
+            'Period': pd.date_range('2020-01-01', periods=n_quarters, freq='QS'),
+            **{metric: np.arange(1.0, n_quarters + 1) for metric in validation.METRIC_COLUMNS},
+        })
+        for barangay in barangays
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _with_unnamed_row(df):
+    row = df.iloc[[0]].copy()
+    row['Barangay'] = None
+    return pd.concat([df, row], ignore_index=True)
+
+
+def test_validate_panel_ignores_rows_without_barangay():
+    report = validation.validate_panel(_with_unnamed_row(_panel(['A', 'B'])))
+
+    assert set(report.index.get_level_values('Barangay')) == {'A', 'B'}
+    assert (report['Status'] == 'ok').all()
+    assert (report['Quarters'] == 6).all()
+
+
+def test_regularize_panel_drops_rows_without_barangay():
+    df = _panel(['A', 'B'])
+    regularized, report = validation.regularize_panel(_with_unnamed_row(df))
+
+    assert regularized['Barangay'].notna().all()
+    assert len(regularized) == len(df)
+    assert (report['Status'] == 'ok').all()
+
+
+def test_regularize_panel_returns_clean_input_unchanged():
+    df = _panel(['A'])
+    regularized, _ = validation.regularize_panel(df)
+
+    assert regularized is df
+
+
+def test_regularize_panel_fills_missing_quarter():
+    df = _panel(['A']).drop(index=2).reset_index(drop=True)
+    regularized, report = validation.regularize_panel(df)
+
+    assert len(regularized) == 6
+    assert report.loc[('A', validation.METRIC_COLUMNS[0]), 'Missing quarters'] == 1
+    assert regularized[validation.METRIC_COLUMNS[0]].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+
+def test_series_problems_reports_short_series():
+    series = pd.Series([1.0, 2.0], index=pd.date_range('2020-01-01', periods=2, freq='QS'))
+
+    assert validation.series_problems(series) == ["only 2 quarters (need at least 5)"]
@@ -0,0 +1,254 @@
+"""
+Pre-fit validation and regularization of quarterly series.
+
+ARIMA models are fitted on a regular quarter-start ('QS-JAN') index, but edits in
+the dashboard and raw data files can produce duplicate periods, missing
+quarters, dates that are not the first day of a quarter, and zero, negative or
+missing values. Rather than discovering these through failed fits, the checks
+here run over all barangays at once with grouped NumPy/pandas operations:
+
+- `validate_panel` counts the problems of every (barangay, metric) series and
+  marks each one 'ok', 'regularize' or 'reject'.
+- `regularize_panel` repairs what can be repaired: dates are moved to the start
+  of their quarter, duplicate quarters are merged (later rows win), missing
+  quarters are inserted, and missing or non-positive values are interpolated
+  linearly within each barangay.
+- `series_problems` is the cheap last-line check on a single series, run before
+  every fit.
+
+A series is rejected when fewer than `MIN_QUARTERS` of its quarters hold a
+usable (present and positive) value; such series are never fitted. Rows without
+a barangay belong to no series: they are left out of the report and dropped by
+`regularize_panel`.
+"""
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['Copra_Production (MT)', 'Farmgate Price (PHP/kg)', 'Millgate Price (PHP/kg)']
+# Fewest usable quarters a series needs to be fitted and backtested
+MIN_QUARTERS = 5
+# Problem counts reported per series by `validate_panel`
+ISSUE_COLUMNS = ['Duplicate periods', 'Off-quarter dates', 'Missing quarters', 'Missing values', 'Non-positive values']
+
+
+# --- 1. Quarter Codes ---
+
+def quarter_codes(periods):
+    """Consecutive integer code of each date's quarter (year * 4 + quarter - 1)."""
+    periods = pd.DatetimeIndex(periods)
+    return periods.year.to_numpy(np.int64) * 4 + (periods.month.to_numpy(np.int64) - 1) // 3
+
+
+def quarter_starts(codes):
+    """First day of the quarter of each code from `quarter_codes`."""
+    codes = np.asarray(codes, dtype=np.int64)
+    months = (codes // 4 - 1970) * 12 + (codes % 4) * 3
+    return pd.DatetimeIndex(months.astype('datetime64[M]').astype('datetime64[ns]'))
+
+
+def _distinct_quarters(barangay_codes, codes):
+    """The distinct (barangay, quarter) pairs, sorted by barangay then quarter, as two arrays."""
+    # A stable (radix) sort of the packed keys is much faster than np.unique's hashing here
+    keys = np.sort((barangay_codes.astype(np.int64) << 20) + codes, kind='stable')
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    return keys >> 20, keys & ((1 << 20) - 1)
+
+
+# --- 2. Panel Validation ---
+
+def _named_rows(df):
+    """`df` without the rows that have no barangay (itself if there are none), and how many were left out."""
+    named = df['Barangay'].notna().to_numpy()
+    if named.all():
+        return df, 0
+    return df[named], int((~named).sum())
+
+
+def validate_panel(df, metrics=None, min_quarters=MIN_QUARTERS):
+    """
+    Checks every (barangay, metric) series of a long table at once.
+
+    Args:
+        df (pd.DataFrame): Long table with 'Barangay', 'Period' and the metric columns.
+        metrics (list): Metric columns to check. Defaults to all forecast metrics.
+        min_quarters (int): Usable quarters a series needs not to be rejected.
+
+    Returns:
+        pd.DataFrame: Indexed by (Barangay, Metric), with the number of distinct
+        'Quarters', the 'Usable quarters', a count per problem (ISSUE_COLUMNS), the
+        'Status' ('ok', 'regularize' or 'reject') and a readable 'Reason' for rejections.
+        Rows without a barangay are not counted.
+    """
+    metrics = list(metrics or METRIC_COLUMNS)
+    # Unnamed rows would factorize to -1, which np.bincount cannot count
+    df, _ = _named_rows(df)
+    barangay_codes, barangays = pd.factorize(df['Barangay'])
+    barangays = np.asarray(barangays, dtype=object)
+    codes = quarter_codes(df['Period'])
+    periods = df['Period'].to_numpy(dtype='datetime64[ns]')
+    n_barangays = len(barangays)
+
+    # Period problems are shared by all metrics of a barangay
+    rows = np.bincount(barangay_codes, minlength=n_barangays)
+    off_quarter = np.bincount(barangay_codes, weights=periods != quarter_starts(codes).to_numpy(), minlength=n_barangays)
+    distinct_barangays, distinct_codes = _distinct_quarters(barangay_codes, codes)
+    quarters = np.bincount(distinct_barangays, minlength=n_barangays)
+    first, last = np.full(n_barangays, 0), np.full(n_barangays, -1)
+    if len(distinct_codes):
+        # Distinct quarters are sorted by barangay then code, so each barangay's run starts at its first quarter
+        starts = np.cumsum(quarters) - quarters
+        present = quarters > 0
+        first[present] = distinct_codes[starts[present]]
+        last[present] = distinct_codes[starts[present] + quarters[present] - 1]
+    missing_quarters = last - first + 1 - quarters
+
+    frames = []
+    for metric in metrics:
+        values = df[metric].to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        non_positive = ~missing & (values <= 0)
+        usable = ~missing & ~non_positive
+        usable_quarters = np.bincount(_distinct_quarters(barangay_codes[usable], codes[usable])[0], minlength=n_barangays)
+        frames.append(pd.DataFrame({
+            'Barangay': barangays,
+            'Metric': metric,
+            'Quarters': quarters,
+            'Usable quarters': usable_quarters,
+            'Duplicate periods': rows - quarters,
+            'Off-quarter dates': off_quarter.astype(np.int64),
+            'Missing quarters': missing_quarters,
+            'Missing values': np.bincount(barangay_codes, weights=missing, minlength=n_barangays).astype(np.int64),
+            'Non-positive values': np.bincount(barangay_codes, weights=non_positive, minlength=n_barangays).astype(np.int64),
+        }))
+
+    report = pd.concat(frames, ignore_index=True).set_index(['Barangay', 'Metric'])
+    rejected = report['Usable quarters'] < min_quarters
+    report['Status'] = np.where(rejected, 'reject', np.where(report[ISSUE_COLUMNS].gt(0).any(axis=1), 'regularize', 'ok'))
+    report['Reason'] = ''
+    report.loc[rejected, 'Reason'] = [
+        f"only {n} usable quarters (need at least {min_quarters})" for n in report.loc[rejected, 'Usable quarters']
+    ]
+    return report
+
+
+# --- 3. Regularization ---
+
+def _interpolate_within(values, groups):
+    """
+    Linear interpolation of the NaNs of `values` within runs of equal `groups`.
+
+    Values are assumed to be in group order with one row per consecutive quarter.
+    Leading and trailing NaNs take the nearest value of their group; groups without
+    any value stay NaN.
+    """
+    positions = np.arange(len(values), dtype=np.float64)
+    known = pd.Series(np.where(np.isnan(values), np.nan, positions))
+    before = known.groupby(groups).ffill().to_numpy()
+    after = known.groupby(groups).bfill().to_numpy()
+    before = np.where(np.isnan(before), after, before)
+    after = np.where(np.isnan(after), before, after)
+
+    filled = values.copy()
+    gaps = np.isnan(values) & ~np.isnan(before)
+    lo, hi = before[gaps].astype(np.int64), after[gaps].astype(np.int64)
+    weight = np.divide(positions[gaps] - lo, hi - lo, out=np.zeros(gaps.sum()), where=hi != lo)
+    filled[gaps] = values[lo] + (values[hi] - values[lo]) * weight
+    return filled
+
+
+def regularize_panel(df, metrics=None, min_quarters=MIN_QUARTERS):
+    """
+    Validates a long table and repairs every series that can be repaired.
+
+    Dates are moved to the start of their quarter, rows for the same quarter are
+    merged (the last non-missing value of each column wins), missing quarters are
+    inserted, and missing or non-positive metric values are interpolated linearly
+    within each barangay. Rejected series are kept (with whatever values remain) so
+    the data stays editable; callers must not fit them. Rows without a barangay are
+    dropped (and their number printed).
+
+    Args:
+        df (pd.DataFrame): Long table with 'Barangay', 'Period' and the metric columns.
+        metrics (list): Metric columns to repair. Defaults to all forecast metrics.
+        min_quarters (int): Usable quarters a series needs not to be rejected.
+
+    Returns:
+        tuple: (pd.DataFrame, pd.DataFrame) -> (The regularized table, or `df` itself if
+               nothing needed repairing; the `validate_panel` report of the input)
+    """
+    metrics = list(metrics or METRIC_COLUMNS)
+    df, n_unnamed = _named_rows(df)
+    if n_unnamed:
+        print(f"Dropped {n_unnamed} rows without a barangay.")
+    report = validate_panel(df, metrics, min_quarters)
+    if not (report[ISSUE_COLUMNS].to_numpy() > 0).any():
+        return df, report
+
+    columns = list(df.columns)
+    work = df.copy()
+    for metric in metrics:
+        work[metric] = work[metric].astype(np.float64).where(work[metric] > 0)
+    # Barangays keep their order of first appearance; rows within one are ordered by quarter
+    work['_barangay'] = pd.factorize(work['Barangay'])[0]
+    work['_quarter'] = quarter_codes(work['Period'])
+    merged = work.drop(columns='Period').groupby(['_barangay', '_quarter'], sort=True).last()
+
+    # One row per quarter from each barangay's first to its last quarter
+    barangay_codes = merged.index.get_level_values('_barangay').to_numpy()
+    quarter_values = merged.index.get_level_values('_quarter').to_numpy()
+    present, first_row = np.unique(barangay_codes, return_index=True)
+    last_row = np.r_[first_row[1:], len(barangay_codes)] - 1
+    start, span = quarter_values[first_row], quarter_values[last_row] - quarter_values[first_row] + 1
+    offsets = np.arange(span.sum()) - np.repeat(np.cumsum(span) - span, span)
+    grid = pd.MultiIndex.from_arrays(
+        [np.repeat(present, span), np.repeat(start, span) + offsets], names=['_barangay', '_quarter']
+    )
+    full = merged.reindex(grid)
+
+    groups = full.index.get_level_values('_barangay').to_numpy()
+    for col in columns:
+        if col == 'Period':
+            continue
+        if col in metrics:
+            full[col] = _interpolate_within(full[col].to_numpy(dtype=np.float64), groups)
+        else:
+            # Names and other labels of inserted quarters come from the barangay's other rows
+            full[col] = full[col].groupby(groups).ffill().groupby(groups).bfill()
+    full['Period'] = quarter_starts(full.index.get_level_values('_quarter'))
+
+    regularized = full.reset_index(drop=True)[columns]
+    return regularized.astype(df.dtypes.to_dict()), report
+
+
+# --- 4. Single-Series Check ---
+
+def series_problems(data_series, min_quarters=MIN_QUARTERS):
+    """
+    Problems that would make a series unfit for a quarterly ARIMA fit.
+
+    Args:
+        data_series (pd.Series): Values indexed by a DatetimeIndex.
+        min_quarters (int): Fewest observations required.
+
+    Returns:
+        list: Readable descriptions; empty if the series can be fitted.
+    """
+    if len(data_series) < min_quarters:
+        return [f"only {len(data_series)} quarters (need at least {min_quarters})"]
+    problems = []
+    codes = quarter_codes(data_series.index)
+    distinct = np.unique(codes)
+    if len(distinct) < len(codes):
+        problems.append(f"{len(codes) - len(distinct)} duplicate periods")
+    elif (np.diff(codes) < 0).any():
+        problems.append("periods out of order")
+    if distinct[-1] - distinct[0] + 1 > len(distinct):
+        problems.append(f"{int(distinct[-1] - distinct[0] + 1 - len(distinct))} missing quarters")
+    if (data_series.index != quarter_starts(codes)).any():
+        problems.append("dates that are not the first day of a quarter")
+    values = data_series.to_numpy(dtype=np.float64)
+    if np.isnan(values).any():
+        problems.append(f"{int(np.isnan(values).sum())} missing values")
+    if (values <= 0).any():
+        problems.append(f"{int((values <= 0).sum())} zero or negative values")
+    return problems